@@ -79,6 +79,10 @@ class RasterDataset(Cartographer):
 
         self._target_epsg = int(target_projection.split(':')[1])
 
+        # Transformers are reused by each render
+        self._target_srs = SpatialTransformer(4326, self._target_epsg)
+        self._dataset_srs = SpatialTransformer(4326, self._dataset_epsg)
+
     def render(self, envelope=(-180, -90, 180, 90), size=(256, 256)):
         """ Get raster data in the area of envelope from database """
 
@@ -86,7 +90,7 @@ class RasterDataset(Cartographer):
         minx, miny, maxx, maxy = envelope
 
         # Calculate envelope coordinates in target projection
-        srs = SpatialTransformer(4326, self._target_epsg)
+        srs = self._target_srs
         dst_minx, dst_miny, __foo = srs.forward(minx, miny)
         dst_maxx, dst_maxy, __foo = srs.forward(maxx, maxy)
 
@@ -107,7 +111,7 @@ class RasterDataset(Cartographer):
         if resample_method is None:
 
             # Calculate envelope coordinates in dataset projection
-            srs = SpatialTransformer(4326, self._dataset_epsg)
+            srs = self._dataset_srs
             org_minx, org_miny, __foo = srs.forward(minx, miny)
             org_maxx, org_maxy, __foo = srs.forward(maxx, maxy)
 
@@ -5,8 +5,10 @@ Created on Oct 11, 2012
 @author: ray
 '''
 
+import time
+
 from .core import Pyramid, Metadata, metatile_fission, buffer_crop, Tile, Format
-from .renderer import create_render_node, MetaTileContext
+from .renderer import create_render_node, MetaTileContext, RenderPool
 from .tilestorage import create_tilestorage
 
 
@@ -37,6 +39,10 @@ class InvalidStorageConfig(Exception):
     pass
 
 
+class CircularRenderNodeConfig(Exception):
+    pass
+
+
 #===============================================================================
 # Mason Configuration
 #===============================================================================
@@ -67,7 +73,7 @@ class MasonRenderer(object):
 
     ROOT_NODE_NAME = 'ROOT'
 
-    def __init__(self, mason_config, mode=None):
+    def __init__(self, mason_config, mode=None, threads=0):
         self._mason_cfg = mason_config
         self._mode = mode or 'dryrun' # default is 'dryrun'
 
@@ -92,10 +98,14 @@ class MasonRenderer(object):
             raise RendererConfigNotFound
 
         storage_cfg = root_cfg.get('storage')
+        self._storage_cfg = storage_cfg
 
         self._pyramid = self._create_pyramid(pyramid_cfg)
         self._metadata = self._create_metadata(metadata_cfg)
 
+        # Render nodes by name, a node used as source by several nodes
+        # is created once and shared, so the render tree is actually a DAG
+        self._nodes = dict()
         self._renderer = self._create_renderer(
             renderer_cfg,
             self._pyramid,
@@ -105,6 +115,12 @@ class MasonRenderer(object):
             self._pyramid,
             self._metadata)
 
+        # Render sibling nodes concurrently
+        self._pool = None
+        if threads > 0:
+            self._pool = RenderPool(threads)
+            self._renderer.set_pool(self._pool)
+
     @property
     def pyramid(self):
         return self._pyramid
@@ -120,6 +136,13 @@ class MasonRenderer(object):
         tile_indexes = metatile_index.fission()
         return self._storage.has_all(tile_indexes)
 
+    def create_storage(self):
+        """ Create a new instance of the tile storage, eg: for using the
+        storage in another thread """
+        return self._create_storage(self._storage_cfg,
+                                    self._pyramid,
+                                    self._metadata)
+
     def render_tile(self, tile_index):
         if self._mode in ('hybrid', 'readonly'):
             tile = self._storage.get(tile_index)
@@ -142,21 +165,47 @@ class MasonRenderer(object):
 
         return tile
 
-    def render_metatile(self, metatile_index):
+    def render_metatile(self, metatile_index, timings=None):
+        """ Render a metatile and write its tiles to the storage, seconds
+        spent in each (node name, stage) are added to timings if given,
+        fission and storage stages are recorded under the root node """
         context = MetaTileContext(metatile_index, self._mode)
         metatile = self._renderer.render(context)
 
+        name = self._renderer.name
         if self._mode in ('hybrid', 'overwrite'):
             tile_indexes = metatile_index.fission()
-            if self._mode == 'overwrite' or \
-                    not self._storage.has_all(tile_indexes):
+            started = time.time()
+            exists = self._mode != 'overwrite' and \
+                self._storage.has_all(tile_indexes)
+            context.add_time(name, 'storage_check', time.time() - started)
+            if not exists:
+                started = time.time()
                 tiles = metatile_fission(metatile)
+                context.add_time(name, 'fission', time.time() - started)
+                started = time.time()
                 self._storage.put_multi(tiles)
+                context.add_time(name, 'storage_write', time.time() - started)
         self._renderer.erase(metatile_index)
+
+        if timings is not None:
+            for key, seconds in context.timings.items():
+                timings[key] = timings.get(key, 0.) + seconds
         return metatile
 
     def close(self):
-        self._renderer.close()
+        self._renderer.close_tree()
+        if self._pool is not None:
+            self._pool.close()
+
+    def reopen(self):
+        """ Reopen connections in the render tree and storage, call this
+        in a forked process which inherited the renderer from its parent,
+        so read only states (eg: mapnik maps) are shared copy-on-write """
+        self._renderer.reopen_tree()
+        self._storage.reopen()
+        if self._pool is not None:
+            self._pool.reopen()
 
     def _create_pyramid(self, pyramid_cfg):
         return Pyramid(**pyramid_cfg)
@@ -167,6 +216,12 @@ class MasonRenderer(object):
     def _create_renderer(self, renderer_name, pyramid, metadata):
         if not isinstance(renderer_name, basestring):
             raise RenderNodeConfigNotFound(renderer_name)
+        if renderer_name in self._nodes:
+            render_node = self._nodes[renderer_name]
+            if render_node is None:
+                # Still creating its sources
+                raise CircularRenderNodeConfig(renderer_name)
+            return render_node
         renderer_cfg = self._mason_cfg.get_node_cfg(renderer_name)
         if not renderer_cfg:
             raise RenderNodeConfigNotFound(renderer_name)
@@ -188,9 +243,11 @@ class MasonRenderer(object):
                                          **cfg)
         render_node.keep_cache = keep_cache
 
+        self._nodes[renderer_name] = None
         for name in child_names:
             child_node = self._create_renderer(name, pyramid, metadata)
             render_node.add_child(child_node)
+        self._nodes[renderer_name] = render_node
 
         return render_node
 
@@ -224,6 +281,9 @@ def create_render_tree_from_config(config_file, option):
         - readonly: only read from cache
         - dryrun: always render but does not write to cache
 
+        2.threads: render sibling nodes concurrently using given number
+        of threads, default is 0 which renders nodes one by one.
+
     """
     config = MasonConfig(config_file)
     return MasonRenderer(config, **option)
@@ -2,10 +2,24 @@
 
 from .geo import (Coordinate, Point, Envelope, create_projection,
                   tile_coordinate_to_serial, tile_coordiante_to_dirname,
+                  tile_coordinate_to_sharding_index,
                   )
 from .tile import Tile, TileIndex, MetaTile, MetaTileIndex
 from .pyramid import Pyramid
 from .format import Format
 from .gridcrop import metatile_fission, grid_crop, buffer_crop
 from .metadata import Metadata
-from .walker import PyramidWalker, TileListPyramidWalker
+from .walker import (PyramidWalker, TileListPyramidWalker, CoverageWalker,
+                     UniqueTileListWalker, WalkCursor)
+
+try:
+    from .tilearray import TileIndexArray
+except ImportError:
+    # Requires numpy
+    TileIndexArray = None
+
+try:
+    from .rastertile import RasterMetaTile, encode_raster, decode_raster
+except ImportError:
+    # Requires numpy and GDAL python binding
+    RasterMetaTile = encode_raster = decode_raster = None
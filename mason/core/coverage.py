@@ -0,0 +1,298 @@
+"""
+Coverage of a tile pyramid
+
+A coverage describes area which actually needs tiles, eg: land area of
+a country, so walkers can skip tiles in ocean.  Coverage is tested
+against the tile quad tree recursively, a quadrant completely outside
+(or inside) the coverage is never subdivided.
+
+All calculation is done in normalized GoogleMercator plane
+((0, 0), (1, 1)), where a tile in level z is a 1/2^z square.
+
+Created on Oct 18, 2026
+@author: Kotaimen
+"""
+
+import json
+import math
+import os
+
+import numpy
+
+from .geo import GoogleMercatorProjection
+
+#===============================================================================
+# Base Class
+#===============================================================================
+
+
+class Coverage(object):
+
+    """ Base class of coverage """
+
+    OUTSIDE = 0
+    INSIDE = 1
+    PARTIAL = 2
+
+    def walk(self, z, x_min, y_min, x_max, y_max, start=None):
+        """ Iterate (x, y) of tiles in level z intersects the coverage
+
+        Only tiles in given inclusive range are returned.  If start is
+        (x, y) of a tile returned by an earlier walk, the walk starts from
+        it, nodes walked before it are skipped without being classified.
+        """
+        # Stack of (level, x, y, classify state, node contains start) of
+        # quad tree nodes
+        stack = [(0, 0, 0, self._root_state(), start is not None)]
+        while stack:
+            k, i, j, state, seeking = stack.pop()
+
+            # Tile range covered by this node
+            size = 1 << (z - k)
+            left, top = i * size, j * size
+            right, bottom = left + size - 1, top + size - 1
+            if left > x_max or right < x_min or top > y_max or bottom < y_min:
+                continue
+
+            scale = float(1 << k)
+            status, state = self._classify(i / scale, j / scale,
+                                           (i + 1) / scale, (j + 1) / scale,
+                                           state)
+            if status == self.OUTSIDE:
+                continue
+            if status == self.INSIDE or k == z:
+                x_begin, y_begin = max(left, x_min), max(top, y_min)
+                if seeking:
+                    x_begin = max(x_begin, start[0])
+                for x in xrange(x_begin, min(right, x_max) + 1):
+                    y = y_begin
+                    if seeking and x == start[0]:
+                        y = max(y_begin, start[1])
+                    for y in xrange(y, min(bottom, y_max) + 1):
+                        yield x, y
+                continue
+
+            # Children are walked in (0, 0), (1, 0), (0, 1), (1, 1) order,
+            # those before the child contains start are skipped
+            first = 0
+            if seeking:
+                shift = z - k - 1
+                first = (start[0] >> shift & 1) + (start[1] >> shift & 1) * 2
+            for n, (di, dj) in ((3, (1, 1)), (2, (0, 1)), (1, (1, 0)),
+                                (0, (0, 0))):
+                if n >= first:
+                    stack.append((k + 1, i * 2 + di, j * 2 + dj, state,
+                                  seeking and n == first))
+
+    def _root_state(self):
+        return None
+
+    def _classify(self, left, top, right, bottom, state):
+        """ Classify a rectangle in normalized mercator plane
+
+        Returns (status, state), state is passed to children of the
+        rectangle, so a implement can narrow down its search.
+        """
+        raise NotImplementedError
+
+
+#===============================================================================
+# Polygon
+#===============================================================================
+
+
+class PolygonCoverage(Coverage):
+
+    """ Coverage defined by polygons
+
+    rings is a list of linear rings in (lon, lat), outer rings and holes
+    are not distinguished, a point is inside the coverage if it is inside
+    odd number of rings, so polygon holes just work.
+    """
+
+    def __init__(self, rings):
+        proj = GoogleMercatorProjection()
+        edges = list()
+        for ring in rings:
+            ring = numpy.asarray(ring, dtype=numpy.float64)[:, :2]
+            if len(ring) < 3:
+                continue
+            # Mercator is not defined at poles
+            lats = numpy.clip(ring[:, 1], -85.0511287798, 85.0511287798)
+            xs, ys = proj.project_array(ring[:, 0], lats)
+            points = numpy.column_stack((xs, ys))
+            # Close the ring
+            if not numpy.array_equal(points[0], points[-1]):
+                points = numpy.vstack((points, points[:1]))
+            edges.append(numpy.hstack((points[:-1], points[1:])))
+        assert edges, 'Empty coverage'
+
+        # Nx4 array of (x1, y1, x2, y2)
+        self._edges = numpy.vstack(edges)
+        self._x1, self._y1, self._x2, self._y2 = self._edges.T
+
+    def _root_state(self):
+        return numpy.arange(len(self._edges))
+
+    def _classify(self, left, top, right, bottom, state):
+        x1, y1 = self._x1[state], self._y1[state]
+        x2, y2 = self._x2[state], self._y2[state]
+
+        # Edges whose bounding box overlaps the rectangle...
+        overlaps = (numpy.minimum(x1, x2) <= right) & \
+                   (numpy.maximum(x1, x2) >= left) & \
+                   (numpy.minimum(y1, y2) <= bottom) & \
+                   (numpy.maximum(y1, y2) >= top)
+        # ...and rectangle corners are not all on one side of the edge
+        sides = list(numpy.sign((x2 - x1) * (cy - y1) - (y2 - y1) * (cx - x1))
+                     for cx, cy in ((left, top), (right, top),
+                                    (left, bottom), (right, bottom)))
+        separated = ((sides[0] > 0) & (sides[1] > 0) & (sides[2] > 0) & (sides[3] > 0)) | \
+                    ((sides[0] < 0) & (sides[1] < 0) & (sides[2] < 0) & (sides[3] < 0))
+
+        crossing = state[overlaps & ~separated]
+        if len(crossing) > 0:
+            return self.PARTIAL, crossing
+
+        # No boundary in the rectangle, its either completely inside or
+        # outside, test its center
+        if self._contains((left + right) / 2., (top + bottom) / 2.):
+            return self.INSIDE, crossing
+        else:
+            return self.OUTSIDE, crossing
+
+    def _contains(self, x, y):
+        # Even-odd ray casting towards +x
+        x1, y1, x2, y2 = self._x1, self._y1, self._x2, self._y2
+        spans = (y1 > y) != (y2 > y)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            cross_x = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+        return bool(numpy.count_nonzero(spans & (cross_x > x)) % 2)
+
+    @staticmethod
+    def from_geojson(filename):
+        """ Load polygons from a GeoJSON file in EPSG:4326 """
+        with open(filename, 'r') as fp:
+            return PolygonCoverage(_geojson_rings(json.load(fp)))
+
+    @staticmethod
+    def from_ogr(filename):
+        """ Load polygons from any vector data source OGR supports, eg:
+        a shapefile in EPSG:4326 """
+        from osgeo import ogr
+        datasource = ogr.Open(filename)
+        if datasource is None:
+            raise RuntimeError("Can't open coverage %s" % filename)
+        rings = list()
+        for layer in datasource:
+            for feature in layer:
+                geometry = json.loads(feature.GetGeometryRef().ExportToJson())
+                rings.extend(_geojson_rings(geometry))
+        return PolygonCoverage(rings)
+
+
+def _geojson_rings(obj):
+    """ Extract all polygon rings from a GeoJSON object """
+    kind = obj.get('type')
+    if kind == 'FeatureCollection':
+        return list(ring for feature in obj['features']
+                    for ring in _geojson_rings(feature))
+    elif kind == 'Feature':
+        return _geojson_rings(obj['geometry']) if obj.get('geometry') else []
+    elif kind == 'GeometryCollection':
+        return list(ring for geometry in obj['geometries']
+                    for ring in _geojson_rings(geometry))
+    elif kind == 'Polygon':
+        return list(obj['coordinates'])
+    elif kind == 'MultiPolygon':
+        return list(ring for polygon in obj['coordinates'] for ring in polygon)
+    else:
+        # Points and lines have no area
+        return []
+
+
+#===============================================================================
+# Raster Mask
+#===============================================================================
+
+
+class RasterCoverage(Coverage):
+
+    """ Coverage defined by a raster mask in EPSG:4326
+
+    mask is a 2D array, non-zero pixels are covered, geotransform is
+    GDAL style (left, pixel width, 0, top, 0, -pixel height).
+    """
+
+    def __init__(self, mask, geotransform):
+        mask = numpy.asarray(mask) != 0
+        self._height, self._width = mask.shape
+        self._geotransform = geotransform
+        # Summed area table so counting covered pixels in a window is O(1)
+        self._table = numpy.zeros((self._height + 1, self._width + 1),
+                                  dtype=numpy.int64)
+        self._table[1:, 1:] = numpy.cumsum(numpy.cumsum(mask, axis=0), axis=1)
+        self._proj = GoogleMercatorProjection()
+
+    def _classify(self, left, top, right, bottom, state):
+        origin_x, pixel_width, _, origin_y, _, pixel_height = self._geotransform
+
+        lons, lats = self._proj.unproject_array([left, right], [top, bottom])
+        col0 = int(math.floor((lons[0] - origin_x) / pixel_width))
+        col1 = int(math.ceil((lons[1] - origin_x) / pixel_width))
+        row0 = int(math.floor((lats[0] - origin_y) / pixel_height))
+        row1 = int(math.ceil((lats[1] - origin_y) / pixel_height))
+        col1 = max(col1, col0 + 1)
+        row1 = max(row1, row0 + 1)
+
+        clipped = col0 < 0 or row0 < 0 or \
+            col1 > self._width or row1 > self._height
+        col0, col1 = max(col0, 0), min(col1, self._width)
+        row0, row1 = max(row0, 0), min(row1, self._height)
+        if col0 >= col1 or row0 >= row1:
+            return self.OUTSIDE, None
+
+        table = self._table
+        count = table[row1, col1] - table[row0, col1] - \
+            table[row1, col0] + table[row0, col0]
+        if count == 0:
+            return self.OUTSIDE, None
+        if not clipped and count == (row1 - row0) * (col1 - col0):
+            return self.INSIDE, None
+        return self.PARTIAL, None
+
+    @staticmethod
+    def from_gdal(filename, band=1):
+        """ Load mask from a raster GDAL supports, pixels not equal to
+        zero or nodata are covered """
+        from osgeo import gdal
+        dataset = gdal.Open(filename)
+        if dataset is None:
+            raise RuntimeError("Can't open coverage %s" % filename)
+        raster_band = dataset.GetRasterBand(band)
+        data = raster_band.ReadAsArray()
+        nodata = raster_band.GetNoDataValue()
+        mask = data != 0
+        if nodata is not None:
+            mask &= data != nodata
+        return RasterCoverage(mask, dataset.GetGeoTransform())
+
+
+#===============================================================================
+# Factory
+#===============================================================================
+
+def create_coverage(filename):
+    """ Load a coverage, file type is guessed from extension
+
+    - .json/.geojson: GeoJSON polygons
+    - .shp and other OGR vector formats: polygons
+    - .tif/.tiff/.png/.vrt/.img: raster mask
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    if ext in ('.json', '.geojson'):
+        return PolygonCoverage.from_geojson(filename)
+    elif ext in ('.tif', '.tiff', '.png', '.vrt', '.img'):
+        return RasterCoverage.from_gdal(filename)
+    else:
+        return PolygonCoverage.from_ogr(filename)
@@ -8,6 +8,12 @@ Created on Apr 30, 2012
 import collections
 import math
 
+try:
+    import numpy
+except ImportError:
+    # Batch projection methods are not available without numpy
+    numpy = None
+
 #===============================================================================
 # Geography Primitives
 #===============================================================================
@@ -235,6 +241,80 @@ class GoogleMercatorProjection(object):
         wy = float(pixel_y) / (2 ** z * tile_size)
         return self.unproject(Point(wx, wy))
 
+    # Batch ------------------------------------------------------------------
+    #
+    # Vectorized versions of above methods, z/x/y and lon/lat are numpy
+    # arrays (or anything numpy.asarray accepts) and broadcast against each
+    # other, so a scalar z can be used with arrays of x/y.
+
+    def project_array(self, lons, lats):
+        """ Project arrays of WGS84 coordinates to GoogleMercator
+
+        Returns a (x, y) tuple of arrays in normalized ((0, 0), (1, 1)) plane.
+        """
+        _check_numpy()
+        lons = numpy.asarray(lons, dtype=numpy.float64)
+        lats = numpy.asarray(lats, dtype=numpy.float64)
+        x = lons / 360. + 0.5
+        y = numpy.log(numpy.tan(math.pi / 4. + numpy.radians(lats) / 2.))
+        y = 0.5 - y / 2. / math.pi
+        return x, y
+
+    def unproject_array(self, xs, ys):
+        """ Unproject arrays of GoogleMercator points back to WGS84
+
+        Returns a (lon, lat) tuple of arrays.
+        """
+        _check_numpy()
+        xs = numpy.asarray(xs, dtype=numpy.float64)
+        ys = numpy.asarray(ys, dtype=numpy.float64)
+        lons = (xs - 0.5) * 360.
+        lats = numpy.degrees(2 * numpy.arctan(numpy.exp((1. - 2. * ys) * math.pi)) - \
+                             math.pi / 2.)
+        return lons, lats
+
+    def coord2tile_array(self, lons, lats, z):
+        """ Arrays of coordinates to (x, y) tuple of tile coordinate arrays """
+        world_x, world_y = self.project_array(lons, lats)
+        tile_num = numpy.left_shift(1, numpy.asarray(z, dtype=numpy.int64))
+        x = numpy.floor(tile_num * world_x).astype(numpy.int64)
+        y = numpy.floor(tile_num * world_y).astype(numpy.int64)
+        return (numpy.clip(x, 0, tile_num - 1),
+                numpy.clip(y, 0, tile_num - 1))
+
+    def tile_envelope_array(self, z, x, y):
+        """ Envelopes of many tiles in one call
+
+        Returns a Nx4 array, each row is (left, bottom, right, top) of
+        the tile, same as Envelope.make_tuple().
+        """
+        return self.tile_buffered_envelope_array(z, x, y, 1, 0)
+
+    def tile_buffered_envelope_array(self, z, x, y, tile_size=256, buffer=0):
+        """ Buffered envelopes of many tiles in one call
+
+        Tile envelope is expanded by buffer pixels on each side, returns a
+        Nx4 array of (left, bottom, right, top) rows.
+        """
+        _check_numpy()
+        z, x, y = numpy.broadcast_arrays(
+            numpy.atleast_1d(numpy.asarray(z, dtype=numpy.int64)),
+            numpy.atleast_1d(numpy.asarray(x, dtype=numpy.int64)),
+            numpy.atleast_1d(numpy.asarray(y, dtype=numpy.int64)))
+
+        pixel_size = numpy.power(2., z) * tile_size  # total pixel size
+        left, top = self.unproject_array((x * tile_size - buffer) / pixel_size,
+                                         (y * tile_size - buffer) / pixel_size)
+        right, bottom = self.unproject_array(((x + 1) * tile_size + buffer) / pixel_size,
+                                             ((y + 1) * tile_size + buffer) / pixel_size)
+
+        return numpy.column_stack((left, bottom, right, top))
+
+
+def _check_numpy():
+    if numpy is None:
+        raise ImportError('Batch projection requires numpy')
+
 
 def create_projection(input, output, **args):
     """ Dummy factory function, in case other projection is added later """
@@ -273,47 +353,353 @@ def tile_coordinate_to_serial(z, x, y):
     return (4 ** z - 1) // 3 + y * dim + x
 
 
-def tile_coordiante_to_dirname(z, x, y, m=64):
+def serial_to_tile_coordinate(serial):
+    """ Convert a serial back to tile coordinate (z, x, y)
 
-    """ Return a directory tree path for a given tile coordinate
+    Inverse of tile_coordinate_to_serial()
+    """
+    assert serial >= 0
+    for z in range(0, 31):
+        base = (4 ** z - 1) // 3
+        if serial < base + 4 ** z:
+            y, x = divmod(serial - base, 2 ** z)
+            return z, x, y
+    raise ValueError('Serial too large: %r' % serial)
+
+
+def serial_to_tile_coordinate_array(serials):
+    """ Vectorized serial_to_tile_coordinate(), returns (z, x, y) arrays """
+    _check_numpy()
+    serials = numpy.asarray(serials, dtype=numpy.int64)
+    # First serial of each level
+    bases = (numpy.left_shift(1, 2 * numpy.arange(0, 32, dtype=numpy.int64)) - 1) // 3
+    z = numpy.searchsorted(bases, serials, side='right') - 1
+    y, x = numpy.divmod(serials - bases[z], numpy.left_shift(1, z))
+    return z, x, y
 
-    Groups adjacent m*m tiles in a sub directory to improve file system
-    performance.  Returns a list of directory names, to create a directory str,
-    use os.path.join(*list)
+
+#===============================================================================
+# Space Filling Curves
+#===============================================================================
+#
+# Order tiles in one level along a space filling curve so adjacent tiles
+# in the order are also adjacent on the map.  Curve distance is an integer
+# in [0, 4^z), x/y are tile coordinates in level z.
+
+
+def tile_coordinate_to_morton(z, x, y):
+    """ Morton (Z-order) distance of a tile, x is interleaved in even bits """
+    assert z >= 0 and z <= 31
+    d = 0
+    for i in range(z):
+        d |= ((x >> i) & 1) << (2 * i) | ((y >> i) & 1) << (2 * i + 1)
+    return d
+
+
+def morton_to_tile_coordinate(z, d):
+    """ Inverse of tile_coordinate_to_morton(), returns (x, y) """
+    x = y = 0
+    for i in range(z):
+        x |= ((d >> (2 * i)) & 1) << i
+        y |= ((d >> (2 * i + 1)) & 1) << i
+    return x, y
+
+
+def _hilbert_rotate(n, x, y, rx, ry):
+    if ry == 0:
+        if rx == 1:
+            x = n - 1 - x
+            y = n - 1 - y
+        x, y = y, x
+    return x, y
+
+
+def tile_coordinate_to_hilbert(z, x, y):
+    """ Hilbert curve distance of a tile """
+    assert z >= 0 and z <= 31
+    n = 2 ** z
+    d = 0
+    s = n // 2
+    while s > 0:
+        rx = 1 if (x & s) > 0 else 0
+        ry = 1 if (y & s) > 0 else 0
+        d += s * s * ((3 * rx) ^ ry)
+        x, y = _hilbert_rotate(n, x, y, rx, ry)
+        s //= 2
+    return d
+
+
+def hilbert_to_tile_coordinate(z, d):
+    """ Inverse of tile_coordinate_to_hilbert(), returns (x, y) """
+    n = 2 ** z
+    x = y = 0
+    s = 1
+    while s < n:
+        rx = 1 & (d // 2)
+        ry = 1 & (d ^ rx)
+        x, y = _hilbert_rotate(s, x, y, rx, ry)
+        x += s * rx
+        y += s * ry
+        d //= 4
+        s *= 2
+    return x, y
+
+
+def _broadcast_int64(*arrays):
+    _check_numpy()
+    return numpy.broadcast_arrays(*list(numpy.array(a, dtype=numpy.int64, ndmin=1)
+                                        for a in arrays))
+
+
+def tile_coordinate_to_morton_array(z, x, y):
+    """ Vectorized tile_coordinate_to_morton() """
+    z, x, y = _broadcast_int64(z, x, y)
+    d = numpy.zeros_like(x)
+    for i in range(int(z.max()) if z.size else 0):
+        active = i < z
+        bits = (((x >> i) & 1) << (2 * i)) | (((y >> i) & 1) << (2 * i + 1))
+        d |= numpy.where(active, bits, 0)
+    return d
+
+
+def morton_to_tile_coordinate_array(z, d):
+    """ Vectorized morton_to_tile_coordinate() """
+    z, d = _broadcast_int64(z, d)
+    x = numpy.zeros_like(d)
+    y = numpy.zeros_like(d)
+    for i in range(int(z.max()) if z.size else 0):
+        active = i < z
+        x |= numpy.where(active, ((d >> (2 * i)) & 1) << i, 0)
+        y |= numpy.where(active, ((d >> (2 * i + 1)) & 1) << i, 0)
+    return x, y
+
+
+def _hilbert_rotate_array(n, x, y, rx, ry, active):
+    flip = active & (ry == 0) & (rx == 1)
+    x = numpy.where(flip, n - 1 - x, x)
+    y = numpy.where(flip, n - 1 - y, y)
+    swap = active & (ry == 0)
+    return numpy.where(swap, y, x), numpy.where(swap, x, y)
+
+
+def tile_coordinate_to_hilbert_array(z, x, y):
+    """ Vectorized tile_coordinate_to_hilbert() """
+    z, x, y = _broadcast_int64(z, x, y)
+    n = numpy.left_shift(1, z)
+    d = numpy.zeros_like(x)
+    for i in reversed(range(int(z.max()) if z.size else 0)):
+        s = 1 << i
+        active = s < n
+        rx = ((x & s) > 0).astype(numpy.int64)
+        ry = ((y & s) > 0).astype(numpy.int64)
+        d += numpy.where(active, s * s * ((3 * rx) ^ ry), 0)
+        x, y = _hilbert_rotate_array(n, x, y, rx, ry, active)
+    return d
+
+
+def hilbert_to_tile_coordinate_array(z, d):
+    """ Vectorized hilbert_to_tile_coordinate() """
+    z, d = _broadcast_int64(z, d)
+    n = numpy.left_shift(1, z)
+    x = numpy.zeros_like(d)
+    y = numpy.zeros_like(d)
+    t = d.copy()
+    for i in range(int(z.max()) if z.size else 0):
+        s = 1 << i
+        active = s < n
+        rx = 1 & (t // 2)
+        ry = 1 & (t ^ rx)
+        x, y = _hilbert_rotate_array(s, x, y, rx, ry, active)
+        x += numpy.where(active, s * rx, 0)
+        y += numpy.where(active, s * ry, 0)
+        t //= 4
+    return x, y
+
+
+CURVE_ORDERS = {
+    'morton': (tile_coordinate_to_morton, morton_to_tile_coordinate),
+    'hilbert': (tile_coordinate_to_hilbert, hilbert_to_tile_coordinate),
+}
+
+
+def walk_curve(order, z, x_min, y_min, x_max, y_max, start=0):
+    """ Iterate (x, y) of tiles in given inclusive range of level z along
+    a space filling curve
+
+    Tiles are visited by walking the quad tree along the curve, quadrants
+    outside the range are skipped, so this does not require sorting all
+    tiles first.  The walk starts from the start-th tile in range, tiles
+    before it are skipped by whole quadrants.
+    """
+    decode = CURVE_ORDERS[order][1]
+    # Stack of (curve distance, quad tree depth to tile level)
+    stack = [(0, z)]
+    skip = start
+    while stack:
+        d, k = stack.pop()
+        x, y = decode(z, d)
+        size = 1 << k
+        left, top = x & ~(size - 1), y & ~(size - 1)
+        right, bottom = left + size - 1, top + size - 1
+        if left > x_max or right < x_min or top > y_max or bottom < y_min:
+            continue
+        if skip > 0:
+            # Number of tiles of the quadrant in range
+            count = (min(right, x_max) - max(left, x_min) + 1) * \
+                (min(bottom, y_max) - max(top, y_min) + 1)
+            if count <= skip:
+                skip -= count
+                continue
+        if left >= x_min and right <= x_max and top >= y_min and bottom <= y_max:
+            # Quadrant is completely in range
+            for n in xrange(d + skip, d + size * size):
+                yield decode(z, n)
+            skip = 0
+            continue
+        quarter = (size * size) // 4
+        for i in (3, 2, 1, 0):
+            stack.append((d + i * quarter, k - 1))
+
+
+# Directory layout of each (z, m), see _dirname_layout()
+_DIRNAME_LAYOUTS = dict()
+
+
+def _dirname_layout(z, m):
+    """ Returns (dim, prefix, mdim, format, slices) of directory layout
+
+    Everything in tile_coordiante_to_dirname() which only depends on
+    z and m is calculated once here.
     """
+    try:
+        return _DIRNAME_LAYOUTS[(z, m)]
+    except KeyError:
+        pass
 
     assert z >= 0 and z <= 31
     dim = 2 ** z
-    assert x < dim and x >= 0 and y < dim and y >= 0
-
     zdiff = int(math.floor(math.log(m) / math.log(2)))
+    prefix = '%02d' % z
 
     # layer has less than m*m tiles, just use z as pathname
     if z <= zdiff:
-        return ['%02d' % z, ]
+        layout = (dim, prefix, None, None, None)
+    else:
+        mz = z - zdiff
+        # calculate how many digits are needed
+        digits = len('%x' % (4 ** mz - 1))
+        if digits % 2 != 0:
+            digits += 1
+        # split hex string into 2 char tuple
+        slices = tuple(slice(i, i + 2) for i in range(0, digits, 2))
+        layout = (dim, prefix, 2 ** mz, '%%0%dX' % digits, slices)
 
-    # metatile number
-    mx, my = x // m, y // m
-    mz = z - zdiff
-    mn = 2 ** mz * my + mx
+    _DIRNAME_LAYOUTS[(z, m)] = layout
+    return layout
 
-    # calculate how many digits are needed
-    digits = len('%x' % (4 ** mz - 1))
-    if digits % 2 != 0:
-        digits += 1
-    hex_str = ('%%0%dX' % digits) % mn
 
-    # split hex string into 2 char tuple 
-    dirs = list((hex_str[i:i + 2] for i in range(0, len(hex_str), 2)))
-    dirs.insert(0, '%02d' % z)
+def tile_coordiante_to_dirname(z, x, y, m=64):
 
-    return dirs
+    """ Return a directory tree path for a given tile coordinate
+
+    Groups adjacent m*m tiles in a sub directory to improve file system
+    performance.  Returns a list of directory names, to create a directory str,
+    use os.path.join(*list)
+    """
+
+    dim, prefix, mdim, fmt, slices = _dirname_layout(z, m)
+    assert x < dim and x >= 0 and y < dim and y >= 0
+
+    if mdim is None:
+        return [prefix, ]
 
+    # metatile number
+    hex_str = fmt % (mdim * (y // m) + x // m)
 
-def tile_coordinate_to_sharding_index(z, x, y, m=64):
+    dirs = [prefix, ]
+    dirs.extend(hex_str[s] for s in slices)
+    return dirs
 
-    raise NotImplementedError
 
+def tile_coordiante_to_dirname_array(z, x, y, m=64):
 
+    """ Vectorized tile_coordiante_to_dirname()
 
+    Returns a list of directory name lists, one for each tile.
+    """
+
+    z, x, y = _broadcast_int64(z, x, y)
+    dirnames = [None] * len(z)
+    # Metatile numbers are calculated level by level
+    for level in numpy.unique(z).tolist():
+        dim, prefix, mdim, fmt, slices = _dirname_layout(level, m)
+        positions = numpy.flatnonzero(z == level)
+        xs, ys = x[positions], y[positions]
+        assert numpy.all((xs >= 0) & (xs < dim) & (ys >= 0) & (ys < dim))
+        if mdim is None:
+            for n in positions.tolist():
+                dirnames[n] = [prefix, ]
+            continue
+        numbers = mdim * (ys // m) + xs // m
+        for n, number in zip(positions.tolist(), numbers.tolist()):
+            hex_str = fmt % number
+            dirs = [prefix, ]
+            dirs.extend(hex_str[s] for s in slices)
+            dirnames[n] = dirs
+    return dirnames
+
+
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+
+
+def _mix64(v):
+    # Finalizer of MurmurHash3, a cheap and well distributed 64 bit hash
+    # which is stable across processes and python versions
+    v = ((v ^ (v >> 33)) * 0xFF51AFD7ED558CCD) & _MASK64
+    v = ((v ^ (v >> 33)) * 0xC4CEB9FE1A85EC53) & _MASK64
+    return v ^ (v >> 33)
+
+
+def tile_coordinate_to_sharding_index(z, x, y, shards, m=64):
+
+    """ Return which shard a tile belongs to, in range(shards)
+
+    Adjacent m*m tiles are grouped into one block (same as
+    tile_coordiante_to_dirname()) and always go to the same shard, so
+    a MetaTile whose stride is not larger than m is never split.
+
+    Blocks are assigned using rendezvous (highest random weight) hashing,
+    when a shard is added only blocks moving to the new shard change, a
+    mod-N hashing scheme would reshuffle almost everything.
+    """
 
+    assert shards >= 1
+    assert m >= 1 and m & (m - 1) == 0
+    key = _mix64(int(tile_coordinate_to_serial(z, x // m, y // m)))
+
+    best_shard, best_weight = 0, -1
+    for shard in range(shards):
+        weight = _mix64(key ^ ((shard + 1) * 0x9E3779B97F4A7C15 & _MASK64))
+        if weight > best_weight:
+            best_shard, best_weight = shard, weight
+    return best_shard
+
+
+def tile_coordinate_to_sharding_index_array(z, x, y, shards, m=64):
+    """ Vectorized tile_coordinate_to_sharding_index() """
+    z, x, y = _broadcast_int64(z, x, y)
+    assert numpy.all(z <= 30)
+    serials = (numpy.left_shift(1, 2 * z) - 1) // 3 + \
+        numpy.left_shift(y // m, z) + x // m
+
+    def mix64(v):
+        # numpy uint64 arithmetic wraps around, same as masking
+        v = (v ^ (v >> numpy.uint64(33))) * numpy.uint64(0xFF51AFD7ED558CCD)
+        v = (v ^ (v >> numpy.uint64(33))) * numpy.uint64(0xC4CEB9FE1A85EC53)
+        return v ^ (v >> numpy.uint64(33))
+
+    key = mix64(serials.astype(numpy.uint64))
+    weights = numpy.column_stack(list(
+        mix64(key ^ numpy.uint64((shard + 1) * 0x9E3779B97F4A7C15 & _MASK64))
+        for shard in range(shards)))
+    return numpy.argmax(weights, axis=1)
@@ -4,7 +4,14 @@ Created on Apr 29, 2012
 @author: Kotaimen
 """
 
+import collections
 import copy
+import threading
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 from .tile import TileIndex, Tile, MetaTileIndex, MetaTile
 from .geo import Envelope, Coordinate, create_projection, tile_coordinate_to_serial
@@ -23,6 +30,54 @@ class InvalidTileParameter(Exception):
     pass
 
 
+class _IndexCache(object):
+
+    """ A bounded LRU cache of created TileIndex/MetaTileIndex objects
+
+    Index objects never change after creation so they can be shared
+    between callers.
+    """
+
+    CacheInfo = collections.namedtuple('CacheInfo', 'hits misses maxsize currsize')
+
+    def __init__(self, maxsize):
+        assert maxsize > 0
+        self._maxsize = maxsize
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._cache.pop(key)
+            except KeyError:
+                self._misses += 1
+                return None
+            # Move to most recently used end
+            self._cache[key] = value
+            self._hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._cache[key] = value
+            if len(self._cache) > self._maxsize:
+                self._cache.popitem(last=False)
+
+    def info(self):
+        return self.CacheInfo(self._hits, self._misses,
+                              self._maxsize, len(self._cache))
+
+    # Lock can't be copied or pickled, always start with an empty cache
+    def __getstate__(self):
+        return self._maxsize
+
+    def __setstate__(self, state):
+        self.__init__(state)
+
+
 class Pyramid(object):
 
     """ Represents a quad-tree structure of tile Pyramid
@@ -41,6 +96,7 @@ class Pyramid(object):
                  zoom=None,
                  crs='EPSG:4326',
                  proj='EPSG:3857',
+                 index_cache_size=0,
                  ):
         """
         Create a new Pyramid object:
@@ -75,6 +131,11 @@ class Pyramid(object):
         proj
             Authority ID of map projection, default is 3857 (Google Mecartor)
 
+        index_cache_size
+            Number of recently created TileIndex/MetaTileIndex objects kept
+            for reuse, default is 0, means index objects are not cached.
+            This is a runtime option and is not saved in summary.
+
         """
         assert levels
         assert (tile_size % 256) == 0
@@ -97,6 +158,16 @@ class Pyramid(object):
         self._projector = create_projection(input=self._crs,
                                             output=self._proj)
 
+        # Integer tile range of the envelope on each level, so range check
+        # does not require any projection calculation
+        self._tile_ranges = dict((z, self._calculate_tile_range(z))
+                                 for z in self._levels)
+
+        if index_cache_size > 0:
+            self._index_cache = _IndexCache(index_cache_size)
+        else:
+            self._index_cache = None
+
     # Getter ------------------------------------------------------------------
 
     @property
@@ -167,6 +238,76 @@ class Pyramid(object):
     def calculate_tile_serial(self, z, x, y):
         return tile_coordinate_to_serial(z, x, y)
 
+    def _calculate_tile_range(self, z):
+        proj = self._projector
+        envelope = self._envelope
+        dim = 2 ** z
+
+        left, top = proj.coord2tile(envelope.lefttop, z)
+        right, bottom = proj.coord2tile(envelope.rightbottom, z)
+
+        # Tiles just touching envelope edges are in range as well, same
+        # as Envelope.intersects()
+        if left > 0 and \
+                proj.tile_envelope(z, left - 1, top).right >= envelope.left:
+            left -= 1
+        if right < dim - 1 and \
+                proj.tile_envelope(z, right + 1, top).left <= envelope.right:
+            right += 1
+        if top > 0 and \
+                proj.tile_envelope(z, left, top - 1).bottom <= envelope.top:
+            top -= 1
+        if bottom < dim - 1 and \
+                proj.tile_envelope(z, left, bottom + 1).top >= envelope.bottom:
+            bottom += 1
+
+        return left, top, right, bottom
+
+    def tile_range(self, z):
+        """ Tile range of the pyramid envelope on level z
+
+        Returns a (x_min, y_min, x_max, y_max) tuple, inclusive.
+        """
+        try:
+            return self._tile_ranges[z]
+        except KeyError:
+            raise TileOutOfRange('Invalid layer "%d"' % z)
+
+    def tiles_in_range(self, z):
+        """ Iterate over (x, y) of all tiles on level z in the envelope """
+        x_min, y_min, x_max, y_max = self.tile_range(z)
+        for x in xrange(x_min, x_max + 1):
+            for y in xrange(y_min, y_max + 1):
+                yield x, y
+
+    def tiles_in_range_array(self, z):
+        """ All tiles on level z in the envelope as a (xs, ys) tuple of
+        numpy arrays, same order as tiles_in_range() """
+        if numpy is None:
+            raise ImportError('tiles_in_range_array requires numpy')
+        x_min, y_min, x_max, y_max = self.tile_range(z)
+        xs, ys = numpy.meshgrid(numpy.arange(x_min, x_max + 1, dtype=numpy.int64),
+                                numpy.arange(y_min, y_max + 1, dtype=numpy.int64),
+                                indexing='ij')
+        return xs.ravel(), ys.ravel()
+
+    def calculate_tile_envelope_array(self, z, x, y):
+        """ Envelopes of many tiles as a Nx4 (left, bottom, right, top) array """
+        return self._projector.tile_envelope_array(z, x, y)
+
+    def calculate_tile_buffered_envelope_array(self, z, x, y):
+        """ Buffered envelopes of many tiles as a Nx4 array """
+        return self._projector.tile_buffered_envelope_array(z, x, y,
+                                                            self._tile_size,
+                                                            self._buffer)
+
+    def index_cache_info(self):
+        """ Returns (hits, misses, maxsize, currsize) of the index cache,
+        or None if index cache is disabled """
+        if self._index_cache is None:
+            return None
+        return self._index_cache.info()
+
     # Persistence --------------------------------------------------------------
 
     def summarize(self):
@@ -213,10 +354,19 @@ class Pyramid(object):
         if y < 0 or y >= dim:
             y = y % dim
 
-        tile_index = TileIndex(self, z, x, y)
-        if range_check and not tile_index.envelope.intersects(self._envelope):
-            raise TileOutOfRange('Tile out of range')
+        if range_check:
+            x_min, y_min, x_max, y_max = self._tile_ranges[z]
+            if x < x_min or x > x_max or y < y_min or y > y_max:
+                raise TileOutOfRange('Tile out of range')
 
+        if self._index_cache is None:
+            return TileIndex(self, z, x, y)
+
+        key = (z, x, y, None)
+        tile_index = self._index_cache.get(key)
+        if tile_index is None:
+            tile_index = TileIndex(self, z, x, y)
+            self._index_cache.put(key, tile_index)
         return tile_index
 
     def create_tile(self, z, x, y, data, mtime=None):
@@ -246,7 +396,15 @@ class Pyramid(object):
         if (stride >> z) > 0:
             stride = dim
 
-        return MetaTileIndex(self, z, x, y, stride)
+        if self._index_cache is None:
+            return MetaTileIndex(self, z, x, y, stride)
+
+        key = (z, x, y, stride)
+        metatile_index = self._index_cache.get(key)
+        if metatile_index is None:
+            metatile_index = MetaTileIndex(self, z, x, y, stride)
+            self._index_cache.put(key, metatile_index)
+        return metatile_index
 
     def create_metatile(self, z, x, y, stride, data, mtime=None):
         tile_index = self.create_metatile_index(z, x, y, stride)
@@ -0,0 +1,193 @@
+"""
+Raster MetaTile
+
+Passes rasters between render nodes as numpy arrays, so a node working
+on pixels doesn't have to decode the output of its source, and encoded
+data is only created when it is actually needed, eg: written to a
+cache or a storage.
+
+Encoding and decoding use GDAL in-memory files, no temporary file is
+created on disk.
+
+Created on Oct 18, 2026
+@author: Kotaimen
+"""
+
+import time
+import itertools
+
+import numpy
+from osgeo import gdal, gdal_array
+
+from .tile import MetaTile
+
+# GDAL driver of each format name
+GDAL_DRIVERS = dict(GTIFF='GTiff',
+                    TIFF='GTiff',
+                    PNG='PNG',
+                    PNG256='PNG',
+                    JPG='JPEG',)
+
+_vsimem_ids = itertools.count()
+
+
+def _vsimem_filename(fmt):
+    # next() on itertools.count is atomic under the GIL
+    return '/vsimem/mason-raster-%d%s' % (next(_vsimem_ids), fmt.extension)
+
+
+def encode_raster(array, fmt, geotransform=None, projection=None,
+                  nodata=None):
+    """ Encode a (height, width) or (bands, height, width) array into
+    given format, returns bytes """
+    driver = gdal.GetDriverByName(GDAL_DRIVERS[fmt.name])
+    dataset = gdal_array.OpenArray(numpy.ascontiguousarray(array))
+    if geotransform is not None:
+        dataset.SetGeoTransform(geotransform)
+    if projection:
+        dataset.SetProjection(projection)
+    if nodata is not None:
+        for band in range(dataset.RasterCount):
+            dataset.GetRasterBand(band + 1).SetNoDataValue(nodata)
+
+    filename = _vsimem_filename(fmt)
+    try:
+        target = driver.CreateCopy(filename, dataset)
+        if target is None:
+            raise RuntimeError('Failed to encode raster as %s' % fmt.name)
+        # Flush to the in-memory file
+        target = None
+
+        fp = gdal.VSIFOpenL(filename, 'rb')
+        try:
+            gdal.VSIFSeekL(fp, 0, 2)
+            size = gdal.VSIFTellL(fp)
+            gdal.VSIFSeekL(fp, 0, 0)
+            return bytes(gdal.VSIFReadL(1, size, fp))
+        finally:
+            gdal.VSIFCloseL(fp)
+    finally:
+        dataset = None
+        gdal.Unlink(filename)
+
+
+def decode_raster(data, fmt):
+    """ Decode raster data, returns (array, geotransform, projection,
+    nodata), array is (height, width) for single band rasters """
+    filename = _vsimem_filename(fmt)
+    gdal.FileFromMemBuffer(filename, data)
+    try:
+        dataset = gdal.Open(filename)
+        if dataset is None:
+            raise RuntimeError('Failed to decode raster as %s' % fmt.name)
+        array = dataset.ReadAsArray()
+        geotransform = dataset.GetGeoTransform()
+        projection = dataset.GetProjection()
+        nodata = dataset.GetRasterBand(1).GetNoDataValue()
+        return array, geotransform, projection, nodata
+    finally:
+        dataset = None
+        gdal.Unlink(filename)
+
+
+class RasterMetaTile(MetaTile):
+
+    """ MetaTile holds raster as an array and/or encoded data
+
+    A RasterMetaTile created from an array encodes its data on first
+    access of data, one created from encoded data decodes its array on
+    first access of array, conversion is done once.  Threads reading a
+    shared MetaTile may both convert on first access, the array is set
+    only after its georeference, so neither sees a half decoded one.
+
+    Create using from_array() or from_metatile().
+    """
+
+    def __init__(self, index, data, fmt, mtime, array=None,
+                 geotransform=None, projection=None, nodata=None):
+        assert data is not None or array is not None
+        assert RasterMetaTile.supports(fmt)
+        if data is None:
+            # Skip data check of MetaTile, data is encoded on demand
+            MetaTile.__init__(self, index, b'', fmt, mtime)
+            self._data = None
+        else:
+            MetaTile.__init__(self, index, data, fmt, mtime)
+        self._array = array
+        self._geotransform = geotransform
+        self._projection = projection
+        self._nodata = nodata
+
+    @staticmethod
+    def supports(fmt):
+        """ Whether given format can be encoded and decoded """
+        return fmt.name in GDAL_DRIVERS
+
+    @staticmethod
+    def from_array(index, array, fmt, geotransform=None, projection=None,
+                   nodata=None, mtime=None):
+        if mtime is None:
+            mtime = time.time()
+        return RasterMetaTile(index, None, fmt, mtime, array, geotransform,
+                              projection, nodata)
+
+    @staticmethod
+    def from_metatile(metatile):
+        """ Take a raster MetaTile as RasterMetaTile, eg: a MetaTile read
+        from cache, its array is decoded on demand """
+        if isinstance(metatile, RasterMetaTile):
+            return metatile
+        return RasterMetaTile(metatile.index, metatile.data, metatile.format,
+                              metatile.mtime)
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = encode_raster(self._array, self._format,
+                                       self._geotransform, self._projection,
+                                       self._nodata)
+        return self._data
+
+    @property
+    def data_hash(self):
+        # Make sure data is encoded
+        self.data
+        return MetaTile.data_hash.fget(self)
+
+    @property
+    def array(self):
+        if self._array is None:
+            self._decode()
+        return self._array
+
+    @property
+    def geotransform(self):
+        if self._array is None:
+            self._decode()
+        return self._geotransform
+
+    @property
+    def projection(self):
+        if self._array is None:
+            self._decode()
+        return self._projection
+
+    @property
+    def nodata(self):
+        if self._array is None:
+            self._decode()
+        return self._nodata
+
+    def _decode(self):
+        array, geotransform, projection, nodata = \
+            decode_raster(self._data, self._format)
+        self._geotransform = geotransform
+        self._projection = projection
+        self._nodata = nodata
+        # Set last, other attributes are decoded when array is not None
+        self._array = array
+
+    def __repr__(self):
+        return 'RasterMetaTile(%d/%d/%d@%d)' % (self.index.z, self.index.x,
+                                                self.index.y,
+                                                self.index.stride)
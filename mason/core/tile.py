@@ -5,6 +5,7 @@ Created on Apr 29, 2012
 @author: Kotaimen
 """
 
+import collections
 import hashlib
 import time
 
@@ -14,16 +15,21 @@ from .geo import Envelope
 
 class TileIndex(object):
 
-    """ Coordinate & index of a Tile object """
+    """ Coordinate & index of a Tile object
+
+    Only tile coordinate is stored, envelope and serial are calculated
+    using the Pyramid on first access and cached.
+    """
+
+    __slots__ = '_pyramid', '_coord', '_envelope', '_buffered_envelope', \
+        '_serial'
 
     def __init__(self, pyramid, z, x, y):
+        self._pyramid = pyramid
         self._coord = z, x, y
-        self._buffer = pyramid.buffer
-        self._tile_size = pyramid.tile_size
-        # Calculate envelope and serial so Tile can be detached from Pyramid
-        self._envelope = pyramid.calculate_tile_envelope(z, x, y)
-        self._buffered_envelope = pyramid.calculate_tile_buffered_envelope(z, x, y)
-        self._serial = pyramid.calculate_tile_serial(z, x, y)
+        self._envelope = None
+        self._buffered_envelope = None
+        self._serial = None
 
     @property
     def z(self):
@@ -43,33 +49,45 @@ class TileIndex(object):
 
     @property
     def buffer(self):
-        return self._buffer
+        return self._pyramid.buffer
 
     @property
     def envelope(self):
+        if self._envelope is None:
+            self._envelope = self._calculate_envelope()
         return self._envelope
 
     @property
     def buffered_envelope(self):
+        if self._buffered_envelope is None:
+            self._buffered_envelope = self._calculate_buffered_envelope()
         return self._buffered_envelope
 
     @property
     def serial(self):
+        if self._serial is None:
+            self._serial = self._pyramid.calculate_tile_serial(*self._coord)
         return self._serial
 
     @property
     def tile_size(self):
-        return self._tile_size
+        return self._pyramid.tile_size
 
     @property
     def buffered_tile_size(self):
-        return self._tile_size + self._buffer * 2
+        return self.tile_size + self.buffer * 2
+
+    def _calculate_envelope(self):
+        return self._pyramid.calculate_tile_envelope(*self._coord)
+
+    def _calculate_buffered_envelope(self):
+        return self._pyramid.calculate_tile_buffered_envelope(*self._coord)
 
     def __hash__(self):
-        return hash(self._serial)
+        return hash(self.serial)
 
     def __cmp__(self, other):
-        return self._serial - other._serial
+        return self.serial - other.serial
 
     def __repr__(self):
         return 'TileIndex(%d/%d/%d)' % self._coord
@@ -144,48 +162,89 @@ class Tile(object):
         return 'Tile(%d/%d/%d)' % self._index.coord
 
 
-class MetaTileIndex(TileIndex):
+class MetaTileFission(collections.Sequence):
 
-    """ Coordinate index of a MetaTile object """
+    """ Read only sequence of TileIndexes in a MetaTile
 
-    def __init__(self, pyramid, z, x, y, stride):
-        TileIndex.__init__(self, pyramid, z, x, y)
+    TileIndexes are created on demand, ordered column by column (x major)
+    as the metatile is cropped.
+    """
+
+    __slots__ = '_pyramid', '_coord', '_stride'
 
+    def __init__(self, pyramid, z, x, y, stride):
+        self._pyramid = pyramid
+        self._coord = z, x, y
         self._stride = stride
 
-        # A list of TileIndexes in the MetaTile
-        self._indexes = list()
-        for i in range(x, x + stride):
-            for j in range(y, y + stride):
-                # Ignore range check and buffer here
-                index = pyramid.create_tile_index(z, i, j,
-                                                  range_check=False)
-                self._indexes.append(index)
+    def __len__(self):
+        return self._stride * self._stride
 
+    def __getitem__(self, n):
+        if isinstance(n, slice):
+            return list(self[i] for i in xrange(*n.indices(len(self))))
+        if n < 0:
+            n += len(self)
+        if n < 0 or n >= len(self):
+            raise IndexError('MetaTile fission index out of range')
         z, x, y = self._coord
-        left_bottom_index = pyramid.create_tile_index(z, x, y + stride - 1, range_check=False)
-        right_top_index = pyramid.create_tile_index(z, x + stride - 1, y, range_check=False)
-        left_bottom = left_bottom_index.envelope.leftbottom
-        right_top = right_top_index.envelope.righttop
-        self._envelope = Envelope(left_bottom.lon, left_bottom.lat,
-                                  right_top.lon, right_top.lat)
-        buffered_left_bottom = left_bottom_index._buffered_envelope.leftbottom
-        buffered_right_top = right_top_index._buffered_envelope.righttop
-        self._buffered_envelope = Envelope(buffered_left_bottom.lon,
-                                           buffered_left_bottom.lat,
-                                           buffered_right_top.lon,
-                                           buffered_right_top.lat)
-
-        # Overwrite tilesize
-        self._tile_size = self._tile_size * stride
+        i, j = divmod(n, self._stride)
+        # Ignore range check and buffer here
+        return self._pyramid.create_tile_index(z, x + i, y + j,
+                                               range_check=False)
+
+    def __iter__(self):
+        z, x, y = self._coord
+        create_tile_index = self._pyramid.create_tile_index
+        for i in xrange(x, x + self._stride):
+            for j in xrange(y, y + self._stride):
+                yield create_tile_index(z, i, j, range_check=False)
+
+    def __repr__(self):
+        return 'MetaTileFission(%d/%d/%d@%d)' % (self._coord + (self._stride,))
+
+
+class MetaTileIndex(TileIndex):
+
+    """ Coordinate index of a MetaTile object """
+
+    __slots__ = '_stride',
+
+    def __init__(self, pyramid, z, x, y, stride):
+        TileIndex.__init__(self, pyramid, z, x, y)
+        self._stride = stride
 
     @property
     def stride(self):
         return self._stride
 
+    @property
+    def tile_size(self):
+        return self._pyramid.tile_size * self._stride
+
+    def _calculate_envelope(self):
+        # Envelope of the metatile is made of left bottom tile and
+        # right top tile
+        z, x, y = self._coord
+        stride = self._stride
+        left_bottom = self._pyramid.calculate_tile_envelope(z, x, y + stride - 1)
+        right_top = self._pyramid.calculate_tile_envelope(z, x + stride - 1, y)
+        return Envelope(left_bottom.left, left_bottom.bottom,
+                        right_top.right, right_top.top)
+
+    def _calculate_buffered_envelope(self):
+        z, x, y = self._coord
+        stride = self._stride
+        calculate = self._pyramid.calculate_tile_buffered_envelope
+        left_bottom = calculate(z, x, y + stride - 1)
+        right_top = calculate(z, x + stride - 1, y)
+        return Envelope(left_bottom.left, left_bottom.bottom,
+                        right_top.right, right_top.top)
+
     def fission(self):
-        """ Get a list of TileIndexes belongs to the MetaTileIndex """
-        return self._indexes
+        """ Get a sequence of TileIndexes belongs to the MetaTileIndex """
+        return MetaTileFission(self._pyramid, self.z, self.x, self.y,
+                               self._stride)
 
     def __repr__(self):
         return 'MetaTileIndex(%d/%d/%d@%d)' % (self.z, self.x, self.y, self.stride)
@@ -0,0 +1,211 @@
+"""
+Columnar tile index array
+
+Holds tile coordinates as numpy columns, so bulk operations on large
+number of tiles don't have to create a TileIndex object for each tile.
+
+Created on Oct 18, 2026
+@author: Kotaimen
+"""
+
+import os
+
+import numpy
+
+from .geo import tile_coordiante_to_dirname_array
+
+
+class TileIndexArray(object):
+
+    """ An array of TileIndexes (or MetaTileIndexes) stored as z/x/y columns
+
+    When stride is None, items are TileIndex, otherwise items are
+    MetaTileIndex of given stride and coordinates are left top tile of
+    the metatile.  Items are created on demand from the Pyramid when
+    indexing or iterating over the array.
+
+    Indexing using a slice, a boolean mask or an integer array returns
+    a new TileIndexArray.
+    """
+
+    def __init__(self, pyramid, z, x, y, stride=None):
+        z, x, y = numpy.broadcast_arrays(
+            numpy.atleast_1d(numpy.asarray(z, dtype=numpy.int64)),
+            numpy.atleast_1d(numpy.asarray(x, dtype=numpy.int64)),
+            numpy.atleast_1d(numpy.asarray(y, dtype=numpy.int64)))
+        self._pyramid = pyramid
+        # broadcast_arrays returns read only views, make a real copy
+        self._z = numpy.array(z.ravel())
+        self._x = numpy.array(x.ravel())
+        self._y = numpy.array(y.ravel())
+        self._stride = stride
+
+    @staticmethod
+    def from_indexes(pyramid, indexes, stride=None):
+        """ Create array from an iterable of TileIndex objects """
+        coords = numpy.array(list(index.coord for index in indexes),
+                             dtype=numpy.int64).reshape(-1, 3)
+        return TileIndexArray(pyramid, coords[:, 0], coords[:, 1],
+                              coords[:, 2], stride)
+
+    @staticmethod
+    def concatenate(arrays):
+        """ Join a non-empty list of arrays created from same pyramid """
+        first = arrays[0]
+        return TileIndexArray(first._pyramid,
+                              numpy.concatenate(list(a._z for a in arrays)),
+                              numpy.concatenate(list(a._x for a in arrays)),
+                              numpy.concatenate(list(a._y for a in arrays)),
+                              first._stride)
+
+    # Property ----------------------------------------------------------------
+
+    @property
+    def pyramid(self):
+        return self._pyramid
+
+    @property
+    def z(self):
+        return self._z
+
+    @property
+    def x(self):
+        return self._x
+
+    @property
+    def y(self):
+        return self._y
+
+    @property
+    def stride(self):
+        return self._stride
+
+    @property
+    def coords(self):
+        """ Nx3 array of (z, x, y) """
+        return numpy.column_stack((self._z, self._x, self._y))
+
+    # Sequence ----------------------------------------------------------------
+
+    def __len__(self):
+        return len(self._z)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, long, numpy.integer)):
+            return self._create_index(self._z[key], self._x[key], self._y[key])
+        return TileIndexArray(self._pyramid, self._z[key], self._x[key],
+                              self._y[key], self._stride)
+
+    def __iter__(self):
+        create_index = self._create_index
+        for z, x, y in zip(self._z.tolist(), self._x.tolist(), self._y.tolist()):
+            yield create_index(z, x, y)
+
+    def _create_index(self, z, x, y):
+        if self._stride is None:
+            return self._pyramid.create_tile_index(int(z), int(x), int(y),
+                                                   range_check=False)
+        else:
+            return self._pyramid.create_metatile_index(int(z), int(x), int(y),
+                                                       self._stride)
+
+    def __repr__(self):
+        if self._stride is None:
+            return 'TileIndexArray(%d tiles)' % len(self)
+        else:
+            return 'TileIndexArray(%d metatiles@%d)' % (len(self), self._stride)
+
+    # Geometry ----------------------------------------------------------------
+
+    def serials(self):
+        """ Tile serials, see tile_coordinate_to_serial() """
+        z, x, y = self._z, self._x, self._y
+        assert numpy.all(z <= 30)
+        return (numpy.left_shift(1, 2 * z) - 1) // 3 + \
+            numpy.left_shift(y, z) + x
+
+    def envelopes(self):
+        """ Nx4 array of (left, bottom, right, top) """
+        if self._stride is None:
+            return self._pyramid.calculate_tile_envelope_array(self._z,
+                                                               self._x,
+                                                               self._y)
+        left_bottom, right_top = self._corners()
+        envelope = self._pyramid.calculate_tile_envelope_array
+        return self._join_corners(envelope(*left_bottom),
+                                  envelope(*right_top))
+
+    def buffered_envelopes(self):
+        """ Nx4 array of buffered (left, bottom, right, top) """
+        if self._stride is None:
+            return self._pyramid.calculate_tile_buffered_envelope_array(self._z,
+                                                                        self._x,
+                                                                        self._y)
+        left_bottom, right_top = self._corners()
+        envelope = self._pyramid.calculate_tile_buffered_envelope_array
+        return self._join_corners(envelope(*left_bottom),
+                                  envelope(*right_top))
+
+    def _strides(self):
+        # Stride is limited by number of tiles in the layer, same as
+        # Pyramid.create_metatile_index()
+        return numpy.minimum(self._stride, numpy.left_shift(1, self._z))
+
+    def _corners(self):
+        strides = self._strides()
+        left_bottom = (self._z, self._x, self._y + strides - 1)
+        right_top = (self._z, self._x + strides - 1, self._y)
+        return left_bottom, right_top
+
+    @staticmethod
+    def _join_corners(left_bottom, right_top):
+        return numpy.column_stack((left_bottom[:, 0], left_bottom[:, 1],
+                                   right_top[:, 2], right_top[:, 3]))
+
+    def dirnames(self, m=64):
+        """ Directory names of each tile, see tile_coordiante_to_dirname() """
+        return tile_coordiante_to_dirname_array(self._z, self._x, self._y, m)
+
+    def dirpaths(self, m=64):
+        """ Joined directory path of each tile """
+        return list(os.path.join(*dirs) for dirs in self.dirnames(m))
+
+    # Metatile ----------------------------------------------------------------
+
+    def metatiles(self, stride):
+        """ Group tiles into metatiles
+
+        Returns a (metatiles, inverse) tuple, metatiles is a TileIndexArray
+        of unique metatiles covering all tiles in the array, inverse is
+        position of the metatile in metatiles for each tile.
+        """
+        if stride < 1 or stride & (stride - 1) != 0:
+            raise ValueError('stride must be power of 2, got %d' % stride)
+        z = self._z
+        strides = numpy.minimum(stride, numpy.left_shift(1, z))
+        x = self._x - self._x % strides
+        y = self._y - self._y % strides
+        serials = TileIndexArray(self._pyramid, z, x, y).serials()
+        _unique, first, inverse = numpy.unique(serials, return_index=True,
+                                               return_inverse=True)
+        metatiles = TileIndexArray(self._pyramid, z[first], x[first],
+                                   y[first], stride)
+        return metatiles, inverse
+
+    def fission(self):
+        """ Expand metatiles into a TileIndexArray of all tiles in them
+
+        Tiles of each metatile are contiguous and ordered same as
+        MetaTileIndex.fission().
+        """
+        assert self._stride is not None
+        strides = self._strides()
+        counts = strides * strides
+        z = numpy.repeat(self._z, counts)
+        x = numpy.repeat(self._x, counts)
+        y = numpy.repeat(self._y, counts)
+        s = numpy.repeat(strides, counts)
+        # Position of the tile inside its metatile
+        starts = numpy.cumsum(counts) - counts
+        n = numpy.arange(len(z), dtype=numpy.int64) - numpy.repeat(starts, counts)
+        return TileIndexArray(self._pyramid, z, x + n // s, y + n % s)
@@ -5,13 +5,85 @@ Created on Aug 31, 2012
 @author: Kotaimen
 """
 
-from .geo import GoogleMercatorProjection, Envelope
+from .geo import (GoogleMercatorProjection, Envelope, CURVE_ORDERS, walk_curve,
+                  serial_to_tile_coordinate_array,
+                  tile_coordinate_to_morton_array,
+                  tile_coordinate_to_hilbert_array,
+                  morton_to_tile_coordinate_array,
+                  hilbert_to_tile_coordinate_array)
 
+import collections
 import csv
+import itertools
+import os
+
+try:
+    import numpy
+    from .tilearray import TileIndexArray
+    from .coverage import Coverage, create_coverage
+except ImportError:
+    # walk_array() and CoverageWalker requires numpy
+    numpy = None
+
+
+def _chunk_indexes(pyramid, indexes, stride, chunk_size):
+    coords = list()
+    for index in indexes:
+        coords.append(index.coord)
+        if len(coords) >= chunk_size:
+            yield _make_array(pyramid, coords, stride)
+            coords = list()
+    if coords:
+        yield _make_array(pyramid, coords, stride)
+
+
+def _make_array(pyramid, coords, stride):
+    coords = numpy.array(coords, dtype=numpy.int64)
+    return TileIndexArray(pyramid, coords[:, 0], coords[:, 1],
+                          coords[:, 2], stride)
+
+
+def _shard_range(count, shard, shards):
+    """ Contiguous [start, stop) of count items belongs to given shard """
+    assert 0 <= shard < shards
+    return count * shard // shards, count * (shard + 1) // shards
+
+
+class WalkCursor(collections.namedtuple('_WalkCursor', 'shard shards position')):
+
+    """ Position of a walk, pass to walk() to resume from the position
+
+    position is a tuple of integers whose meaning is defined by the
+    walker, it is only valid for the walker configuration (and shard)
+    it is created from.
+    """
+
+    def make_dict(self):
+        return self._asdict()
+
+    @staticmethod
+    def from_dict(mapping):
+        return WalkCursor(int(mapping['shard']),
+                          int(mapping['shards']),
+                          tuple(mapping['position']))
 
 
 class PyramidWalker(object):
-    def __init__(self, pyramid, levels=None, stride=1, envelope=None):
+
+    """ Walk metatiles in an envelope level by level
+
+    By default metatiles are walked column by column, set order to
+    'hilbert' or 'morton' to walk each level along a space filling
+    curve, so consecutive metatiles are also close on the map.
+
+    Metatiles of each level can be split into several shards, each
+    shard is a contiguous range of the walk, so metatiles in a shard are
+    still close to each other.  Walker.cursor is updated after every
+    metatile is walked, a walk can be resumed later from the cursor.
+    """
+
+    def __init__(self, pyramid, levels=None, stride=1, envelope=None,
+                 order=None):
         self._pyramid = pyramid
         if levels is not None:
             self._levels = levels
@@ -20,29 +92,267 @@ class PyramidWalker(object):
         if envelope is not None:
             self._envelope = Envelope.from_tuple(envelope)
         else:
-            self._envelope = pyramid.envleope
+            self._envelope = pyramid.envelope
         self._stride = stride
+        assert order is None or order in CURVE_ORDERS
+        self._order = order
+        self._shard, self._shards = 0, 1
+        self._position = None
         assert pyramid.projection == 'EPSG:3857'
         self._proj = GoogleMercatorProjection()
 
-    def walk(self):
+    def _metatile_range(self, z):
         stride = self._stride
-        for z in self._levels:
-            left, top = self._proj.coord2tile(self._envelope.lefttop, z)
-            right, bottom = self._proj.coord2tile(self._envelope.rightbottom, z)
+        left, top = self._proj.coord2tile(self._envelope.lefttop, z)
+        right, bottom = self._proj.coord2tile(self._envelope.rightbottom, z)
+
+        x_min = left // stride * stride
+        y_min = top // stride * stride
+
+        x_max = ((right // stride) + 1) * stride
+        y_max = ((bottom // stride) + 1) * stride
+
+        return x_min, y_min, x_max, y_max
+
+    @property
+    def levels(self):
+        return list(self._levels)
+
+    def count(self, z, shard=0, shards=1):
+        """ Number of metatiles walked in level z of given shard """
+        start, stop = _shard_range(self._level_count(z), shard, shards)
+        return stop - start
+
+    @property
+    def cursor(self):
+        """ Cursor right after last walked metatile, None if walk() has not
+        been started yet """
+        if self._position is None:
+            return None
+        return WalkCursor(self._shard, self._shards, self._position)
+
+    def _level_count(self, z):
+        """ Number of metatiles walked in level z """
+        x_min, y_min, x_max, y_max = self._metatile_range(z)
+        stride = self._stride
+        if self._order is None:
+            return len(xrange(x_min, x_max, stride)) * \
+                len(xrange(y_min, y_max, stride))
+        else:
+            step = min(stride, 2 ** z)
+            return len(xrange(x_min, min(x_max, 2 ** z), step)) * \
+                len(xrange(y_min, min(y_max, 2 ** z), step))
+
+    def _level_coords(self, z, start, stop, resume=()):
+        """ Iterate (x, y) of metatiles in level z from start to stop in
+        walk order, stop is None for end of the level, resume is rest of
+        the cursor position after (z, offset), see _resume_key() """
+        x_min, y_min, x_max, y_max = self._metatile_range(z)
+        stride = self._stride
+        if self._order is None:
+            if stop is None:
+                stop = self._level_count(z)
+            xs = xrange(x_min, x_max, stride)
+            ys = xrange(y_min, y_max, stride)
+            rows = len(ys)
+            for n in xrange(start, stop):
+                yield xs[n // rows], ys[n % rows]
+        else:
+            # Walk the curve on the level where one metatile is a
+            # tile, stride is limited by size of the level
+            step = min(stride, 2 ** z)
+            curve_z = z - (len(bin(step)) - 3)
+            curve = walk_curve(self._order, curve_z,
+                               x_min // step, y_min // step,
+                               min(x_max, 2 ** z) // step - 1,
+                               min(y_max, 2 ** z) // step - 1,
+                               start=start)
+            if stop is not None:
+                curve = itertools.islice(curve, stop - start)
+            for x, y in curve:
+                yield x * step, y * step
+
+    def _resume_key(self, z, x, y):
+        """ Rest of cursor position after (z, offset) of last walked
+        metatile (x, y), passed back to _level_coords() as resume """
+        return ()
+
+    def _level_range(self, z, shard, shards):
+        """ [start, stop) of the shard in level z, the level is only
+        counted when sharded, stop is None otherwise """
+        if shards == 1:
+            return 0, None
+        return _shard_range(self._level_count(z), shard, shards)
+
+    def _walk_ranges(self, shard, shards, cursor):
+        """ Iterate (z, start, stop, offset, resume) of levels to walk,
+        where [start, stop) is the shard in the level, offset is number
+        of metatiles in the shard already walked and resume is rest of
+        cursor position in the level """
+        self._shard, self._shards = shard, shards
+        self._position = None
+        levels = list(self._levels)
+        resume_z, resume_offset, resume = None, 0, ()
+        if cursor is not None:
+            assert (cursor.shard, cursor.shards) == (shard, shards), \
+                'Cursor is created by another shard'
+            resume_z, resume_offset = cursor.position[:2]
+            resume = tuple(cursor.position[2:])
+            levels = levels[levels.index(resume_z):]
+        for z in levels:
+            start, stop = self._level_range(z, shard, shards)
+            if z == resume_z:
+                yield z, start, stop, resume_offset, resume
+            else:
+                yield z, start, stop, 0, ()
+
+    def walk(self, shard=0, shards=1, cursor=None):
+        """ Iterate metatiles in given shard, optionally resume from a
+        cursor returned by a previous walk """
+        stride = self._stride
+        create_metatile_index = self._pyramid.create_metatile_index
+        for z, start, stop, offset, resume in \
+                self._walk_ranges(shard, shards, cursor):
+            self._position = (z, offset) + resume
+            for x, y in self._level_coords(z, start + offset, stop, resume):
+                offset += 1
+                self._position = (z, offset) + self._resume_key(z, x, y)
+                yield create_metatile_index(z, x, y, stride)
+
+    def walk_level(self, z, shard=0, shards=1):
+        """ Iterate metatiles of level z in given shard, cursor is not
+        updated, so several levels can be walked side by side """
+        stride = self._stride
+        create_metatile_index = self._pyramid.create_metatile_index
+        start, stop = self._level_range(z, shard, shards)
+        for x, y in self._level_coords(z, start, stop):
+            yield create_metatile_index(z, x, y, stride)
+
+    def walk_array(self, chunk_size=65536, shard=0, shards=1, cursor=None):
+        """ Same as walk() but yields metatiles in TileIndexArrays
+
+        Each array contains at most chunk_size metatiles, in the same
+        order as walk(), cursor is updated after each array.
+        """
+        stride = self._stride
+        if self._order is not None:
+            for array in _chunk_indexes(self._pyramid,
+                                        self.walk(shard, shards, cursor),
+                                        stride, chunk_size):
+                yield array
+            return
+        for z, start, stop, offset, _resume in \
+                self._walk_ranges(shard, shards, cursor):
+            if stop is None:
+                stop = self._level_count(z)
+            self._position = (z, offset)
+            x_min, y_min, x_max, y_max = self._metatile_range(z)
+            rows = len(xrange(y_min, y_max, stride))
+            for begin in xrange(start + offset, stop, chunk_size):
+                end = min(begin + chunk_size, stop)
+                n = numpy.arange(begin, end, dtype=numpy.int64)
+                self._position = (z, end - start)
+                yield TileIndexArray(self._pyramid, z,
+                                     x_min + n // rows * stride,
+                                     y_min + n % rows * stride,
+                                     stride)
+
+
+class CoverageWalker(PyramidWalker):
+
+    """ Walk only metatiles intersects a coverage
+
+    coverage is a Coverage object or a file name passed to
+    create_coverage(), eg: a GeoJSON/shapefile polygon or a raster mask.
+    Each level is walked as a quad tree, quadrants outside the coverage
+    are pruned without looking at any metatile inside them.
+
+    Cursor position also keeps the last walked metatile, a resumed walk
+    seeks to it along the quad tree.  Levels are only counted when the
+    walk is sharded, counting remembers every MARK_INTERVAL-th metatile
+    so a shard seeks to the mark before its first metatile.
+    """
+
+    MARK_INTERVAL = 4096
 
-            x_min = left // stride * stride
-            y_min = top // stride * stride
+    def __init__(self, pyramid, coverage, levels=None, stride=1,
+                 envelope=None):
+        PyramidWalker.__init__(self, pyramid, levels, stride, envelope)
+        assert numpy is not None, 'CoverageWalker requires numpy'
+        if not isinstance(coverage, Coverage):
+            coverage = create_coverage(coverage)
+        self._coverage = coverage
+        # level -> (count, marks)
+        self._counts = dict()
 
-            x_max = ((right // stride) + 1) * stride
-            y_max = ((bottom // stride) + 1) * stride
+    def _coverage_coords(self, z, start=None):
+        x_min, y_min, x_max, y_max = self._metatile_range(z)
+        # Walk the quad tree on the level where one metatile is a tile
+        step = min(self._stride, 2 ** z)
+        coverage_z = z - (len(bin(step)) - 3)
+        return self._coverage.walk(coverage_z,
+                                   x_min // step, y_min // step,
+                                   min(x_max, 2 ** z) // step - 1,
+                                   min(y_max, 2 ** z) // step - 1,
+                                   start=start)
 
-            for x in xrange(x_min, x_max, stride):
-                for y in xrange(y_min, y_max, stride):
-                    yield self._pyramid.create_metatile_index(z, x, y, stride)
+    def _count(self, z):
+        if z not in self._counts:
+            # Note this walks the coverage once more
+            count, marks = 0, list()
+            for coord in self._coverage_coords(z):
+                if count % self.MARK_INTERVAL == 0:
+                    marks.append(coord)
+                count += 1
+            self._counts[z] = count, marks
+        return self._counts[z]
+
+    def _level_count(self, z):
+        return self._count(z)[0]
+
+    def _level_coords(self, z, start, stop, resume=()):
+        step = min(self._stride, 2 ** z)
+        if resume:
+            # Seek to last walked metatile, which is walked already
+            coords = itertools.islice(self._coverage_coords(z, resume), 1,
+                                      None)
+        elif start > 0:
+            count, marks = self._count(z)
+            if start >= count:
+                return
+            mark = start // self.MARK_INTERVAL
+            coords = itertools.islice(self._coverage_coords(z, marks[mark]),
+                                      start - mark * self.MARK_INTERVAL,
+                                      None)
+        else:
+            coords = self._coverage_coords(z)
+        if stop is not None:
+            coords = itertools.islice(coords, stop - start)
+        for x, y in coords:
+            yield x * step, y * step
+
+    def _resume_key(self, z, x, y):
+        step = min(self._stride, 2 ** z)
+        return (x // step, y // step)
+
+    def walk_array(self, chunk_size=65536, shard=0, shards=1, cursor=None):
+        """ Same as walk() but yields metatiles in TileIndexArrays of at
+        most chunk_size metatiles """
+        return _chunk_indexes(self._pyramid,
+                              self.walk(shard, shards, cursor),
+                              self._stride, chunk_size)
 
 
 class TileListPyramidWalker(object):
+
+    """ Walk metatiles of tiles listed in a CSV file of z,x,y rows
+
+    When levels is given, each listed tile is expanded to metatiles
+    covering it in each level.  Sharding splits rows of the file into
+    contiguous ranges, cursor position is (row, metatiles walked in the
+    row).
+    """
+
     def __init__(self, pyramid, tilelist_file,
                  levels=None, stride=1, envelope=None):
         self._tilelist_file = tilelist_file
@@ -54,34 +364,307 @@ class TileListPyramidWalker(object):
         if envelope is not None:
             self._envelope = Envelope.from_tuple(envelope)
         else:
-            self._envelope = pyramid.envleope
+            self._envelope = pyramid.envelope
         self._stride = stride
+        self._shard, self._shards = 0, 1
+        self._position = None
         assert pyramid.projection == 'EPSG:3857'
         self._proj = GoogleMercatorProjection()
 
-    def walk(self):
+    @property
+    def cursor(self):
+        """ Cursor right after last walked metatile, None if walk() has not
+        been started yet """
+        if self._position is None:
+            return None
+        return WalkCursor(self._shard, self._shards, self._position)
+
+    def _expand(self, tile_z, tile_x, tile_y):
+        """ Iterate (z, x, y) of metatiles of a listed tile """
         stride = self._stride
         stride_diff = len(bin(stride)) - 3
 
+        if not self._levels:
+            yield tile_z, tile_x, tile_y
+            return
+
+        for z in self._levels:
+            z_diff = z - tile_z
+            if z_diff < stride_diff:
+                # Skip this level if its smaller than min allowed layer
+                continue
+            for x in xrange(tile_x * (2 ** z_diff),
+                            (tile_x + 1) * (2 ** z_diff), stride):
+                for y in xrange(tile_y * (2 ** z_diff),
+                                (tile_y + 1) * (2 ** z_diff),
+                                stride):
+                    yield z, x, y
+
+    def walk(self, shard=0, shards=1, cursor=None):
+        """ Iterate metatiles in given shard, optionally resume from a
+        cursor returned by a previous walk """
+        stride = self._stride
+        create_metatile_index = self._pyramid.create_metatile_index
+
+        if shards > 1:
+            with open(self._tilelist_file, 'rb') as fp:
+                count = sum(1 for _row in csv.reader(fp))
+            start, stop = _shard_range(count, shard, shards)
+        else:
+            start, stop = 0, None
+
+        resume_row, resume_offset = start, 0
+        if cursor is not None:
+            assert (cursor.shard, cursor.shards) == (shard, shards), \
+                'Cursor is created by another shard'
+            resume_row, resume_offset = cursor.position
+
+        self._shard, self._shards = shard, shards
+        self._position = None
         with open(self._tilelist_file, 'rb') as fp:
             reader = csv.reader(fp)
-            for row in reader:
-                tile_z, tile_x, tile_y = tuple(map(int, row))
-
-                if self._levels:
-                    for z in self._levels:
-                        z_diff = z - tile_z
-                        if z_diff < stride_diff:
-                            # Skip this level if its smaller than min allowed layer
-                            continue
-                        for x in xrange(tile_x * (2 ** z_diff),
-                                        (tile_x + 1) * (2 ** z_diff), stride):
-                            for y in xrange(tile_y * (2 ** z_diff),
-                                            (tile_y + 1) * (2 ** z_diff),
-                                            stride):
-                                yield self._pyramid.create_metatile_index(z, x,
-                                                                          y,
-                                                                          stride)
-                else:
-                    yield self._pyramid.create_metatile_index(tile_z, tile_x,
-                                                              tile_y, stride)
+            for row_number, row in enumerate(reader):
+                if stop is not None and row_number >= stop:
+                    break
+                if row_number < resume_row:
+                    continue
+                offset = resume_offset if row_number == resume_row else 0
+                coords = self._expand(*tuple(map(int, row)))
+                for z, x, y in itertools.islice(coords, offset, None):
+                    offset += 1
+                    self._position = (row_number, offset)
+                    yield create_metatile_index(z, x, y, stride)
+                self._position = (row_number + 1, 0)
+
+    def walk_array(self, chunk_size=65536, shard=0, shards=1, cursor=None):
+        """ Same as walk() but yields metatiles in TileIndexArrays of at
+        most chunk_size metatiles """
+        return _chunk_indexes(self._pyramid,
+                              self.walk(shard, shards, cursor),
+                              self._stride, chunk_size)
+
+
+#===============================================================================
+# Unique Tile List
+#===============================================================================
+
+# Record of binary tile list file (.zxy), z as uint8, x/y as little
+# endian uint32, no padding
+BINARY_TILELIST_DTYPE = [('z', 'u1'), ('x', '<u4'), ('y', '<u4')]
+
+
+def read_tilelist(filename, chunk_size=1048576):
+    """ Iterate (z, x, y) arrays of tiles in a tile list file, each array
+    contains at most chunk_size tiles
+
+    A tile list is a CSV file of z,x,y rows, or a binary file of packed
+    BINARY_TILELIST_DTYPE records if its extension is .zxy.
+    """
+    if os.path.splitext(filename)[1].lower() == '.zxy':
+        dtype = numpy.dtype(BINARY_TILELIST_DTYPE)
+        with open(filename, 'rb') as fp:
+            while True:
+                records = numpy.fromfile(fp, dtype=dtype, count=chunk_size)
+                if len(records) == 0:
+                    break
+                yield (records['z'].astype(numpy.int64),
+                       records['x'].astype(numpy.int64),
+                       records['y'].astype(numpy.int64))
+    else:
+        with open(filename, 'rb') as fp:
+            while True:
+                lines = list(itertools.islice(fp, chunk_size))
+                if not lines:
+                    break
+                rows = list(line.strip() for line in lines if line.strip())
+                if not rows:
+                    continue
+                # fromstring() silently stops at the first bad token, so
+                # check each row has 3 fields and all of them are parsed
+                for row in rows:
+                    if row.count(',') != 2:
+                        raise ValueError('Invalid tile list row %r' % row)
+                coords = numpy.fromstring(','.join(rows), dtype=numpy.int64,
+                                          sep=',')
+                if len(coords) != 3 * len(rows):
+                    raise ValueError('Invalid tile list row in %s' % \
+                                     filename)
+                coords = coords.reshape(-1, 3)
+                yield coords[:, 0], coords[:, 1], coords[:, 2]
+
+
+def write_tilelist(filename, z, x, y):
+    """ Write tiles to a binary tile list file """
+    records = numpy.empty(len(z), dtype=BINARY_TILELIST_DTYPE)
+    records['z'], records['x'], records['y'] = z, x, y
+    with open(filename, 'wb') as fp:
+        records.tofile(fp)
+
+
+_CURVE_ORDER_ARRAYS = {
+    'morton': (tile_coordinate_to_morton_array,
+               morton_to_tile_coordinate_array),
+    'hilbert': (tile_coordinate_to_hilbert_array,
+                hilbert_to_tile_coordinate_array),
+}
+
+
+class UniqueTileListWalker(PyramidWalker):
+
+    """ Walk unique metatiles of a tile list
+
+    The tile list is read in chunks and collapsed to unique tiles by
+    sorting their serials, so heavy overlapping lists (eg: expire lists)
+    only render each metatile once.  Memory usage is proportional to
+    number of unique tiles, not rows.
+
+    When levels is given, each tile is expanded to metatiles covering
+    it in each level (levels lower than the tile plus stride are
+    skipped), tiles whose ancestor is also listed are dropped since
+    they are covered by the ancestor.  Otherwise each tile is rendered
+    as the metatile containing it in its own level.
+
+    Metatiles are walked level by level in (x, y) order of listed tiles,
+    or along a space filling curve when order is given.  Supports
+    shards and cursors same as PyramidWalker.
+    """
+
+    def __init__(self, pyramid, tilelist_file, levels=None, stride=1,
+                 order=None, chunk_size=1048576):
+        PyramidWalker.__init__(self, pyramid, levels, stride, order=order)
+        assert numpy is not None, 'UniqueTileListWalker requires numpy'
+        z, x, y = self._read_unique(tilelist_file, chunk_size)
+        if levels is None:
+            self._cells = self._collapse(z, x, y)
+        else:
+            self._cells = self._expand(z, x, y, levels)
+        self._levels = sorted(self._cells)
+
+    @staticmethod
+    def _read_unique(tilelist_file, chunk_size):
+        """ Read tiles as sorted unique (z, x, y) arrays """
+        serials = list()
+        pending = 0
+        for z, x, y in read_tilelist(tilelist_file, chunk_size):
+            assert numpy.all((z >= 0) & (z <= 30)), 'Invalid tile level'
+            dim = numpy.left_shift(1, z)
+            assert numpy.all((x >= 0) & (x < dim) & (y >= 0) & (y < dim)), \
+                'Invalid tile coordinate'
+            serials.append(numpy.unique((numpy.left_shift(1, 2 * z) - 1) // 3 +
+                                        y * dim + x))
+            pending += len(serials[-1])
+            if pending > chunk_size * 4:
+                # Merge sorted chunks so duplicated rows don't pile up
+                serials = [numpy.unique(numpy.concatenate(serials))]
+                pending = len(serials[0])
+        if not serials:
+            serials = [numpy.zeros(0, dtype=numpy.int64)]
+        return serial_to_tile_coordinate_array(
+            numpy.unique(numpy.concatenate(serials)))
+
+    def _collapse(self, z, x, y):
+        """ Unique metatiles containing each tile in its own level """
+        cells = dict()
+        for level in numpy.unique(z).tolist():
+            mask = z == level
+            step = min(self._stride, 2 ** level)
+            keys = numpy.unique(numpy.left_shift(x[mask] // step, 32) |
+                                (y[mask] // step))
+            cells[level] = self._sort_cells(level,
+                                            numpy.right_shift(keys, 32),
+                                            keys & 0xffffffff,
+                                            numpy.ones_like(keys))
+        return cells
+
+    def _expand(self, z, x, y, levels):
+        """ Cells of metatiles covering each tile in each level """
+        stride_diff = len(bin(self._stride)) - 3
+
+        # Drop tiles covered by a listed ancestor
+        tiles = list()
+        for level in numpy.unique(z).tolist():
+            mask = z == level
+            tx, ty = x[mask], y[mask]
+            covered = numpy.zeros(len(tx), dtype=bool)
+            for ancestor_level, ax, ay in tiles:
+                diff = level - ancestor_level
+                keys = numpy.left_shift(numpy.right_shift(tx, diff), 32) | \
+                    numpy.right_shift(ty, diff)
+                covered |= numpy.in1d(keys, numpy.left_shift(ax, 32) | ay)
+            tiles.append((level, tx[~covered], ty[~covered]))
+
+        cells = dict()
+        for level in levels:
+            cx, cy, cn = list(), list(), list()
+            for tile_level, tx, ty in tiles:
+                z_diff = level - tile_level
+                if z_diff < stride_diff:
+                    # Skip this level if its smaller than min allowed layer
+                    continue
+                # Side of a tile in metatiles
+                n = 2 ** (z_diff - stride_diff)
+                cx.append(tx * n)
+                cy.append(ty * n)
+                cn.append(numpy.repeat(numpy.int64(n), len(tx)))
+            if cx:
+                cells[level] = self._sort_cells(level,
+                                                numpy.concatenate(cx),
+                                                numpy.concatenate(cy),
+                                                numpy.concatenate(cn))
+        return cells
+
+    def _sort_cells(self, z, cx, cy, cn):
+        """ Sort cells of (cx, cy, n) in walk order, cells are squares of
+        n*n metatiles in metatile coordinate """
+        if self._order is None:
+            order = numpy.lexsort((cy, cx))
+        else:
+            # Cells are aligned quadrants, which are always continuous on
+            # the curve, so sort them by their first metatile
+            step = min(self._stride, 2 ** z)
+            curve_z = z - (len(bin(step)) - 3)
+            encode = _CURVE_ORDER_ARRAYS[self._order][0]
+            order = numpy.argsort(encode(curve_z, cx, cy), kind='mergesort')
+        cx, cy, cn = cx[order], cy[order], cn[order]
+        return cx, cy, cn, numpy.cumsum(cn * cn)
+
+    def _level_count(self, z):
+        ends = self._cells[z][3]
+        return int(ends[-1]) if len(ends) else 0
+
+    def _level_coords(self, z, start, stop, resume=()):
+        cx, cy, cn, ends = self._cells[z]
+        if stop is None:
+            stop = int(ends[-1]) if len(ends) else 0
+        step = min(self._stride, 2 ** z)
+        curve_z = z - (len(bin(step)) - 3)
+        # First cell contains start
+        i = int(numpy.searchsorted(ends, start, side='right'))
+        position = start
+        while position < stop:
+            x, y, n = int(cx[i]), int(cy[i]), int(cn[i])
+            first = int(ends[i]) - n * n
+            begin, end = position - first, min(stop - first, n * n)
+            if n == 1:
+                yield x * step, y * step
+            elif self._order is None:
+                for k in xrange(begin, end):
+                    yield (x + k // n) * step, (y + k % n) * step
+            else:
+                # Cell is an aligned quadrant, which is a continuous range
+                # on the curve, decode the range directly
+                encode, decode = _CURVE_ORDER_ARRAYS[self._order]
+                d = int(encode(curve_z, x, y)[0]) // (n * n) * (n * n)
+                xs, ys = decode(curve_z, numpy.arange(d + begin, d + end,
+                                                      dtype=numpy.int64))
+                for mx, my in zip(xs.tolist(), ys.tolist()):
+                    yield mx * step, my * step
+            position = first + end
+            i += 1
+
+    def walk_array(self, chunk_size=65536, shard=0, shards=1, cursor=None):
+        """ Same as walk() but yields metatiles in TileIndexArrays of at
+        most chunk_size metatiles """
+        return _chunk_indexes(self._pyramid,
+                              self.walk(shard, shards, cursor),
+                              self._stride, chunk_size)
@@ -1,2 +1,3 @@
 # -*- coding:utf-8 -*-
 from .factory import create_render_node, MetaTileContext
+from .tree import RenderPool
@@ -29,3 +29,6 @@ class RenderCache(object):
 
     def delete(self, metatile_index):
         self._cache and self._cache.delete(metatile_index)
+
+    def reopen(self):
+        self._cache and self._cache.reopen()
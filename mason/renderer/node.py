@@ -6,11 +6,13 @@ Created on Mar 17, 2013
 @author: ray
 '''
 import time
+import threading
 from ..cartographer import CartographerFactory
 from ..composer import ImageMagickComposer
 from ..tilestorage import attach_tilestorage
-from ..core import MetaTile, Format
-from ..utils import TempFile, gdal_hillshading, gdal_colorrelief
+from ..core import MetaTile, RasterMetaTile, Format
+from ..utils import (TempFile, gdal_hillshading, gdal_colorrelief,
+                     hillshading, ColorPalette)
 from .tree import RenderNode, RenderContext
 from .cache import RenderCache
 
@@ -25,6 +27,53 @@ class SourceNotFound(Exception):
 class GDALProcessError(Exception):
     pass
 
+def raster_metatile(index, data, fmt, mtime=None):
+    """ Create a MetaTile of encoded raster data, taken as an array
+    by consumers without decoding again if numpy and GDAL are available """
+    if RasterMetaTile is not None and RasterMetaTile.supports(fmt):
+        return RasterMetaTile(index, data, fmt, mtime or time.time())
+    return MetaTile.from_tile_index(index, data, fmt, mtime)
+
+
+#===============================================================================
+# Cartographer Pool
+#===============================================================================
+class CartographerPool(object):
+
+    """ Reuse cartographers created with same parameters
+
+    Creating a cartographer may open datasets and probe their projection,
+    nodes with per zoom level configuration keep one cartographer for
+    each resolved configuration instead of creating one per metatile.
+    """
+
+    def __init__(self, prototype):
+        self._prototype = prototype
+        self._cartographers = dict()
+        self._lock = threading.Lock()
+
+    def get(self, **params):
+        """ Get cartographer created with given parameters """
+        key = repr(sorted(params.items()))
+        with self._lock:
+            cartographer = self._cartographers.get(key)
+            if cartographer is None:
+                cartographer = CartographerFactory(self._prototype, **params)
+                self._cartographers[key] = cartographer
+            return cartographer
+
+    def __len__(self):
+        return len(self._cartographers)
+
+    def close(self):
+        """ Close and forget all cartographers """
+        with self._lock:
+            cartographers = self._cartographers.values()
+            self._cartographers = dict()
+        for cartographer in cartographers:
+            cartographer.close()
+
+
 #===============================================================================
 # Metatile Context
 #===============================================================================
@@ -69,32 +118,40 @@ class MetaTileRenderNode(RenderNode):
         if not self._keep_cache:
             self._cache.delete(metatile_index)
 
+    def reopen(self):
+        RenderNode.reopen(self)
+        self._cache.reopen()
+
     def render(self, context):
         assert isinstance(context, MetaTileContext)
         metatile_index = context.metatile_index
 
         # get metatile from cache
         if context.mode in ('hybrid', 'readonly'):
+            started = time.time()
             metatile = self._cache.get(metatile_index)
+            context.add_time(self._name, 'cache_get', time.time() - started)
 #             print 'layer=%s, index=%s, cached=%s' % (self._name, metatile_index, bool(metatile))
             if metatile or context.mode == 'readonly':
                 return metatile
 
-        return RenderNode.render(self, context)
-
-    def _render_imp(self, context, sources):
-        metatile_index = context.metatile_index
-        metatile_sources = sources
-
-        # render a metatile
-        metatile = self._render_metatile(metatile_index, metatile_sources)
+        metatile = RenderNode.render(self, context)
 
         # cache the new metatile
         if context.mode in ('overwrite', 'hybrid'):
+            started = time.time()
             self._cache.put(metatile)
+            context.add_time(self._name, 'cache_put', time.time() - started)
 
         return metatile
 
+    def _render_imp(self, context, sources):
+        metatile_index = context.metatile_index
+        metatile_sources = sources
+
+        # render a metatile
+        return self._render_metatile(metatile_index, metatile_sources)
+
     def _render_metatile(self, metatile_index, metatile_sources):
         raise NotImplementedError
 
@@ -132,10 +189,10 @@ class GDALRenderNode(MetaTileRenderNode):
             data = target.read()
             data_format = metatile.format
             mtime = time.time()
-            metatile = MetaTile.from_tile_index(metatile.index,
-                                                data,
-                                                data_format,
-                                                mtime)
+            metatile = raster_metatile(metatile.index,
+                                       data,
+                                       data_format,
+                                       mtime)
             return metatile
         finally:
             # close files
@@ -151,6 +208,12 @@ class GDALRenderNode(MetaTileRenderNode):
 #===============================================================================
 class HillShadingRenderNode(GDALRenderNode):
 
+    """ Hill shading of a DEM source
+
+    Shading is done in-process on the source array when numpy and GDAL
+    python binding are available, otherwise by a gdaldem subprocess.
+    """
+
     def __init__(self, name,
                  zfactor=1,
                  scale=1,
@@ -163,7 +226,39 @@ class HillShadingRenderNode(GDALRenderNode):
         self._altitude = altitude
         self._azimuth = azimuth
 
+    def _render_metatile(self, metatile_index, metatile_sources):
+        if hillshading is None or RasterMetaTile is None:
+            return GDALRenderNode._render_metatile(self, metatile_index,
+                                                   metatile_sources)
+        assert len(metatile_sources) == 1
+
+        source = RasterMetaTile.from_metatile(metatile_sources.values()[0])
+        elevation = source.array
+        if elevation.ndim == 3:
+            # gdaldem uses first band
+            elevation = elevation[0]
+
+        zfactor, scale, altitude, azimuth = self._parameters(metatile_index)
+        geotransform = source.geotransform
+        shade = hillshading(elevation, geotransform[1], geotransform[5],
+                            zfactor, scale, altitude, azimuth,
+                            source.nodata)
+        return RasterMetaTile.from_array(source.index,
+                                         shade,
+                                         source.format,
+                                         geotransform,
+                                         source.projection,
+                                         nodata=0)
+
     def _process(self, metatile_index, source, target):
+        zfactor, scale, altitude, azimuth = self._parameters(metatile_index)
+
+        # call gdal subprocess
+        src = source.filename
+        dst = target.filename
+        gdal_hillshading(src, dst, zfactor, scale, altitude, azimuth)
+
+    def _parameters(self, metatile_index):
         z, x, y = metatile_index.coord
         # get parameters
         zfactor = self._zfactor
@@ -182,10 +277,7 @@ class HillShadingRenderNode(GDALRenderNode):
         if isinstance(azimuth, list):
             azimuth = azimuth[z] if z < len(azimuth) else azimuth[-1]
 
-        # call gdal subprocess
-        src = source.filename
-        dst = target.filename
-        gdal_hillshading(src, dst, zfactor, scale, altitude, azimuth)
+        return zfactor, scale, altitude, azimuth
 
 
 #===============================================================================
@@ -193,9 +285,37 @@ class HillShadingRenderNode(GDALRenderNode):
 #===============================================================================
 class ColorReliefRenderNode(GDALRenderNode):
 
+    """ Color relief of a DEM source
+
+    Like HillShadingRenderNode, colored in-process using a palette parsed
+    from the color context file once, or by a gdaldem subprocess if numpy
+    is not available.
+    """
+
     def __init__(self, name, color_context, cache=None):
         GDALRenderNode.__init__(self, name, cache)
         self._color_context = color_context
+        self._palette = None
+        if ColorPalette is not None and RasterMetaTile is not None:
+            self._palette = ColorPalette(color_context)
+
+    def _render_metatile(self, metatile_index, metatile_sources):
+        if self._palette is None:
+            return GDALRenderNode._render_metatile(self, metatile_index,
+                                                   metatile_sources)
+        assert len(metatile_sources) == 1
+
+        source = RasterMetaTile.from_metatile(metatile_sources.values()[0])
+        elevation = source.array
+        if elevation.ndim == 3:
+            elevation = elevation[0]
+
+        rgba = self._palette.colorize(elevation, source.nodata)
+        return RasterMetaTile.from_array(source.index,
+                                         rgba,
+                                         source.format,
+                                         source.geotransform,
+                                         source.projection)
 
     def _process(self, metatile_index, source, target):
         # call gdal subprocess
@@ -230,6 +350,10 @@ class StorageRenderNode(MetaTileRenderNode):
 
         return metatile
 
+    def reopen(self):
+        MetaTileRenderNode.reopen(self)
+        self._storage.reopen()
+
 
 #===============================================================================
 # Mapnik Render Node
@@ -274,7 +398,7 @@ class RasterRenderNode(MetaTileRenderNode):
     def __init__(self, name, cache=None, **dataset_cfg):
         MetaTileRenderNode.__init__(self, name, cache)
         self._raw_cfg = dataset_cfg
-        self._dataset = None
+        self._datasets = CartographerPool('dataset')
 
     def _init_config(self, metatile_index, dataset_cfg):
         z, x, y = metatile_index.coord
@@ -291,24 +415,33 @@ class RasterRenderNode(MetaTileRenderNode):
         assert len(metatile_sources) == 0
 
         dataset_cfg = self._init_config(metatile_index, self._raw_cfg)
-        self._dataset = CartographerFactory('dataset', **dataset_cfg)
+        dataset = self._datasets.get(**dataset_cfg)
 
         envelope = metatile_index.buffered_envelope.make_tuple()
         width = height = metatile_index.buffered_tile_size
         size = (width, height)
-        data_stream = self._dataset.render(envelope, size)
+        data_stream = dataset.render(envelope, size)
         try:
-            data_format = Format.from_name(self._dataset.output_format)
+            data_format = Format.from_name(dataset.output_format)
             mtime = time.time()
-            metatile = MetaTile.from_tile_index(metatile_index,
-                                                data_stream.getvalue(),
-                                                data_format,
-                                                mtime)
+            metatile = raster_metatile(metatile_index,
+                                       data_stream.getvalue(),
+                                       data_format,
+                                       mtime)
         finally:
             data_stream.close()
 
         return metatile
 
+    def close(self):
+        MetaTileRenderNode.close(self)
+        self._datasets.close()
+
+    def reopen(self):
+        MetaTileRenderNode.reopen(self)
+        # Don't share dataset handles with the parent process
+        self._datasets.close()
+
 
 #===============================================================================
 # ImageMagic Render Node
@@ -374,6 +507,7 @@ class HomeBrewHillShade(GDALRenderNode):
         self._scale = scale
         self._altitude = altitude
         self._azimuth = azimuth
+        self._reliefs = CartographerPool('shaderelief')
 
     def _render_metatile(self, metatile_index, metatile_sources):
         assert len(metatile_sources) == 0
@@ -400,19 +534,18 @@ class HomeBrewHillShade(GDALRenderNode):
         if isinstance(dataset_path, list):
             dataset_path = dataset_path[z] if z < len(dataset_path) else dataset_path[-1]
 
-        self._rasterdataset = CartographerFactory('shaderelief',
-                                                  dataset_path=dataset_path,
-                                                  zfactor=zfactor,
-                                                  scale=scale,
-                                                  azimuth=azimuth,
-                                                  altitude=altitude)
+        relief = self._reliefs.get(dataset_path=dataset_path,
+                                   zfactor=zfactor,
+                                   scale=scale,
+                                   azimuth=azimuth,
+                                   altitude=altitude)
 
         envelope = metatile_index.buffered_envelope.make_tuple()
         width = height = metatile_index.buffered_tile_size
         size = (width, height)
-        data_stream = self._rasterdataset.render(envelope, size)
+        data_stream = relief.render(envelope, size)
         try:
-            data_format = Format.from_name(self._rasterdataset.output_format)
+            data_format = Format.from_name(relief.output_format)
             mtime = time.time()
             metatile = MetaTile.from_tile_index(metatile_index,
                                                 data_stream.getvalue(),
@@ -423,4 +556,10 @@ class HomeBrewHillShade(GDALRenderNode):
 
         return metatile
 
+    def close(self):
+        GDALRenderNode.close(self)
+        self._reliefs.close()
 
+    def reopen(self):
+        GDALRenderNode.reopen(self)
+        self._reliefs.close()
@@ -6,13 +6,147 @@ Created on March 14, 2013
 @author: ray
 '''
 
+import time
+import threading
 import collections
+import multiprocessing.pool
 
 #===============================================================================
 # Context
 #===============================================================================
+class _Memo(object):
+
+    """ Result of a node rendered in a context """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
 class RenderContext(object):
-    pass
+
+    """ Context of a render, also collects time spent by each node
+
+    A node shared by several parents is rendered only once in a context,
+    its result is memoized and returned to all parents.
+    """
+
+    @property
+    def _lock(self):
+        # Nodes may be rendered in different threads by a RenderPool
+        return self.__dict__.setdefault('_context_lock', threading.Lock())
+
+    def render(self, node):
+        """ Render given node, or return its result if the node is already
+        rendered in this context """
+        with self._lock:
+            memos = self.__dict__.setdefault('_memos', dict())
+            memo = memos.get(node)
+            rendering = memo is None
+            if rendering:
+                memo = memos[node] = _Memo()
+
+        if not rendering:
+            # Another parent is rendering the node in another thread
+            memo.done.wait()
+            if memo.error is not None:
+                raise memo.error
+            return memo.result
+
+        try:
+            memo.result = node.render(self)
+        except Exception as e:
+            memo.error = e
+            raise
+        finally:
+            memo.done.set()
+        return memo.result
+
+    def add_time(self, name, stage, seconds):
+        """ Add seconds spent in given stage of a named node """
+        with self._lock:
+            timings = self.__dict__.setdefault('_timings',
+                                               collections.Counter())
+            timings[(name, stage)] += seconds
+
+    @property
+    def timings(self):
+        """ Seconds spent in each (node name, stage) """
+        return self.__dict__.get('_timings', collections.Counter())
+
+
+#===============================================================================
+# Render Pool
+#===============================================================================
+class RenderPool(object):
+
+    """ Bounded thread pool rendering sibling subtrees concurrently
+
+    Render of mapnik, GDAL and external commands releases the GIL, so
+    independent children can be rendered at the same time, render time
+    of a node is close to its slowest child instead of the sum.
+
+    A child is only sent to the pool when a thread is free, otherwise it
+    is rendered in the calling thread, so nested renders never wait for
+    a pool thread and can't deadlock.
+
+    @param threads: number of threads
+    """
+
+    def __init__(self, threads):
+        assert threads > 0
+        self._threads = threads
+        self._pool = multiprocessing.pool.ThreadPool(threads)
+        self._slots = threading.BoundedSemaphore(threads)
+
+    @property
+    def threads(self):
+        return self._threads
+
+    def render(self, children, context):
+        """ Render children, returns an OrderedDict of name->result
+        in the order of the children """
+        children = list(children.items())
+        # First child always renders in the calling thread
+        pending = [None]
+        try:
+            for name, child in children[1:]:
+                if self._slots.acquire(False):
+                    pending.append(self._pool.apply_async(self._render,
+                                                          (child, context)))
+                else:
+                    pending.append(None)
+
+            # Placeholders of concurrent children keep the order
+            sources = collections.OrderedDict()
+            for (name, child), result in zip(children, pending):
+                sources[name] = context.render(child) if result is None \
+                    else None
+            for (name, child), result in zip(children, pending):
+                if result is not None:
+                    sources[name] = result.get()
+        finally:
+            # Never return while a child is still rendering
+            for result in pending:
+                if result is not None:
+                    result.wait()
+        return sources
+
+    def _render(self, child, context):
+        try:
+            return context.render(child)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        self._pool.terminate()
+        self._pool.join()
+
+    def reopen(self):
+        """ Recreate threads, which are lost in a forked process """
+        self._pool = multiprocessing.pool.ThreadPool(self._threads)
+        self._slots = threading.BoundedSemaphore(self._threads)
 
 
 #===============================================================================
@@ -25,6 +159,10 @@ class RenderNode(object):
     @param name: name of the render node
     """
 
+    # RenderPool rendering children concurrently, None renders them one
+    # by one
+    pool = None
+
     def __init__(self, name):
         self._name = name
         self._children = collections.OrderedDict()
@@ -38,19 +176,59 @@ class RenderNode(object):
         """ append a child """
         self._children[child.name] = child
 
+    def nodes(self):
+        """ The node and its descendants, a node shared by several parents
+        is listed only once """
+        nodes = collections.OrderedDict()
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if id(node) in nodes:
+                continue
+            nodes[id(node)] = node
+            stack.extend(reversed(node._children.values()))
+        return list(nodes.values())
+
+    def set_pool(self, pool):
+        """ Render children of the node and its descendants
+        concurrently in given RenderPool, None disables it """
+        for node in self.nodes():
+            node.pool = pool
+
     def render(self, context):
         """ render process """
-        sources = collections.OrderedDict()
-        for name, child in self._children.items():
-            sources[name] = child.render(context)
+        if self.pool is not None and len(self._children) > 1:
+            sources = self.pool.render(self._children, context)
+        else:
+            sources = collections.OrderedDict()
+            for name, child in self._children.items():
+                sources[name] = context.render(child)
 
 #        print 'Rendering %s: %s' % (self._name, repr(context))
+        started = time.time()
         result = self._render_imp(context, sources)
+        context.add_time(self._name, 'render', time.time() - started)
         return result
 
     def close(self):
+        """ Close the node, see close_tree() """
+        pass
+
+    def reopen(self):
+        """ Reopen connections of the node, see reopen_tree() """
         pass
 
+    def close_tree(self):
+        """ Close the node and its descendants, each only once """
+        for node in self.nodes():
+            node.close()
+
+    def reopen_tree(self):
+        """ Reopen the node and its descendants, each only once, called
+        in a forked process which inherited the tree from its parent """
+        for node in self.nodes():
+            node.reopen()
+
     def _render_imp(self, context, sources):
         raise NotImplementedError
 
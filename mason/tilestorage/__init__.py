@@ -33,6 +33,14 @@ except ImportError:
 from .mbtiles import MBTilesTileStorage, MBTilesTileStorageWithBackgroundWriter
 
 from .cascade import CascadeTileStorage as CascadeTileStorage
+from .sharded import ShardedTileStorage
+
+try:
+    from .manifest import ManifestTileStorage, TileManifest
+except ImportError:
+    # Requires numpy
+    ManifestTileStorage = None
+    TileManifest = None
 
 # ===== Storage Factory ========================================================
 
@@ -56,6 +64,32 @@ def CascadeTileStorageWrapper(pyramid, metadata,
                               write_back=write_back)
 
 
+def ShardedTileStorageWrapper(pyramid, metadata, shards=None, m=64):
+
+    # HACK: Same as CascadeTileStorageWrapper, create child storages from
+    #       a list of (prototype, parameters) tuples in the configuration
+
+    storages = list(create_tilestorage(prototype, pyramid, metadata, **params)
+                    for prototype, params in shards)
+
+    return ShardedTileStorage(pyramid, metadata, storages=storages, m=m)
+
+
+def ManifestTileStorageWrapper(pyramid, metadata, storage=None, manifest=None,
+                               threads=4):
+
+    # HACK: Same as CascadeTileStorageWrapper, create the child storage from
+    #       a (prototype, parameters) tuple in the configuration
+
+    if ManifestTileStorage is None:
+        raise Exception('Tile storage prototype "manifest" requires numpy')
+
+    child = create_tilestorage(storage[0], pyramid, metadata, **storage[1])
+
+    return ManifestTileStorage(pyramid, metadata, storage=child,
+                               manifest=manifest, threads=threads)
+
+
 # ===== Storage Factory ========================================================
 
 class TileStorageFactory(object):
@@ -70,6 +104,8 @@ class TileStorageFactory(object):
                           mbtilesbw=MBTilesTileStorageWithBackgroundWriter,
                           s3=S3TileStorage,
                           cascade=CascadeTileStorageWrapper,
+                          sharded=ShardedTileStorageWrapper,
+                          manifest=ManifestTileStorageWrapper,
                           cluster=FileClusterTileStorage,
                           s3cluster=S3ClusterTileStorage,
                           )
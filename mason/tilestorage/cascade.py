@@ -44,6 +44,9 @@ class CascadeTileStorage(TileStorage):
     def has_any(self, tile_indexes):
         return self._storages[0].has_any(tile_indexes)
 
+    def has_all_multi(self, tile_index_groups):
+        return self._storages[0].has_all_multi(tile_index_groups)
+
     def put_multi(self, tiles):
         if self._writeback:
             self._storages[1].put_multi(tiles)
@@ -63,3 +66,7 @@ class CascadeTileStorage(TileStorage):
     def close(self):
         for storage in self._storages:
             storage.close()
+
+    def reopen(self):
+        for storage in self._storages:
+            storage.reopen()
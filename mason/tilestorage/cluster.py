@@ -223,6 +223,10 @@ class FileClusterTileStorage(FileSystemTileStorage):
     def has(self, tile_index):
         return self._cache.has(tile_index)
 
+    def has_all_multi(self, tile_index_groups):
+        # has_all() checks the cluster file, not tiles
+        return TileStorage.has_all_multi(self, tile_index_groups)
+
     def has_all(self, tile_indexes):
         # NOTE: This is actually a "has_any" check to save call time
         metatile_index = self._pyramid.create_metatile_index(tile_indexes[0].z,
@@ -191,6 +191,52 @@ class FileSystemTileStorage(TileStorage):
     def has(self, tile_index):
         return os.path.exists(self._make_pathname(tile_index))
 
+    def has_all_multi(self, tile_index_groups):
+        # Scan each directory once instead of stat every tile
+        listing = dict()
+
+        def exists(pathname):
+            dirname, basename = os.path.split(pathname)
+            if dirname not in listing:
+                try:
+                    listing[dirname] = set(os.listdir(dirname))
+                except OSError as e:
+                    if e.errno != errno.ENOENT:
+                        raise
+                    listing[dirname] = set()
+            return basename in listing[dirname]
+
+        return list(all(exists(self._make_pathname(tile_index))
+                        for tile_index in tile_indexes)
+                    for tile_indexes in tile_index_groups)
+
+    def scan(self, z):
+        """ Scan tiles of level z stored on disk, returns (xs, ys) lists """
+        suffix = self._ext + ('.gz' if self._use_gzip else '')
+        xs, ys = list(), list()
+        if self._simple:
+            top = os.path.join(self._root, str(z))
+        else:
+            top = os.path.join(self._root, tile_coordiante_to_dirname(z, 0, 0)[0])
+        for dirpath, _dirnames, filenames in os.walk(top):
+            for filename in filenames:
+                if not filename.endswith(suffix):
+                    # Skip temporary files
+                    continue
+                name = filename[:-len(suffix)]
+                try:
+                    if self._simple:
+                        x, y = int(os.path.basename(dirpath)), int(name)
+                    else:
+                        tile_z, x, y = map(int, name.split('-'))
+                        if tile_z != z:
+                            continue
+                except ValueError:
+                    continue
+                xs.append(x)
+                ys.append(y)
+        return xs, ys
+
     def delete(self, tile_index):
         pathname = self._make_pathname(tile_index)
         try:
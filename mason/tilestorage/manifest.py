@@ -0,0 +1,474 @@
+'''
+Created on Oct 18, 2026
+
+@author: Kotaimen
+'''
+
+import fcntl
+import os
+import threading
+import multiprocessing.pool
+
+import numpy
+
+from ..core import TileIndexArray
+from .tilestorage import TileStorage
+
+# Tiles per block side, same as directory layout of FileSystemTileStorage
+BLOCK_SIZE = 64
+BLOCK_BYTES = BLOCK_SIZE * BLOCK_SIZE // 8
+
+# Record of manifest journal, op is 1 for add and 0 for remove
+JOURNAL_DTYPE = [('op', 'u1'), ('z', 'u1'), ('x', '<u4'), ('y', '<u4')]
+
+
+#===============================================================================
+# Manifest
+#===============================================================================
+
+class TileManifest(object):
+
+    """ Existence bitmap of tiles
+
+    Each level is a sparse bitmap indexed by tile serial in the level
+    (y * 2^z + x), split into 64x64 tile blocks, only blocks containing
+    tiles are kept in memory.  Saved to disk as a compressed numpy
+    archive.
+    """
+
+    def __init__(self):
+        # {z: {block key: uint8 array of BLOCK_BYTES}}
+        self._levels = dict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _locate(x, y):
+        """ Returns (block key, byte offset, bit mask) """
+        key = numpy.left_shift(y // BLOCK_SIZE, 32) | (x // BLOCK_SIZE)
+        bit = (y % BLOCK_SIZE) * BLOCK_SIZE + x % BLOCK_SIZE
+        return key, bit // 8, numpy.left_shift(1, bit % 8).astype(numpy.uint8)
+
+    @staticmethod
+    def _groups(z, x, y):
+        """ Iterate (z, key, positions) of elements grouped by block """
+        z, x, y = numpy.broadcast_arrays(
+            numpy.atleast_1d(numpy.asarray(z, dtype=numpy.int64)),
+            numpy.atleast_1d(numpy.asarray(x, dtype=numpy.int64)),
+            numpy.atleast_1d(numpy.asarray(y, dtype=numpy.int64)))
+        key, offset, mask = TileManifest._locate(x, y)
+        if len(z) == 0:
+            return
+        # Block key takes 56 bits at most, put level above it
+        unique, inverse = numpy.unique(numpy.left_shift(z, 56) | key,
+                                       return_inverse=True)
+        order = numpy.argsort(inverse, kind='mergesort')
+        bounds = numpy.searchsorted(inverse[order],
+                                    numpy.arange(len(unique) + 1))
+        for n, group in enumerate(unique.tolist()):
+            positions = order[bounds[n]:bounds[n + 1]]
+            yield group >> 56, group & ((1 << 56) - 1), \
+                offset[positions], mask[positions], positions
+
+    # Update ------------------------------------------------------------------
+
+    def add(self, z, x, y):
+        """ Mark tiles as existing, accepts scalars or arrays """
+        with self._lock:
+            for level, key, offset, mask, _pos in self._groups(z, x, y):
+                blocks = self._levels.setdefault(level, dict())
+                block = blocks.get(key)
+                if block is None:
+                    block = blocks[key] = numpy.zeros(BLOCK_BYTES, dtype=numpy.uint8)
+                numpy.bitwise_or.at(block, offset, mask)
+
+    def remove(self, z, x, y):
+        """ Mark tiles as not existing, accepts scalars or arrays """
+        with self._lock:
+            for level, key, offset, mask, _pos in self._groups(z, x, y):
+                block = self._levels.get(level, {}).get(key)
+                if block is None:
+                    continue
+                numpy.bitwise_and.at(block, offset, ~mask)
+                if not block.any():
+                    del self._levels[level][key]
+
+    def clear(self):
+        with self._lock:
+            self._levels.clear()
+
+    # Query -------------------------------------------------------------------
+
+    def has(self, z, x, y):
+        """ Existence of a tile """
+        blocks = self._levels.get(z)
+        if not blocks:
+            return False
+        key = ((y // BLOCK_SIZE) << 32) | (x // BLOCK_SIZE)
+        block = blocks.get(key)
+        if block is None:
+            return False
+        bit = (y % BLOCK_SIZE) * BLOCK_SIZE + x % BLOCK_SIZE
+        return bool(block[bit // 8] & (1 << (bit % 8)))
+
+    def has_array(self, z, x, y):
+        """ Existence of many tiles as a numpy boolean array """
+        z = numpy.atleast_1d(numpy.asarray(z))
+        result = numpy.zeros(numpy.broadcast(z, x, y).size, dtype=numpy.bool_)
+        for level, key, offset, mask, positions in self._groups(z, x, y):
+            block = self._levels.get(level, {}).get(key)
+            if block is not None:
+                result[positions] = (block[offset] & mask) != 0
+        return result
+
+    @property
+    def levels(self):
+        return sorted(z for z, blocks in self._levels.items() if blocks)
+
+    def count(self, z):
+        """ Number of existing tiles in level z """
+        blocks = self._levels.get(z)
+        if not blocks:
+            return 0
+        return int(numpy.unpackbits(numpy.vstack(blocks.values())).sum())
+
+    def coverage(self, z, x_min, y_min, x_max, y_max):
+        """ Ratio of existing tiles in given inclusive tile range """
+        total = (x_max - x_min + 1) * (y_max - y_min + 1)
+        if total <= 0:
+            return 0.
+        xs, ys = numpy.meshgrid(numpy.arange(x_min, x_max + 1, dtype=numpy.int64),
+                                numpy.arange(y_min, y_max + 1, dtype=numpy.int64))
+        return float(numpy.count_nonzero(self.has_array(z, xs.ravel(),
+                                                        ys.ravel()))) / total
+
+    # Persistence -------------------------------------------------------------
+
+    def save(self, filename):
+        arrays = dict()
+        with self._lock:
+            for z, blocks in self._levels.items():
+                if not blocks:
+                    continue
+                keys = sorted(blocks)
+                arrays['keys_%d' % z] = numpy.array(keys, dtype=numpy.int64)
+                arrays['bits_%d' % z] = numpy.vstack(list(blocks[k] for k in keys))
+        temp_filename = filename + '.tmp'
+        with open(temp_filename, 'wb') as fp:
+            numpy.savez_compressed(fp, **arrays)
+        os.rename(temp_filename, filename)
+
+    @staticmethod
+    def load(filename):
+        """ Load a manifest, returns an empty one if file does not exist """
+        manifest = TileManifest()
+        if not os.path.exists(filename):
+            return manifest
+        archive = numpy.load(filename)
+        try:
+            for name in archive.files:
+                if not name.startswith('keys_'):
+                    continue
+                z = int(name[5:])
+                bits = archive['bits_%d' % z]
+                manifest._levels[z] = dict(zip(archive[name].tolist(),
+                                               list(numpy.array(row) for row in bits)))
+        finally:
+            archive.close()
+        return manifest
+
+    def replay(self, records):
+        """ Apply journal records in order """
+        ops = records['op']
+        # Apply continuous runs of same operation together
+        changes = numpy.flatnonzero(numpy.diff(ops)) + 1
+        for run in numpy.split(numpy.arange(len(records)), changes):
+            if len(run) == 0:
+                continue
+            z = records['z'][run].astype(numpy.int64)
+            x = records['x'][run].astype(numpy.int64)
+            y = records['y'][run].astype(numpy.int64)
+            if ops[run[0]]:
+                self.add(z, x, y)
+            else:
+                self.remove(z, x, y)
+
+
+#===============================================================================
+# Storage
+#===============================================================================
+
+class ManifestTileStorage(TileStorage):
+
+    """ Keep a manifest of existing tiles alongside a storage
+
+    Existence checks (has, has_all, has_array...) are answered from the
+    in memory manifest, get() of a tile not in the manifest returns None
+    without touching the storage.
+
+    Every put/delete is appended to a journal file (manifest + '.log')
+    so several processes can share one manifest: before answering a
+    query the journal is checked and records appended by other
+    processes since last check are replayed, the manifest is reloaded
+    if another process compacted it.  The journal is merged into the
+    manifest file on close().  Tiles written to the storage by other
+    means are not known, call rebuild() to scan the storage.
+    """
+
+    def __init__(self, pyramid, metadata, storage=None, manifest=None,
+                 threads=4):
+        TileStorage.__init__(self, pyramid, metadata)
+        assert storage is not None
+        assert manifest
+        self._storage = storage
+        self._filename = manifest
+        self._journal = manifest + '.log'
+        self._lockfile = manifest + '.lock'
+        self._threads = threads
+        # Guards the replay state below, always taken before the file lock
+        self._sync_lock = threading.RLock()
+        # Stat of the loaded manifest file and bytes of journal replayed
+        self._stat = None
+        self._offset = 0
+        with self._locked():
+            self._manifest = self._load()
+
+    @property
+    def manifest(self):
+        self._sync()
+        return self._manifest
+
+    def _locked(self):
+        return _FileLock(self._lockfile)
+
+    def _load(self):
+        # Stat before loading, a compaction happens in between is found
+        # by next _sync()
+        self._stat = _file_stat(self._filename)
+        self._offset = 0
+        manifest = TileManifest.load(self._filename)
+        self._replay(manifest)
+        return manifest
+
+    def _read_journal(self, offset):
+        """ Journal records after offset bytes """
+        try:
+            size = os.path.getsize(self._journal)
+        except OSError:
+            size = 0
+        # Leave a partially written record to next read
+        count = (size - offset) // numpy.dtype(JOURNAL_DTYPE).itemsize
+        if count <= 0:
+            return numpy.empty(0, dtype=JOURNAL_DTYPE)
+        with open(self._journal, 'rb') as fp:
+            fp.seek(offset)
+            return numpy.fromfile(fp, dtype=JOURNAL_DTYPE, count=count)
+
+    def _replay(self, manifest):
+        """ Replay journal records appended since last replay """
+        records = self._read_journal(self._offset)
+        if len(records):
+            manifest.replay(records)
+            self._offset += records.nbytes
+
+    def _sync(self):
+        """ Pick up changes of other processes """
+        with self._sync_lock:
+            try:
+                size = os.path.getsize(self._journal)
+            except OSError:
+                size = 0
+            if _file_stat(self._filename) != self._stat or size < self._offset:
+                # Manifest file replaced and journal truncated by
+                # compact()/rebuild() of another process
+                self._manifest = self._load()
+            elif size > self._offset:
+                self._replay(self._manifest)
+
+    def _record(self, op, tile_indexes):
+        coords = numpy.array(list(tile_index.coord for tile_index in tile_indexes),
+                             dtype=numpy.int64).reshape(-1, 3)
+        z, x, y = coords[:, 0], coords[:, 1], coords[:, 2]
+        records = numpy.empty(len(coords), dtype=JOURNAL_DTYPE)
+        records['op'], records['z'], records['x'], records['y'] = op, z, x, y
+        with self._sync_lock, self._locked():
+            # Catch up with other processes first so own records are
+            # applied in journal order and never replayed
+            self._sync()
+            if op:
+                self._manifest.add(z, x, y)
+            else:
+                self._manifest.remove(z, x, y)
+            with open(self._journal, 'ab') as fp:
+                fp.write(records.tostring())
+            self._offset += records.nbytes
+
+    def _coords(self, tile_indexes):
+        if isinstance(tile_indexes, TileIndexArray):
+            return tile_indexes.z, tile_indexes.x, tile_indexes.y
+        coords = numpy.array(list(tile_index.coord for tile_index in tile_indexes),
+                             dtype=numpy.int64).reshape(-1, 3)
+        return coords[:, 0], coords[:, 1], coords[:, 2]
+
+    # Getter/Setter -----------------------------------------------------------
+
+    def get(self, tile_index):
+        if not self.has(tile_index):
+            return None
+        return self._storage.get(tile_index)
+
+    def put(self, tile):
+        self._storage.put(tile)
+        self._record(1, [tile.index])
+
+    def has(self, tile_index):
+        self._sync()
+        return self._manifest.has(*tile_index.coord)
+
+    def delete(self, tile_index):
+        self._storage.delete(tile_index)
+        self._record(0, [tile_index])
+
+    # Multi --------------------------------------------------------------------
+
+    def put_multi(self, tiles):
+        tiles = list(tiles)
+        self._storage.put_multi(tiles)
+        self._record(1, list(tile.index for tile in tiles))
+
+    def get_multi(self, tile_indexes):
+        tile_indexes = list(tile_indexes)
+        exists = self.has_array(tile_indexes)
+        return self._storage.get_multi(list(tile_index for tile_index, e in \
+                                            zip(tile_indexes, exists) if e))
+
+    def delete_multi(self, tile_indexes):
+        tile_indexes = list(tile_indexes)
+        self._storage.delete_multi(tile_indexes)
+        self._record(0, tile_indexes)
+
+    def has_all(self, tile_indexes):
+        return bool(numpy.all(self.has_array(tile_indexes)))
+
+    def has_any(self, tile_indexes):
+        return bool(numpy.any(self.has_array(tile_indexes)))
+
+    def has_all_multi(self, tile_index_groups):
+        groups = list(list(tile_indexes) for tile_indexes in tile_index_groups)
+        exists = self.has_array(list(t for tile_indexes in groups for t in tile_indexes))
+        ends = numpy.cumsum(list(len(tile_indexes) for tile_indexes in groups))
+        return list(bool(numpy.all(e)) for e in numpy.split(exists, ends[:-1])) \
+            if groups else []
+
+    def has_array(self, tile_indexes):
+        self._sync()
+        return self._manifest.has_array(*self._coords(tile_indexes))
+
+    # Maintenance --------------------------------------------------------------
+
+    def compact(self):
+        """ Merge journal of all processes into the manifest file """
+        with self._sync_lock, self._locked():
+            self._manifest = self._load()
+            self._save(self._manifest)
+
+    def rebuild(self):
+        """ Rebuild the manifest by scanning the storage
+
+        Storages support scan() (eg: FileSystemTileStorage) are scanned
+        level by level in parallel, otherwise existence of every tile in
+        the pyramid envelope is checked using has_array().
+
+        Changes journaled by other processes during the scan are
+        replayed onto the rebuilt manifest, the scan is repeated if
+        another process compacted the manifest meanwhile.
+        """
+        while True:
+            with self._locked():
+                stat = _file_stat(self._filename)
+                try:
+                    offset = os.path.getsize(self._journal)
+                except OSError:
+                    offset = 0
+            manifest = self._scan()
+            with self._sync_lock, self._locked():
+                if _file_stat(self._filename) != stat:
+                    continue
+                manifest.replay(self._read_journal(offset))
+                self._save(manifest)
+                self._manifest = manifest
+                return
+
+    def _scan(self):
+        manifest = TileManifest()
+        levels = list(self._pyramid.levels)
+        pool = multiprocessing.pool.ThreadPool(self._threads)
+        try:
+            if hasattr(self._storage, 'scan'):
+                for z, (xs, ys) in zip(levels, pool.imap(self._storage.scan, levels)):
+                    manifest.add(z, xs, ys)
+            else:
+                for z in levels:
+                    x_min, y_min, x_max, y_max = self._pyramid.tile_range(z)
+                    ys = numpy.arange(y_min, y_max + 1, dtype=numpy.int64)
+                    columns = max(1, 65536 // len(ys))
+                    for x in xrange(x_min, x_max + 1, columns):
+                        xs = numpy.arange(x, min(x + columns, x_max + 1),
+                                          dtype=numpy.int64)
+                        tiles = TileIndexArray(self._pyramid, z,
+                                               numpy.repeat(xs, len(ys)),
+                                               numpy.tile(ys, len(xs)))
+                        exists = self._storage.has_array(tiles)
+                        manifest.add(z, tiles.x[exists], tiles.y[exists])
+        finally:
+            pool.close()
+            pool.join()
+        return manifest
+
+    def flush_all(self):
+        self._storage.flush_all()
+        with self._sync_lock, self._locked():
+            self._manifest.clear()
+            self._save(self._manifest)
+
+    def _save(self, manifest):
+        """ Save manifest file and remove the journal, call with locks held """
+        manifest.save(self._filename)
+        if os.path.exists(self._journal):
+            os.remove(self._journal)
+        self._stat = _file_stat(self._filename)
+        self._offset = 0
+
+    def close(self):
+        self.compact()
+        self._storage.close()
+
+    def reopen(self):
+        self._storage.reopen()
+
+
+def _file_stat(filename):
+    """ Identity of a file, changes when the file is replaced """
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime, stat.st_size
+
+
+class _FileLock(object):
+
+    """ Exclusive lock between processes using flock() """
+
+    def __init__(self, filename):
+        self._filename = filename
+        self._fp = None
+
+    def __enter__(self):
+        self._fp = open(self._filename, 'a')
+        fcntl.flock(self._fp.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *args):
+        fcntl.flock(self._fp.fileno(), fcntl.LOCK_UN)
+        self._fp.close()
+        self._fp = None
@@ -342,6 +342,10 @@ class MBTilesTileStorage(TileStorage):
         conn.close()
         self._conn = None
 
+    def reopen(self):
+        # Never use a sqlite connection across fork, connect lazily again
+        self._conn = None
+
 
 class MBTilesTileStorageWithBackgroundWriter(MBTilesTileStorage):
 
@@ -356,6 +360,9 @@ class MBTilesTileStorageWithBackgroundWriter(MBTilesTileStorage):
                  ):
 
         MBTilesTileStorage.__init__(self, pyramid, metadata, database, timeout)
+        self._start_writer()
+
+    def _start_writer(self):
         self._queue = Queue.Queue(maxsize=self.QUEUE_SIZE)
         self._writer = threading.Thread(target=self.background_writer)
         self._writer.daemon = True
@@ -422,3 +429,8 @@ class MBTilesTileStorageWithBackgroundWriter(MBTilesTileStorage):
         conn = self._get_conn()
         conn.close()
         self._conn = None
+
+    def reopen(self):
+        # Threads does not survive fork, start a new writer
+        MBTilesTileStorage.reopen(self)
+        self._start_writer()
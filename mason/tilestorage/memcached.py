@@ -4,6 +4,10 @@ Created on May 3, 2012
 @author: Kotaimen
 '''
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 try:
     import pylibmc
@@ -65,6 +69,8 @@ class MemcachedTileStorage(TileStorage):
         TileStorage.__init__(self, pyramid, metadata)
 
         # Create memcached client, use highest pickle protocol
+        self._servers = servers
+        self._max_size = max_size
         self._client = client(servers, max_size)
 
         # Test connection heres
@@ -136,9 +142,24 @@ class MemcachedTileStorage(TileStorage):
             return False
         return set(mapping.keys()) == set(keys)
 
+    def has_all_multi(self, tile_index_groups):
+        groups = list(list(self._make_key(tile_index) for tile_index in tile_indexes)
+                      for tile_indexes in tile_index_groups)
+        mapping = self._client.get_multi(list(set(k for keys in groups for k in keys)))
+        return list(all(k in mapping for k in keys) for keys in groups)
+
+    def has_array(self, tile_indexes):
+        keys = list(self._make_key(tile_index) for tile_index in tile_indexes)
+        mapping = self._client.get_multi(keys)
+        return numpy.fromiter((k in mapping for k in keys),
+                              dtype=numpy.bool_, count=len(keys))
+
     def flush_all(self):
         self._client.flush_all()
 
     def close(self):
         self._client.disconnect_all()
 
+    def reopen(self):
+        self._client = client(self._servers, self._max_size)
+
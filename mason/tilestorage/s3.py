@@ -43,14 +43,19 @@ class S3TileStorage(TileStorage):
         self._tag = prefix
         self._ext = pyramid.format.extension
 
+        self._access_key = access_key
+        self._secret_key = secret_key
+        self._connect()
+
+        self._simple = simple
+
+    def _connect(self):
         self._conn = boto.connect_s3(\
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key,
+            aws_access_key_id=self._access_key,
+            aws_secret_access_key=self._secret_key,
             )
 
-        self._bucket = self._conn.get_bucket(bucket_name)
-
-        self._simple = simple
+        self._bucket = self._conn.get_bucket(self._bucket_name)
 
     def _make_key(self, tile_index):
         if self._simple:
@@ -102,6 +107,9 @@ class S3TileStorage(TileStorage):
     def close(self):
         self._conn.close()
 
+    def reopen(self):
+        self._connect()
+
 
 class S3ClusterTileStorage(S3TileStorage):
 
@@ -217,3 +225,7 @@ class S3ClusterTileStorage(S3TileStorage):
         self._cache.delete(tile_index)
 
 
+
+    def reopen(self):
+        S3TileStorage.reopen(self)
+        self._cache.reopen()
@@ -0,0 +1,97 @@
+'''
+Created on Oct 18, 2026
+
+@author: Kotaimen
+'''
+
+import collections
+
+from ..core import tile_coordinate_to_sharding_index
+from .tilestorage import TileStorage
+
+
+class ShardedTileStorage(TileStorage):
+
+    """ Spread tiles over several child storages
+
+    Each tile is stored in exactly one child storage, selected by
+    tile_coordinate_to_sharding_index(), adjacent m*m tiles always go to
+    the same child so MetaTiles are never split.  Multi operations are
+    grouped by shard and passed to child multi methods.
+
+    Note changing number or order of shards moves tiles between
+    storages, existing tiles are not migrated.
+    """
+
+    def __init__(self, pyramid, metadata, storages=None, m=64):
+        TileStorage.__init__(self, pyramid, metadata)
+        assert storages
+        self._storages = list(storages)
+        self._m = m
+
+    def _shard(self, tile_index):
+        z, x, y = tile_index.coord
+        n = tile_coordinate_to_sharding_index(z, x, y,
+                                              len(self._storages),
+                                              self._m)
+        return self._storages[n]
+
+    def _group(self, items, key=lambda item: item):
+        groups = collections.OrderedDict()
+        for item in items:
+            z, x, y = key(item).coord
+            n = tile_coordinate_to_sharding_index(z, x, y,
+                                                  len(self._storages),
+                                                  self._m)
+            groups.setdefault(n, list()).append(item)
+        return list((self._storages[n], group) for n, group in groups.items())
+
+    # Getter/Setter -----------------------------------------------------------
+
+    def get(self, tile_index):
+        return self._shard(tile_index).get(tile_index)
+
+    def put(self, tile):
+        self._shard(tile.index).put(tile)
+
+    def has(self, tile_index):
+        return self._shard(tile_index).has(tile_index)
+
+    def delete(self, tile_index):
+        self._shard(tile_index).delete(tile_index)
+
+    # Multi --------------------------------------------------------------------
+
+    def put_multi(self, tiles):
+        for storage, group in self._group(tiles, lambda tile: tile.index):
+            storage.put_multi(group)
+
+    def get_multi(self, tile_indexes):
+        tiles = dict()
+        for storage, group in self._group(tile_indexes):
+            tiles.update(storage.get_multi(group))
+        return tiles
+
+    def delete_multi(self, tile_indexes):
+        for storage, group in self._group(tile_indexes):
+            storage.delete_multi(group)
+
+    def has_all(self, tile_indexes):
+        return all(storage.has_all(group) for storage, group in \
+                   self._group(tile_indexes))
+
+    def has_any(self, tile_indexes):
+        return any(storage.has_any(group) for storage, group in \
+                   self._group(tile_indexes))
+
+    def flush_all(self):
+        for storage in self._storages:
+            storage.flush_all()
+
+    def close(self):
+        for storage in self._storages:
+            storage.close()
+
+    def reopen(self):
+        for storage in self._storages:
+            storage.reopen()
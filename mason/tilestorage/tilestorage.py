@@ -4,6 +4,11 @@ Created on May 2, 2012
 @author: Kotaimen
 '''
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 class TileStorageError(Exception):
     pass
 
@@ -111,6 +116,24 @@ class TileStorage(object):
         """ Check whether storage has any given tiles """
         return any(self.has(tile_index) for tile_index in tile_indexes)
 
+    def has_all_multi(self, tile_index_groups):
+        """ Check has_all() of many groups of tiles in one call, eg: check
+        existence of many MetaTiles
+
+        Returns a list of bool for each group.  Implementation may provide a
+        more efficient way to do this.
+        """
+        return list(self.has_all(tile_indexes) for tile_indexes in tile_index_groups)
+
+    def has_array(self, tile_indexes):
+        """ Check existence of many tiles in one call
+
+        tile_indexes can be a TileIndexArray or a sequence of TileIndexes,
+        returns a numpy boolean array of same length.
+        """
+        return numpy.fromiter((self.has(tile_index) for tile_index in tile_indexes),
+                              dtype=numpy.bool_, count=len(tile_indexes))
+
     def flush_all(self):
         """ Delete all tiles in the storage """
         raise NotImplementedError
@@ -119,6 +142,17 @@ class TileStorage(object):
         """ Close the storage """
         pass
 
+    def reopen(self):
+        """ Reopen connections of the storage
+
+        Called in a forked process which inherited the storage from its
+        parent, connection-like resources (sockets, database handles,
+        threads) must not be shared with the parent and have to be
+        recreated.  Note the inherited connections are not closed since
+        they are still used by the parent.
+        """
+        pass
+
 
 #===============================================================================
 # Special Tile Storages
@@ -4,3 +4,10 @@ from .humansize import human_size
 from .gdaltools import SpatialTransformer, gdal_hillshading, gdal_colorrelief
 from .tempfn import create_temp_filename, TempFile
 
+try:
+    from .demtools import hillshading, ColorPalette
+except ImportError:
+    # Requires numpy
+    hillshading = ColorPalette = None
+
+from .lease import LeaseCoordinator, LeaseClient
@@ -0,0 +1,209 @@
+# -*- coding:utf-8 -*-
+'''
+In-process DEM processors
+
+Numpy implementation of "gdaldem hillshade" and "gdaldem color-relief",
+works on arrays so no temporary file and subprocess is required, output
+matches gdaldem with "-compute_edges" and "-alpha".
+
+Created on Oct 18, 2026
+@author: Kotaimen
+'''
+import re
+import math
+
+import numpy
+
+
+#==============================================================================
+# Hill Shading
+#==============================================================================
+def _neighbours(elevation, nodata=None):
+    """ Returns a function gives the array of neighbour at (dy, dx) of
+    each pixel, beyond the edges are extrapolated like gdaldem, nodata
+    neighbours are replaced by the center pixel """
+    height, width = elevation.shape
+    padded = numpy.pad(elevation, 1, mode='reflect', reflect_type='odd')
+    if nodata is not None:
+        invalid = elevation == nodata
+        # Extrapolated value is nodata if any of its source is nodata
+        padded_invalid = numpy.pad(invalid, 1, mode='reflect') | \
+            numpy.pad(invalid, 1, mode='edge')
+
+    def neighbour(dy, dx):
+        window = padded[1 + dy:1 + dy + height, 1 + dx:1 + dx + width]
+        if nodata is not None:
+            mask = padded_invalid[1 + dy:1 + dy + height,
+                                  1 + dx:1 + dx + width]
+            window = numpy.where(mask, elevation, window)
+        return window
+
+    return neighbour
+
+
+def hillshading(elevation, resx, resy, zfactor=1, scale=1, altitude=45,
+                azimuth=315, nodata=None):
+    """ Shade the elevation array like gdaldem hillshade
+
+    @param resx: pixel width, geotransform[1]
+    @param resy: pixel height, geotransform[5], negative for north up
+    @param zfactor: vertical exaggeration
+    @param scale: ratio of vertical units to horizontal
+    @param altitude: altitude of the light, in degrees.
+    @param azimuth: azimuth of the light.
+    @param nodata: nodata value of elevation, which is shaded as 0
+    @return: uint8 array, 0 is nodata
+    """
+    elevation = numpy.asarray(elevation, dtype=numpy.float64)
+    n = _neighbours(elevation, nodata)
+
+    # Horn's formula
+    x = ((n(-1, -1) + 2 * n(0, -1) + n(1, -1)) -
+         (n(-1, 1) + 2 * n(0, 1) + n(1, 1))) / resx
+    y = ((n(1, -1) + 2 * n(1, 0) + n(1, 1)) -
+         (n(-1, -1) + 2 * n(-1, 0) + n(-1, 1))) / resy
+
+    z_scale_factor = zfactor / (8. * scale)
+    key = x * x + y * y
+    aspect = numpy.arctan2(y, x)
+    cang = (math.sin(math.radians(altitude)) -
+            math.cos(math.radians(altitude)) * z_scale_factor *
+            numpy.sqrt(key) * numpy.sin(aspect - math.radians(azimuth))) / \
+        numpy.sqrt(1 + z_scale_factor * z_scale_factor * key)
+
+    shade = numpy.where(cang <= 0, 1., 1. + 254. * cang)
+    shade = shade.astype(numpy.uint8)
+    if nodata is not None:
+        shade[elevation == nodata] = 0
+    return shade
+
+
+#==============================================================================
+# Color Relief
+#==============================================================================
+# Color names understood by gdaldem
+COLOR_NAMES = dict(white=(255, 255, 255, 255),
+                   black=(0, 0, 0, 255),
+                   red=(255, 0, 0, 255),
+                   green=(0, 255, 0, 255),
+                   blue=(0, 0, 255, 255),
+                   yellow=(255, 255, 0, 255),
+                   magenta=(255, 0, 255, 255),
+                   fuchsia=(255, 0, 255, 255),
+                   cyan=(0, 255, 255, 255),
+                   aqua=(0, 255, 255, 255),
+                   grey=(190, 190, 190, 255),
+                   gray=(190, 190, 190, 255),
+                   orange=(255, 127, 0, 255),
+                   brown=(165, 42, 42, 255),
+                   purple=(160, 32, 240, 255),
+                   violet=(160, 32, 240, 255),
+                   indigo=(75, 0, 130, 255),)
+
+
+class ColorPalette(object):
+
+    """ Color relief palette parsed from a gdaldem color context file
+
+    Colors are linearly interpolated between entries and clamped to the
+    first/last entry outside the range, elevation can be absolute or
+    percentage of the raster range, eg::
+
+        3500   white
+        2500   235:220:175
+        50%    190 185 135
+        0      50  180  50
+        nv     0   0   0   0
+
+    The palette is parsed once, integer elevations are colored using a
+    lookup table covering the elevation range.
+    """
+
+    def __init__(self, color_context):
+        entries = list()
+        self._nodata_color = (0, 0, 0, 0)
+        with open(color_context, 'r') as fp:
+            for line in fp:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                tokens = re.split(r'[\s,:]+', line)
+                value, color = tokens[0], tokens[1:]
+                if len(color) == 1:
+                    color = COLOR_NAMES[color[0].lower()]
+                elif len(color) == 3:
+                    color = tuple(int(c) for c in color) + (255,)
+                elif len(color) == 4:
+                    color = tuple(int(c) for c in color)
+                else:
+                    raise ValueError('Invalid color entry "%s"' % line)
+
+                if value.lower() == 'nv':
+                    self._nodata_color = color
+                elif value.endswith('%'):
+                    entries.append((float(value[:-1]), True, color))
+                else:
+                    entries.append((float(value), False, color))
+
+        if not entries:
+            raise ValueError('No color found in "%s"' % color_context)
+        self._percentage = any(percent for _v, percent, _c in entries)
+        self._entries = entries
+        self._values, self._colors = self._breakpoints(0, 100)
+
+    def _breakpoints(self, minimum, maximum):
+        """ Sorted elevations and their colors as a Nx4 float array """
+        values = list()
+        for value, percent, _color in self._entries:
+            if percent:
+                value = minimum + value / 100. * (maximum - minimum)
+            values.append(value)
+        order = numpy.argsort(values, kind='mergesort')
+        values = numpy.array(values, dtype=numpy.float64)[order]
+        colors = numpy.array(list(c for _v, _p, c in self._entries),
+                             dtype=numpy.float64)[order]
+        return values, colors
+
+    def _interpolate(self, elevation, values, colors):
+        rgba = numpy.empty((4,) + elevation.shape, dtype=numpy.uint8)
+        for band in range(4):
+            # gdaldem rounds with 0.45
+            rgba[band] = numpy.interp(elevation, values,
+                                      colors[:, band]) + 0.45
+        return rgba
+
+    def colorize(self, elevation, nodata=None):
+        """ Color given elevation array, returns RGBA as a
+        (4, height, width) uint8 array """
+        elevation = numpy.asarray(elevation)
+        valid = None
+        if nodata is not None:
+            valid = elevation != nodata
+
+        values, colors = self._values, self._colors
+        if self._percentage or elevation.dtype.kind in 'iu':
+            data = elevation if valid is None else elevation[valid]
+            if data.size:
+                # Python numbers, range of the DEM may overflow its dtype
+                number = int if elevation.dtype.kind in 'iu' else float
+                minimum, maximum = number(data.min()), number(data.max())
+            else:
+                minimum = maximum = 0
+            if self._percentage:
+                values, colors = self._breakpoints(float(minimum),
+                                                   float(maximum))
+
+        if elevation.dtype.kind in 'iu' and maximum - minimum < 65536:
+            # Color each distinct elevation once
+            lut = self._interpolate(numpy.arange(minimum, maximum + 1),
+                                    values, colors)
+            offset = numpy.clip(elevation.astype(numpy.int64) - minimum,
+                                0, maximum - minimum)
+            rgba = lut[:, offset]
+        else:
+            rgba = self._interpolate(elevation, values, colors)
+
+        if valid is not None:
+            for band in range(4):
+                rgba[band][~valid] = self._nodata_color[band]
+        return rgba
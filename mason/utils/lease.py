@@ -0,0 +1,422 @@
+'''
+Lease based work distribution over HTTP
+
+A LeaseCoordinator owns an iterable of tasks and hands them out in
+batches to remote LeaseClients, a batch is leased for a limited time
+and handed out again if the lease is not completed or renewed in time,
+eg: the worker crashed or lost its network.  Tasks must be JSON
+serializable.
+
+Protocol is plain JSON over HTTP POST:
+
+    /lease      {worker}                    -> {lease, tasks, timeout, done}
+    /renew      {lease}                     -> {renewed}
+    /complete   {lease, worker, statistics} -> {accepted}
+    /status                                 -> {statistics, workers, ...}
+
+Created on Oct 18, 2026
+
+@author: Kotaimen
+'''
+
+import os
+import time
+import json
+import socket
+import logging
+import urllib2
+import itertools
+import threading
+import collections
+import SocketServer
+import BaseHTTPServer
+
+logger = logging.getLogger(__name__)
+
+
+#==============================================================================
+# Coordinator
+#==============================================================================
+class _Batch(object):
+
+    __slots__ = ('tasks', 'done', 'lost')
+
+    def __init__(self, tasks):
+        self.tasks = tasks
+        self.done = False
+        # Ids of expired leases of the batch
+        self.lost = list()
+
+
+class LeaseCoordinator(object):
+
+    """ Lease batches of tasks to remote workers
+
+    Tasks are taken from the iterable by a producer thread which keeps a
+    few batches ahead of the workers, so the iterable can be a lazy walk
+    of millions of tasks, and a slow iterable never blocks renewing or
+    completing leases.  A batch whose lease expires is queued again and leased before any new
+    batch, late completion of an expired lease is still accepted if the
+    batch is not completed by another worker yet.
+
+    Statistics reported by workers with completed leases are summed in
+    statistics, per worker statistics are kept in workers.
+    """
+
+    def __init__(self, tasks, lease_size=16, lease_timeout=600,
+                 address=('', 0), prefetch=4):
+        assert lease_size > 0
+        assert lease_timeout > 0
+        assert prefetch > 0
+        self._tasks = iter(tasks)
+        self._lease_size = lease_size
+        self._lease_timeout = lease_timeout
+        self._prefetch = prefetch
+
+        self._lock = threading.Lock()
+        # Signaled when a batch is produced or taken
+        self._produced = threading.Condition(self._lock)
+        self._taken = threading.Condition(self._lock)
+        # New batches filled by the producer
+        self._batches = collections.deque()
+        self._producer = None
+        self._error = None
+        self._closed = False
+        self._lease_ids = itertools.count(1)
+        # lease id -> (batch, deadline, worker)
+        self._leases = dict()
+        # lease id -> batch of expired leases, until the batch is done
+        self._lost = dict()
+        # Batches of expired leases, leased again before new batches
+        self._retry = collections.deque()
+        self._exhausted = False
+        self._finished = threading.Event()
+
+        self._statistics = collections.Counter()
+        self._workers = collections.defaultdict(collections.Counter)
+        self._requeued = 0
+
+        self._server = _LeaseServer(address, _LeaseRequestHandler)
+        self._server.coordinator = self
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._server.server_address
+
+    @property
+    def finished(self):
+        return self._finished.is_set()
+
+    @property
+    def statistics(self):
+        with self._lock:
+            return dict(self._statistics)
+
+    @property
+    def workers(self):
+        with self._lock:
+            return dict((worker, dict(statistics)) for worker, statistics \
+                        in self._workers.items())
+
+    @property
+    def requeued(self):
+        return self._requeued
+
+    # Server ------------------------------------------------------------------
+
+    def start(self):
+        """ Serve workers in a background thread """
+        self._producer = threading.Thread(target=self._produce,
+                                          name='coordinator-producer')
+        self._producer.daemon = True
+        self._producer.start()
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name='coordinator')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def join(self, timeout=None):
+        """ Wait until all tasks are completed, returns whether finished """
+        deadline = None if timeout is None else time.time() + timeout
+        while not self._finished.wait(1 if timeout is None else \
+                                      min(1, max(0, deadline - time.time()))):
+            # Expire leases even nobody is asking for work
+            with self._lock:
+                if self._error is not None:
+                    raise self._error
+                self._expire()
+                self._check_finished()
+            if deadline is not None and time.time() >= deadline:
+                break
+        return self._finished.is_set()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._taken.notify_all()
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+    # Lease -------------------------------------------------------------------
+
+    def _produce(self):
+        """ Fill new batches from the iterable, runs in its own thread so
+        the lock is not held while waiting for the iterable """
+        try:
+            while True:
+                with self._lock:
+                    while len(self._batches) >= self._prefetch and \
+                            not self._closed:
+                        self._taken.wait()
+                    if self._closed:
+                        return
+                tasks = list(itertools.islice(self._tasks, self._lease_size))
+                with self._lock:
+                    if tasks:
+                        self._batches.append(_Batch(tasks))
+                    else:
+                        self._exhausted = True
+                        self._check_finished()
+                    self._produced.notify_all()
+                    if self._exhausted:
+                        return
+        except Exception as e:
+            logger.exception('Error while producing tasks')
+            with self._lock:
+                self._error = e
+                self._produced.notify_all()
+
+    def lease(self, worker, wait=1):
+        """ Lease a batch to the worker, waits at most wait seconds for
+        the producer if no batch is available yet """
+        with self._lock:
+            self._expire()
+
+            batch = None
+            while self._retry:
+                batch = self._retry.popleft()
+                if not batch.done:
+                    break
+                batch = None
+
+            if batch is None and not self._batches and \
+                    not self._exhausted and self._error is None:
+                self._produced.wait(wait)
+            if self._error is not None:
+                raise RuntimeError('Failed to produce tasks: %s' % \
+                                   self._error)
+            if batch is None and self._batches:
+                batch = self._batches.popleft()
+                self._taken.notify()
+
+            if batch is None:
+                self._check_finished()
+                return dict(lease=None, tasks=[],
+                            done=self._finished.is_set())
+
+            lease = next(self._lease_ids)
+            self._leases[lease] = (batch, time.time() + self._lease_timeout,
+                                   worker)
+            return dict(lease=lease, tasks=batch.tasks,
+                        timeout=self._lease_timeout, done=False)
+
+    def renew(self, lease):
+        with self._lock:
+            if lease not in self._leases:
+                return dict(renewed=False)
+            batch, _deadline, worker = self._leases[lease]
+            self._leases[lease] = (batch, time.time() + self._lease_timeout,
+                                   worker)
+            return dict(renewed=True)
+
+    def complete(self, lease, worker, statistics):
+        with self._lock:
+            if lease in self._leases:
+                batch = self._leases.pop(lease)[0]
+            else:
+                batch = self._lost.pop(lease, None)
+
+            accepted = batch is not None and not batch.done
+            if accepted:
+                batch.done = True
+                # Workers of expired leases may never come back
+                for lost in batch.lost:
+                    self._lost.pop(lost, None)
+                batch.lost = list()
+                self._statistics.update(statistics)
+                self._workers[worker].update(statistics)
+                self._workers[worker]['leases'] += 1
+            self._check_finished()
+            return dict(accepted=accepted)
+
+    def status(self):
+        with self._lock:
+            return dict(statistics=dict(self._statistics),
+                        workers=dict((k, dict(v)) for k, v in \
+                                     self._workers.items()),
+                        leased=len(self._leases),
+                        lost=len(self._lost),
+                        retry=len(self._retry),
+                        prefetched=len(self._batches),
+                        requeued=self._requeued,
+                        exhausted=self._exhausted,
+                        done=self._finished.is_set())
+
+    def _expire(self):
+        now = time.time()
+        for lease, (batch, deadline, worker) in self._leases.items():
+            if deadline > now:
+                continue
+            del self._leases[lease]
+            if batch.done:
+                continue
+            logger.warning('Lease #%d of %s expired, %d tasks requeued',
+                           lease, worker, len(batch.tasks))
+            self._lost[lease] = batch
+            batch.lost.append(lease)
+            self._retry.append(batch)
+            self._requeued += 1
+
+    def _check_finished(self):
+        if self._exhausted and not self._batches and \
+                all(batch.done for batch in self._retry) and \
+                all(batch.done for batch, _d, _w in self._leases.values()):
+            self._finished.set()
+
+
+class _LeaseServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _LeaseRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path == '/status':
+            self._reply(200, self.server.coordinator.status())
+        else:
+            self._reply(404, dict(error='Not found'))
+
+    def do_POST(self):
+        coordinator = self.server.coordinator
+        try:
+            length = int(self.headers.getheader('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or '{}')
+            if self.path == '/lease':
+                result = coordinator.lease(body['worker'])
+            elif self.path == '/renew':
+                result = coordinator.renew(body['lease'])
+            elif self.path == '/complete':
+                result = coordinator.complete(body['lease'],
+                                              body['worker'],
+                                              body.get('statistics', {}))
+            elif self.path == '/status':
+                result = coordinator.status()
+            else:
+                self._reply(404, dict(error='Not found'))
+                return
+        except Exception as e:
+            logger.exception('Error while serving %s', self.path)
+            self._reply(500, dict(error=str(e)))
+        else:
+            self._reply(200, result)
+
+    def _reply(self, code, result):
+        data = json.dumps(result)
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug('%s %s', self.address_string(), format % args)
+
+
+#==============================================================================
+# Client
+#==============================================================================
+class LeaseClient(object):
+
+    """ Worker side of a LeaseCoordinator
+
+    Usage::
+
+        client = LeaseClient(('render0', 8000))
+        for lease, tasks in client.leases():
+            for task in tasks:
+                ... do something ...
+                client.renew(lease)
+            client.complete(lease, done=len(tasks))
+
+    """
+
+    def __init__(self, address, worker=None, retry_interval=1, retries=5,
+                 timeout=60):
+        host, port = address
+        self._url = 'http://%s:%d' % (host or 'localhost', port)
+        if worker is None:
+            worker = '%s:%d' % (socket.gethostname(), os.getpid())
+        self._worker = worker
+        self._retry_interval = retry_interval
+        self._retries = retries
+        self._timeout = timeout
+
+    @property
+    def worker(self):
+        return self._worker
+
+    def _call(self, path, **body):
+        request = urllib2.Request(self._url + path, json.dumps(body),
+                                  {'Content-Type': 'application/json'})
+        for retry in itertools.count():
+            try:
+                response = urllib2.urlopen(request, timeout=self._timeout)
+                try:
+                    return json.load(response)
+                finally:
+                    response.close()
+            except (urllib2.URLError, socket.error):
+                if retry >= self._retries:
+                    raise
+                logger.warning('Failed to call %s%s, retrying...',
+                               self._url, path)
+                time.sleep(self._retry_interval)
+
+    def lease(self):
+        """ Lease a batch of tasks, returns (lease, tasks), or None if all
+        tasks are completed.  Blocks while there is nothing to lease but
+        some leases are not completed yet, since they may expire. """
+        while True:
+            result = self._call('/lease', worker=self._worker)
+            if result['lease'] is not None:
+                return result['lease'], result['tasks']
+            if result['done']:
+                return None
+            time.sleep(self._retry_interval)
+
+    def leases(self):
+        """ Iterate (lease, tasks) until all tasks are completed """
+        while True:
+            result = self.lease()
+            if result is None:
+                return
+            yield result
+
+    def renew(self, lease):
+        """ Extend the lease, returns False if the lease already expired """
+        return self._call('/renew', lease=lease)['renewed']
+
+    def complete(self, lease, **statistics):
+        """ Complete the lease, returns False if the batch was already
+        completed by another worker after the lease expired """
+        return self._call('/complete', lease=lease, worker=self._worker,
+                          statistics=statistics)['accepted']
+
+    def status(self):
+        return self._call('/status')
@@ -5,6 +5,7 @@ Created on May 1, 2012
 '''
 
 import unittest
+import numpy
 from mason.core.geo import *
 
 
@@ -99,6 +100,48 @@ class TestProjection(unittest.TestCase):
                         (-180, -85.051128779806589, 180, 85.051128779806604))
 
 
+class TestProjectionArray(unittest.TestCase):
+
+    def setUp(self):
+        self.proj = GoogleMercatorProjection()
+
+    def testProjectArray(self):
+        lons = [-180, -45.5, 0, 121.3, 180]
+        lats = [-85, -12.25, 0, 31.1, 85]
+        xs, ys = self.proj.project_array(lons, lats)
+        for lon, lat, x, y in zip(lons, lats, xs, ys):
+            point = self.proj.project(Coordinate(lon, lat))
+            self.assertAlmostEqual(point.x, x, places=12)
+            self.assertAlmostEqual(point.y, y, places=12)
+
+        lons2, lats2 = self.proj.unproject_array(xs, ys)
+        numpy.testing.assert_allclose(lons2, lons)
+        numpy.testing.assert_allclose(lats2, lats)
+
+    def testCoord2TileArray(self):
+        xs, ys = self.proj.coord2tile_array([-180, -180, 180, 121.3],
+                                            [85, -85, -85, 31.1], 6)
+        self.assertEqual(list(xs), [0, 0, 63, 53])
+        self.assertEqual(list(ys), [0, 63, 63, 26])
+
+    def testTileEnvelopeArray(self):
+        z = 4
+        x, y = numpy.meshgrid(numpy.arange(16), numpy.arange(16))
+        envelopes = self.proj.tile_envelope_array(z, x.ravel(), y.ravel())
+        self.assertEqual(envelopes.shape, (256, 4))
+        for row, i, j in zip(envelopes, x.ravel(), y.ravel()):
+            expected = self.proj.tile_envelope(z, i, j).make_tuple()
+            numpy.testing.assert_allclose(row, expected, atol=1e-9)
+
+    def testTileBufferedEnvelopeArray(self):
+        envelopes = self.proj.tile_buffered_envelope_array([2, 3], [2, 0],
+                                                           [1, 0], 512, 32)
+        numpy.testing.assert_allclose(envelopes[0],
+                                      (-5.625, -5.615985819155327,
+                                       95.625, 68.65655498475735))
+        self.assertEqual(envelopes.shape, (2, 4))
+
+
 class TestTileCoordinates(unittest.TestCase):
 
     def testCoord2Serial(self):
@@ -106,6 +149,107 @@ class TestTileCoordinates(unittest.TestCase):
         self.assertEqual(tile_coordinate_to_serial(0, 0, 0), 0)
         self.assertEqual(tile_coordinate_to_serial(8, 8, 8), 23901)
 
+    def testCoord2Dirname(self):
+        self.assertEqual(tile_coordiante_to_dirname(0, 0, 0), ['00'])
+        self.assertEqual(tile_coordiante_to_dirname(6, 63, 63), ['06'])
+        self.assertEqual(tile_coordiante_to_dirname(7, 127, 64), ['07', '03'])
+        self.assertEqual(tile_coordiante_to_dirname(20, 1000000, 7),
+                         ['20', '00', '00', '3D', '09'])
+        self.assertEqual(tile_coordiante_to_dirname(10, 5, 900, m=4),
+                         ['10', 'E1', '01'])
+
+        z = numpy.array([0, 6, 7, 20, 7])
+        x = numpy.array([0, 63, 127, 1000000, 0])
+        y = numpy.array([0, 63, 64, 7, 0])
+        self.assertEqual(tile_coordiante_to_dirname_array(z, x, y),
+                         list(tile_coordiante_to_dirname(*c) for c in zip(z, x, y)))
+
+    def testSerial2Coord(self):
+        for coord in [(0, 0, 0), (1, 1, 0), (8, 8, 8), (17, 12345, 54321)]:
+            serial = tile_coordinate_to_serial(*coord)
+            self.assertEqual(serial_to_tile_coordinate(serial), coord)
+        z, x, y = serial_to_tile_coordinate_array([0, 14, 23901])
+        self.assertEqual(list(z), [0, 2, 8])
+        self.assertEqual(list(x), [0, 1, 8])
+        self.assertEqual(list(y), [0, 2, 8])
+
+    def testMorton(self):
+        self.assertEqual(tile_coordinate_to_morton(1, 1, 0), 1)
+        self.assertEqual(tile_coordinate_to_morton(1, 0, 1), 2)
+        self.assertEqual(tile_coordinate_to_morton(2, 3, 3), 15)
+        for z in range(0, 5):
+            codes = list()
+            for x in range(2 ** z):
+                for y in range(2 ** z):
+                    d = tile_coordinate_to_morton(z, x, y)
+                    self.assertEqual(morton_to_tile_coordinate(z, d), (x, y))
+                    codes.append(d)
+            self.assertEqual(sorted(codes), list(range(4 ** z)))
+
+    def testHilbert(self):
+        for z in range(0, 5):
+            points = list(hilbert_to_tile_coordinate(z, d) for d in range(4 ** z))
+            self.assertEqual(len(set(points)), 4 ** z)
+            for d, (x, y) in enumerate(points):
+                self.assertEqual(tile_coordinate_to_hilbert(z, x, y), d)
+            # Each step moves to an adjacent tile
+            for (x1, y1), (x2, y2) in zip(points, points[1:]):
+                self.assertEqual(abs(x1 - x2) + abs(y1 - y2), 1)
+
+    def testCurveArray(self):
+        z = numpy.array([0, 3, 7, 12, 20])
+        x = numpy.array([0, 5, 100, 1234, 987654])
+        y = numpy.array([0, 2, 27, 4000, 123])
+        for encode, decode, encode_array, decode_array in \
+                [(tile_coordinate_to_morton, morton_to_tile_coordinate,
+                  tile_coordinate_to_morton_array, morton_to_tile_coordinate_array),
+                 (tile_coordinate_to_hilbert, hilbert_to_tile_coordinate,
+                  tile_coordinate_to_hilbert_array, hilbert_to_tile_coordinate_array)]:
+            d = encode_array(z, x, y)
+            self.assertEqual(list(d), list(encode(*c) for c in zip(z, x, y)))
+            x2, y2 = decode_array(z, d)
+            self.assertEqual(list(x2), list(x))
+            self.assertEqual(list(y2), list(y))
+
+    def testShardingIndex(self):
+        counts = [0] * 4
+        for x in range(64):
+            for y in range(64):
+                n = tile_coordinate_to_sharding_index(6, x, y, 4, m=4)
+                self.assertEqual(n, tile_coordinate_to_sharding_index(6, x // 4 * 4,
+                                                                      y // 4 * 4,
+                                                                      4, m=4))
+                counts[n] += 1
+        self.assertTrue(all(count > 4096 // 8 for count in counts))
+
+        # Adding a shard only moves blocks to the new shard
+        for x in range(64):
+            for y in range(64):
+                old = tile_coordinate_to_sharding_index(6, x, y, 4, m=4)
+                new = tile_coordinate_to_sharding_index(6, x, y, 5, m=4)
+                self.assertTrue(new == old or new == 4)
+
+        z = numpy.array([0, 3, 9, 14, 20])
+        x = numpy.array([0, 5, 100, 1234, 987654])
+        y = numpy.array([0, 2, 27, 4000, 123])
+        self.assertEqual(list(tile_coordinate_to_sharding_index_array(z, x, y, 7)),
+                         list(tile_coordinate_to_sharding_index(*c + (7,))
+                              for c in zip(z, x, y)))
+
+    def testWalkCurve(self):
+        for order in ['morton', 'hilbert']:
+            encode = CURVE_ORDERS[order][0]
+            tiles = list(walk_curve(order, 5, 3, 7, 20, 12))
+            self.assertEqual(sorted(tiles),
+                             list((x, y) for x in range(3, 21) for y in range(7, 13)))
+            distances = list(encode(5, x, y) for x, y in tiles)
+            self.assertEqual(distances, sorted(distances))
+            # Seek to a tile in range
+            for start in [1, 7, 50, len(tiles) - 1, len(tiles)]:
+                self.assertEqual(list(walk_curve(order, 5, 3, 7, 20, 12,
+                                                 start=start)),
+                                 tiles[start:])
+
 
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']
@@ -9,7 +9,7 @@ import os, os.path
 
 import unittest
 
-from mason.core.pyramid import Pyramid
+from mason.core.pyramid import Pyramid, TileOutOfRange
 from mason.core.tile import Tile, MetaTile
 from mason.core.format import Format
 
@@ -81,6 +81,60 @@ class TestPyramid(unittest.TestCase):
         self.assertEqual(tile.data, b'data2')
         self.assertEqual(tile.data_hash, hashlib.sha256(b'data2').hexdigest())
 
+    def testTileRange(self):
+        pyramid = Pyramid(levels=list(range(0, 10)),
+                          envelope=(-180, -70, 0, 0))
+        self.assertEqual(pyramid.tile_range(0), (0, 0, 0, 0))
+        # Tiles touching envelope edges are in range
+        self.assertEqual(pyramid.tile_range(2), (0, 1, 2, 3))
+        self.assertEqual(list(pyramid.tiles_in_range(1)),
+                         [(0, 0), (0, 1), (1, 0), (1, 1)])
+        xs, ys = pyramid.tiles_in_range_array(2)
+        self.assertEqual(list(zip(xs, ys)), list(pyramid.tiles_in_range(2)))
+
+        self.assertRaises(TileOutOfRange, pyramid.create_tile_index, 2, 3, 2)
+        self.assertRaises(TileOutOfRange, pyramid.create_tile_index, 2, 1, 0)
+        self.assertRaises(TileOutOfRange, pyramid.tile_range, 10)
+        index = pyramid.create_tile_index(2, 3, 2, range_check=False)
+        self.assertEqual(index.coord, (2, 3, 2))
+
+        # Range check agrees with envelope intersection
+        for z in range(0, 6):
+            dim = 2 ** z
+            for x in range(dim):
+                for y in range(dim):
+                    index = pyramid.create_tile_index(z, x, y, range_check=False)
+                    try:
+                        pyramid.create_tile_index(z, x, y)
+                    except TileOutOfRange:
+                        in_range = False
+                    else:
+                        in_range = True
+                    self.assertEqual(in_range,
+                                     index.envelope.intersects(pyramid.envelope))
+
+    def testIndexCache(self):
+        pyramid = Pyramid(index_cache_size=2)
+        self.assertEqual(pyramid.index_cache_info(), (0, 0, 2, 0))
+
+        index1 = pyramid.create_tile_index(3, 1, 2)
+        self.assertTrue(pyramid.create_tile_index(3, 1, 2) is index1)
+        self.assertTrue(pyramid.create_tile_index(3, 9, 2) is index1)
+
+        metatile_index = pyramid.create_metatile_index(3, 1, 2, 2)
+        self.assertTrue(pyramid.create_metatile_index(3, 0, 3, 2) is metatile_index)
+        self.assertEqual(metatile_index.coord, (3, 0, 2))
+        self.assertEqual(pyramid.index_cache_info(), (3, 2, 2, 2))
+
+        # Least recently used index is evicted
+        pyramid.create_tile_index(3, 4, 4)
+        self.assertFalse(pyramid.create_tile_index(3, 1, 2) is index1)
+        self.assertEqual(pyramid.index_cache_info().currsize, 2)
+
+        # Cloned pyramid starts with empty cache
+        self.assertEqual(pyramid.clone().index_cache_info(), (0, 0, 2, 0))
+        self.assertEqual(Pyramid().index_cache_info(), None)
+
     def testCreateMetaTileIndex(self):
         pyramid = Pyramid(buffer=32)
 
@@ -100,6 +154,48 @@ class TestPyramid(unittest.TestCase):
         self.assertEqual(index.coord, (10, 48, 16))
         self.assertEqual(index.stride, 16)
 
+    def testTileIndexGeometry(self):
+        pyramid = Pyramid(buffer=16)
+
+        index = pyramid.create_tile_index(5, 3, 7)
+        self.assertFalse(hasattr(index, '__dict__'))
+        self.assertEqual(index.envelope,
+                         pyramid.calculate_tile_envelope(5, 3, 7))
+        self.assertEqual(index.buffered_envelope,
+                         pyramid.calculate_tile_buffered_envelope(5, 3, 7))
+        self.assertEqual(index.serial, pyramid.calculate_tile_serial(5, 3, 7))
+
+        metatile_index = pyramid.create_metatile_index(5, 4, 8, 4)
+        self.assertEqual(metatile_index.tile_size, 1024)
+        self.assertEqual(metatile_index.buffered_tile_size, 1056)
+        left_bottom = pyramid.create_tile_index(5, 4, 11)
+        right_top = pyramid.create_tile_index(5, 7, 8)
+        self.assertEqual(metatile_index.envelope.leftbottom,
+                         left_bottom.envelope.leftbottom)
+        self.assertEqual(metatile_index.envelope.righttop,
+                         right_top.envelope.righttop)
+        self.assertEqual(metatile_index.buffered_envelope.leftbottom,
+                         left_bottom.buffered_envelope.leftbottom)
+        self.assertEqual(metatile_index.buffered_envelope.righttop,
+                         right_top.buffered_envelope.righttop)
+
+    def testMetaTileFission(self):
+        pyramid = Pyramid()
+
+        metatile_index = pyramid.create_metatile_index(4, 4, 8, 4)
+        indexes = metatile_index.fission()
+        self.assertEqual(len(indexes), 16)
+        self.assertEqual(indexes[0].coord, (4, 4, 8))
+        self.assertEqual(indexes[1].coord, (4, 4, 9))
+        self.assertEqual(indexes[4].coord, (4, 5, 8))
+        self.assertEqual(indexes[-1].coord, (4, 7, 11))
+        self.assertEqual(list(i.coord for i in indexes[2:4]),
+                         [(4, 4, 10), (4, 4, 11)])
+        self.assertEqual(list(i.coord for i in indexes),
+                         list(indexes[n].coord for n in range(16)))
+        self.assertTrue(pyramid.create_tile_index(4, 6, 9) in indexes)
+        self.assertRaises(IndexError, lambda: indexes[16])
+
     def testCreateMetaTile(self):
         pyramid = Pyramid()
 
@@ -0,0 +1,89 @@
+'''
+Created on Oct 18, 2026
+
+@author: Kotaimen
+'''
+import unittest
+
+import numpy
+
+from mason.core.format import Format
+from mason.core.pyramid import Pyramid
+from mason.core.tile import MetaTile
+from mason.core.rastertile import RasterMetaTile
+
+
+class TestRasterMetaTile(unittest.TestCase):
+
+    def setUp(self):
+        self.pyramid = Pyramid(levels=list(range(0, 11)))
+        self.index = self.pyramid.create_metatile_index(3, 2, 2, 2)
+        self.geotransform = (-10018754.17, 9783.94, 0.0,
+                             10018754.17, 0.0, -9783.94)
+
+    def testFloatRoundTrip(self):
+        array = numpy.arange(64 * 32, dtype=numpy.float32).reshape(32, 64)
+        metatile = RasterMetaTile.from_array(self.index, array,
+                                             Format.GTIFF,
+                                             geotransform=self.geotransform,
+                                             nodata=-32768)
+        self.assertIs(metatile.array, array)
+        self.assertTrue(metatile.data.startswith(b'II*\x00'))
+
+        # Decoded from data as if read from a cache
+        plain = MetaTile.from_tile_index(self.index, metatile.data,
+                                         Format.GTIFF)
+        decoded = RasterMetaTile.from_metatile(plain)
+        self.assertEqual(decoded.data, metatile.data)
+        self.assertTrue(numpy.array_equal(decoded.array, array))
+        for a, b in zip(decoded.geotransform, self.geotransform):
+            self.assertAlmostEqual(a, b, 2)
+        self.assertEqual(decoded.nodata, -32768)
+
+        self.assertIs(RasterMetaTile.from_metatile(decoded), decoded)
+
+    def testRGBARoundTrip(self):
+        array = numpy.zeros((4, 16, 16), dtype=numpy.uint8)
+        array[0] = 255
+        array[3, :8] = 128
+        metatile = RasterMetaTile.from_array(self.index, array, Format.PNG)
+        self.assertTrue(metatile.data.startswith(b'\x89PNG'))
+        self.assertTrue(metatile.data_hash)
+
+        decoded = RasterMetaTile.from_metatile(metatile)
+        self.assertIs(decoded, metatile)
+        decoded = RasterMetaTile(self.index, metatile.data, Format.PNG, 0)
+        self.assertTrue(numpy.array_equal(decoded.array, array))
+
+    def testDecodeOrder(self):
+        assigned = list()
+
+        class RecordingMetaTile(RasterMetaTile):
+
+            def __setattr__(self, name, value):
+                assigned.append(name)
+                RasterMetaTile.__setattr__(self, name, value)
+
+        array = numpy.zeros((16, 16), dtype=numpy.float32)
+        data = RasterMetaTile.from_array(self.index, array, Format.GTIFF,
+                                         geotransform=self.geotransform).data
+        metatile = RecordingMetaTile(self.index, data, Format.GTIFF, 0)
+        del assigned[:]
+
+        # Threads sharing the MetaTile take it as decoded once array is
+        # set, so it must be set after everything else
+        metatile.geotransform
+        self.assertEqual(assigned[-1], '_array')
+        self.assertTrue(set(['_geotransform', '_projection', '_nodata']) <=
+                        set(assigned[:-1]))
+        self.assertEqual(len(metatile.geotransform), 6)
+
+    def testSupports(self):
+        self.assertTrue(RasterMetaTile.supports(Format.GTIFF))
+        self.assertTrue(RasterMetaTile.supports(Format.JPG))
+        self.assertFalse(RasterMetaTile.supports(Format.GEOJSON))
+
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
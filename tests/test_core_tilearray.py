@@ -0,0 +1,95 @@
+'''
+Created on Oct 18, 2026
+
+@author: Kotaimen
+'''
+import unittest
+
+import numpy
+
+from mason.core.pyramid import Pyramid
+from mason.core.tile import TileIndex, MetaTileIndex
+from mason.core.tilearray import TileIndexArray
+from mason.core.geo import tile_coordiante_to_dirname
+
+
+class TestTileIndexArray(unittest.TestCase):
+
+    def setUp(self):
+        self.pyramid = Pyramid(levels=list(range(0, 21)), buffer=16)
+        self.coords = [(0, 0, 0), (3, 1, 2), (5, 31, 0), (12, 1234, 567),
+                       (20, 1000000, 7)]
+        self.array = TileIndexArray.from_indexes(
+            self.pyramid,
+            list(self.pyramid.create_tile_index(*c) for c in self.coords))
+
+    def testSequence(self):
+        array = self.array
+        self.assertEqual(len(array), 5)
+        self.assertTrue(isinstance(array[1], TileIndex))
+        self.assertEqual(array[1].coord, (3, 1, 2))
+        self.assertEqual(array[-1].coord, (20, 1000000, 7))
+        self.assertEqual(list(i.coord for i in array), self.coords)
+        self.assertEqual(list(i.coord for i in array[1:3]), self.coords[1:3])
+        self.assertEqual(list(i.coord for i in array[array.z > 4]),
+                         self.coords[2:])
+        self.assertEqual(array.coords.tolist(), list(map(list, self.coords)))
+
+        joined = TileIndexArray.concatenate([array, array[:2]])
+        self.assertEqual(len(joined), 7)
+
+    def testSerials(self):
+        self.assertEqual(self.array.serials().tolist(),
+                         list(self.pyramid.create_tile_index(*c).serial \
+                              for c in self.coords))
+
+    def testEnvelopes(self):
+        envelopes = self.array.envelopes()
+        buffered_envelopes = self.array.buffered_envelopes()
+        for c, row, buffered_row in zip(self.coords, envelopes, buffered_envelopes):
+            index = self.pyramid.create_tile_index(*c)
+            numpy.testing.assert_allclose(row, index.envelope.make_tuple(),
+                                          atol=1e-9)
+            numpy.testing.assert_allclose(buffered_row,
+                                          index.buffered_envelope.make_tuple(),
+                                          atol=1e-9)
+
+    def testDirnames(self):
+        self.assertEqual(self.array.dirnames(),
+                         list(tile_coordiante_to_dirname(*c) for c in self.coords))
+
+    def testMetaTiles(self):
+        metatiles, inverse = self.array.metatiles(4)
+        self.assertEqual(metatiles.stride, 4)
+        self.assertEqual(len(metatiles), 5)
+        for n, c in enumerate(self.coords):
+            metatile_index = self.pyramid.create_metatile_index(c[0], c[1],
+                                                                c[2], 4)
+            self.assertTrue(isinstance(metatiles[inverse[n]], MetaTileIndex))
+            self.assertEqual(metatiles[inverse[n]].coord, metatile_index.coord)
+            numpy.testing.assert_allclose(metatiles.envelopes()[inverse[n]],
+                                          metatile_index.envelope.make_tuple(),
+                                          atol=1e-9)
+            numpy.testing.assert_allclose(metatiles.buffered_envelopes()[inverse[n]],
+                                          metatile_index.buffered_envelope.make_tuple(),
+                                          atol=1e-9)
+
+        # Tiles in same metatile are grouped together
+        array = TileIndexArray(self.pyramid, 4, [0, 1, 2, 5, 7], [0, 3, 1, 5, 4])
+        metatiles, inverse = array.metatiles(4)
+        self.assertEqual(metatiles.coords.tolist(), [[4, 0, 0], [4, 4, 4]])
+        self.assertEqual(inverse.tolist(), [0, 0, 0, 1, 1])
+
+    def testFission(self):
+        array = TileIndexArray(self.pyramid, [0, 4, 4], [0, 4, 8], [0, 0, 12], 2)
+        tiles = array.fission()
+        self.assertEqual(len(tiles), 9)
+        expected = list()
+        for metatile_index in array:
+            expected.extend(i.coord for i in metatile_index.fission())
+        self.assertEqual(list(i.coord for i in tiles), expected)
+
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -75,10 +75,26 @@ class TileStorageTestMixin(object):
         self.assertTrue(self.storage.has_all([tileindex1, tileindex2]))
         self.assertFalse(self.storage.has_all([tileindex1, tileindex4]))
         self.assertTrue(self.storage.has_any([tileindex1, tileindex4]))
+        self.assertEqual(list(self.storage.has_array([tileindex1, tileindex4,
+                                                      tileindex2])),
+                         [True, False, True])
+        self.assertEqual(self.storage.has_all_multi([[tileindex1, tileindex2],
+                                                     [tileindex1, tileindex4],
+                                                     [tileindex3]]),
+                         [True, False, False])
         self.storage.delete_multi([tileindex1, tileindex3, tileindex4])
         self.assertTrue(self.storage.has_any([tileindex1, tileindex2]))
         self.assertFalse(self.storage.has_any([tileindex1, tileindex3]))
 
+    def testReopen(self):
+        tile1 = self.pyramid.create_tile(5, 6, 7, b'tile1')
+        self.storage.put(tile1)
+        self.storage.reopen()
+        tile2 = self.pyramid.create_tile(5, 6, 8, b'tile2')
+        self.storage.put(tile2)
+        self.assertEqual(self.storage.get(tile1.index).data, tile1.data)
+        self.assertEqual(self.storage.get(tile2.index).data, tile2.data)
+
 
 class TestFileSystemTileStorageDefault(TileStorageTestMixin, unittest.TestCase):
 
@@ -309,6 +325,148 @@ class TestCascadeTileStorage(TileStorageTestMixin, unittest.TestCase):
         self.storage.close()
 
 
+class TestShardedTileStorage(TileStorageTestMixin, unittest.TestCase):
+
+    def setUp(self):
+        self.pyramid = Pyramid(levels=range(21), format=Format.DATA)
+        self.metadata = Metadata.make_metadata(tag='TestShardedTileStorage')
+        self.output_dir = os.path.join('output', 'TestShardedTileStorage')
+
+        if os.path.exists(self.output_dir):
+            shutil.rmtree(self.output_dir, ignore_errors=True)
+
+        self.storage = factory('sharded',
+                               self.pyramid,
+                               self.metadata,
+                               shards=[['filesystem', {'root': os.path.join(self.output_dir, str(n))}]
+                                       for n in range(3)],
+                               m=2,
+                               )
+
+    def tearDown(self):
+        self.storage.close()
+
+    def testSharding(self):
+        tiles = list(self.pyramid.create_tile(8, x, y, b'tile')
+                     for x in range(16) for y in range(16))
+        self.storage.put_multi(tiles)
+        self.assertTrue(self.storage.has_all(tile.index for tile in tiles))
+
+        counts = list()
+        for n in range(3):
+            root = os.path.join(self.output_dir, str(n))
+            count = sum(len([f for f in files if f.endswith('.dat')])
+                        for _, _, files in os.walk(root))
+            counts.append(count)
+        self.assertEqual(sum(counts), 256)
+        # Tiles are spread over all shards in 2x2 blocks
+        self.assertTrue(all(count > 0 and count % 4 == 0 for count in counts))
+
+
+
+class TestManifestTileStorage(TileStorageTestMixin, unittest.TestCase):
+
+    def setUp(self):
+        self.pyramid = Pyramid(levels=range(21), format=Format.DATA)
+        self.metadata = Metadata.make_metadata(tag='TestManifestTileStorage')
+        self.output_dir = os.path.join('output', 'TestManifestTileStorage')
+
+        if os.path.exists(self.output_dir):
+            shutil.rmtree(self.output_dir, ignore_errors=True)
+        os.makedirs(self.output_dir)
+
+        self.manifest = os.path.join(self.output_dir, 'manifest.npz')
+        self.storage = self.create_storage()
+
+    def create_storage(self):
+        return factory('manifest',
+                       self.pyramid,
+                       self.metadata,
+                       storage=['filesystem',
+                                {'root': os.path.join(self.output_dir, 'tiles')}],
+                       manifest=self.manifest,
+                       )
+
+    def tearDown(self):
+        self.storage.close()
+
+    def testJournal(self):
+        tiles = list(self.pyramid.create_tile(8, x, y, b'tile')
+                     for x in range(100) for y in range(3))
+        self.storage.put_multi(tiles)
+        self.storage.delete(tiles[0].index)
+
+        # Another process sees changes from the journal before compact
+        other = self.create_storage()
+        self.assertEqual(other.manifest.count(8), 299)
+        self.assertFalse(other.has(tiles[0].index))
+        self.assertTrue(other.has_all(tile.index for tile in tiles[1:]))
+        other.close()
+
+        self.assertTrue(os.path.exists(self.manifest))
+        self.assertFalse(os.path.exists(self.manifest + '.log'))
+        self.assertAlmostEqual(other.manifest.coverage(8, 0, 0, 99, 2),
+                               299 / 300.)
+
+    def testShared(self):
+        tiles = list(self.pyramid.create_tile(8, x, 0, b'tile')
+                     for x in range(10))
+        other = self.create_storage()
+
+        # Changes of another process are seen after open
+        self.storage.put_multi(tiles[:5])
+        self.assertTrue(other.has_all(tile.index for tile in tiles[:5]))
+        other.put_multi(tiles[5:])
+        other.delete(tiles[0].index)
+        self.assertFalse(self.storage.has(tiles[0].index))
+        self.assertTrue(self.storage.has_all(tile.index for tile in tiles[1:]))
+
+        # And after the other process compacted the journal
+        other.compact()
+        self.storage.delete(tiles[1].index)
+        self.assertEqual(self.storage.manifest.count(8), 8)
+        self.assertFalse(other.has_any(tile.index for tile in tiles[:2]))
+        self.assertEqual(other.get(tiles[2].index).data, b'tile')
+        other.close()
+
+    def testRebuild(self):
+        child = factory('filesystem', self.pyramid, self.metadata,
+                        root=os.path.join(self.output_dir, 'tiles'))
+        tiles = list(self.pyramid.create_tile(z, x, y, b'tile')
+                     for z in (7, 9) for x in range(70) for y in range(2))
+        child.put_multi(tiles)
+
+        self.assertFalse(self.storage.has_any(tile.index for tile in tiles))
+        self.storage.rebuild()
+        self.assertTrue(self.storage.has_all(tile.index for tile in tiles))
+        self.assertEqual(self.storage.manifest.levels, [7, 9])
+        self.assertEqual(self.storage.manifest.count(9), 140)
+
+    def testRebuildWithPut(self):
+        tile = self.pyramid.create_tile(5, 1, 1, b'tile')
+        other = self.create_storage()
+
+        # Another process puts a tile after its level is scanned
+        child = self.storage._storage
+        scan = child.scan
+
+        def scan_then_put(z):
+            result = scan(z)
+            if z == 5:
+                other.put(tile)
+            return result
+
+        child.scan = scan_then_put
+        self.storage.rebuild()
+
+        self.assertTrue(self.storage.has(tile.index))
+        self.assertTrue(other.has(tile.index))
+        fresh = self.create_storage()
+        self.assertEqual(fresh.get(tile.index).data, b'tile')
+        fresh.close()
+        other.close()
+
+
 class TestS3TileStorage(TileStorageTestMixin, unittest.TestCase):
 
     def setUp(self):
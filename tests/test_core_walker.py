@@ -3,11 +3,20 @@ Created on Sep 7, 2012
 
 @author: Kotaimen
 '''
+import os
+import json
+import itertools
 import unittest
 
+import numpy
+
 from mason.core.pyramid import Pyramid
 from mason.core.geo import GoogleMercatorProjection, Coordinate
-from mason.core.walker import PyramidWalker
+from mason.core.walker import (PyramidWalker, CoverageWalker,
+                               TileListPyramidWalker, UniqueTileListWalker,
+                               WalkCursor, read_tilelist, write_tilelist)
+from mason.core.geo import tile_coordinate_to_hilbert
+from mason.core.coverage import PolygonCoverage, RasterCoverage
 
 
 class TestWalker(unittest.TestCase):
@@ -29,6 +38,219 @@ class TestWalker(unittest.TestCase):
         self.assertEqual(min(all_x), 0)
         self.assertEqual(max(all_x), 28)
 
+    def testWalkArray(self):
+        pyramid = Pyramid()
+        walker = PyramidWalker(pyramid, [0, 1, 5], 4, (-180, -5, 180, 5))
+
+        expected = list(index.coord for index in walker.walk())
+        coords = list()
+        for array in walker.walk_array(chunk_size=10):
+            self.assertTrue(len(array) <= 10)
+            self.assertEqual(array.stride, 4)
+            coords.extend(index.coord for index in array)
+        self.assertEqual(coords, expected)
+
+    def testWalkOrder(self):
+        pyramid = Pyramid()
+        expected = sorted(index.coord for index in \
+                          PyramidWalker(pyramid, [0, 1, 5], 4,
+                                        (-100, -30, 50, 40)).walk())
+        for order in ['morton', 'hilbert']:
+            walker = PyramidWalker(pyramid, [0, 1, 5], 4, (-100, -30, 50, 40),
+                                   order=order)
+            coords = list(index.coord for index in walker.walk())
+            self.assertEqual(sorted(coords), expected)
+            arrays = list(walker.walk_array(chunk_size=7))
+            self.assertEqual(list(index.coord for array in arrays
+                                  for index in array), coords)
+
+    def testCoverage(self):
+        pyramid = Pyramid()
+        levels = [0, 1, 5, 8]
+        box = [(-100.3, -30.2), (50.1, -30.2), (50.1, 40.4), (-100.3, 40.4)]
+        expected = sorted(index.coord for index in \
+                          PyramidWalker(pyramid, levels, 4,
+                                        (-100.3, -30.2, 50.1, 40.4)).walk())
+
+        # Polygon
+        walker = CoverageWalker(pyramid, PolygonCoverage([box]), levels, 4)
+        coords = list(index.coord for index in walker.walk())
+        self.assertEqual(sorted(coords), expected)
+        self.assertEqual(list(index.coord for array in walker.walk_array(7)
+                              for index in array), coords)
+
+        # Polygon with a hole
+        hole = [(-50.3, -10.2), (10.1, -10.2), (10.1, 20.4), (-50.3, 20.4)]
+        walker = CoverageWalker(pyramid, PolygonCoverage([box, hole]),
+                                levels, 4)
+        coords = set(index.coord for index in walker.walk())
+        self.assertTrue(coords < set(expected))
+        inside_hole = set(index.coord for index in \
+                          PyramidWalker(pyramid, [8], 4,
+                                        (-40, 0, 0, 10)).walk())
+        self.assertFalse(coords & inside_hole)
+
+        # Raster mask with 1 degree pixels
+        mask = numpy.zeros((180, 360), dtype=numpy.uint8)
+        mask[90 - 40:90 + 30, 180 - 100:180 + 50] = 1
+        coverage = RasterCoverage(mask, (-180, 1, 0, 90, 0, -1))
+        expected = sorted(index.coord for index in \
+                          PyramidWalker(pyramid, levels, 4,
+                                        (-99.9, -29.9, 49.9, 39.9)).walk())
+        walker = CoverageWalker(pyramid, coverage, levels, 4)
+        self.assertEqual(sorted(index.coord for index in walker.walk()),
+                         expected)
+
+    def testCoverageSeek(self):
+        pyramid = Pyramid()
+        box = [(-100.3, -30.2), (50.1, -30.2), (50.1, 40.4), (-100.3, 40.4)]
+        hole = [(-50.3, -10.2), (10.1, -10.2), (10.1, 20.4), (-50.3, 20.4)]
+
+        class CountingCoverage(PolygonCoverage):
+            walks = 0
+
+            def walk(self, *args, **kwargs):
+                self.walks += 1
+                return PolygonCoverage.walk(self, *args, **kwargs)
+
+        # Walk from a tile of an earlier walk
+        coverage = CountingCoverage([box, hole])
+        tiles = list(coverage.walk(7, 0, 0, 127, 127))
+        for n in [1, 5, 100, len(tiles) // 2, len(tiles) - 1]:
+            self.assertEqual(list(coverage.walk(7, 0, 0, 127, 127,
+                                                start=tiles[n])),
+                             tiles[n:])
+
+        coverage.walks = 0
+        walker = CoverageWalker(pyramid, coverage, [5, 8], 2)
+        walker.MARK_INTERVAL = 5
+        coords = list(index.coord for index in walker.walk())
+        # Levels are not counted when not sharded
+        self.assertEqual(coverage.walks, 2)
+
+        it = walker.walk()
+        list(itertools.islice(it, len(coords) - 20))
+        cursor = walker.cursor
+        coverage.walks = 0
+        self.assertEqual(list(index.coord for index in \
+                              walker.walk(cursor=cursor)),
+                         coords[-20:])
+        self.assertEqual(coverage.walks, 1)
+
+        self.checkShardAndResume(walker)
+
+    def checkShardAndResume(self, walker):
+        expected = list(index.coord for index in walker.walk())
+
+        # Shards are disjoint and covers everything
+        shards = list(list(index.coord for index in walker.walk(i, 3))
+                      for i in range(3))
+        self.assertEqual(sorted(sum(shards, [])), sorted(expected))
+        if hasattr(walker, 'count'):
+            self.assertEqual(sum(walker.count(z, 1, 3) for z in walker.levels),
+                             len(shards[1]))
+            # Levels walked one by one are same as the shard
+            self.assertEqual(list(index.coord for z in walker.levels
+                                  for index in walker.walk_level(z, 1, 3)),
+                             shards[1])
+
+        # Resume from a serialized cursor
+        for stop in [0, 1, 7, len(expected) // 2]:
+            it = walker.walk(1, 3)
+            head = list(index.coord for index in itertools.islice(it, stop))
+            if stop > 0:
+                cursor = WalkCursor.from_dict(
+                    json.loads(json.dumps(walker.cursor.make_dict())))
+            else:
+                cursor = None
+            tail = list(index.coord for index in walker.walk(1, 3, cursor))
+            self.assertEqual(head + tail, shards[1])
+        # Finished cursor resumes nothing
+        self.assertEqual(list(walker.walk(1, 3, walker.cursor)), [])
+
+    def testWalkShard(self):
+        pyramid = Pyramid()
+        envelope = (-100, -30, 50, 40)
+        for order in [None, 'hilbert']:
+            walker = PyramidWalker(pyramid, [0, 1, 5, 6], 4, envelope,
+                                   order=order)
+            self.checkShardAndResume(walker)
+            # Shard of walk_array() is same as walk()
+            coords = list(index.coord for index in walker.walk(2, 3))
+            arrays = list(walker.walk_array(5, 2, 3))
+            self.assertEqual(list(index.coord for array in arrays
+                                  for index in array), coords)
+        self.checkShardAndResume(
+            CoverageWalker(pyramid,
+                           PolygonCoverage([[(-100, -30), (50, -30), (0, 40)]]),
+                           [0, 1, 5, 6], 4))
+
+        if not os.path.exists('output'):
+            os.mkdir('output')
+        filename = os.path.join('output', 'test_walker_tilelist.csv')
+        with open(filename, 'wb') as fp:
+            for row in ['3,1,2', '4,5,6', '2,1,1', '5,9,9', '3,1,3']:
+                fp.write(row + '\n')
+        self.checkShardAndResume(TileListPyramidWalker(pyramid, filename,
+                                                       [4, 5, 6], 2))
+
+    def testUniqueTileList(self):
+        pyramid = Pyramid()
+        if not os.path.exists('output'):
+            os.mkdir('output')
+        csv_filename = os.path.join('output', 'test_walker_unique.csv')
+        zxy_filename = os.path.join('output', 'test_walker_unique.zxy')
+
+        # Overlapping tile list with duplicated rows
+        rows = [(3, 1, 2), (4, 5, 6), (2, 1, 1), (5, 9, 9), (3, 1, 3),
+                (4, 5, 6), (6, 40, 3), (6, 41, 3), (6, 40, 2)]
+        with open(csv_filename, 'wb') as fp:
+            for row in rows * 3:
+                fp.write('%d,%d,%d\n' % row)
+        z, x, y = zip(*(rows * 3))
+        write_tilelist(zxy_filename, z, x, y)
+
+        for levels, stride in [(None, 1), (None, 4), ([4, 5, 7], 2)]:
+            expected = set(index.coord for index in \
+                           TileListPyramidWalker(pyramid, csv_filename,
+                                                 levels, stride).walk())
+            for filename in [csv_filename, zxy_filename]:
+                walker = UniqueTileListWalker(pyramid, filename, levels,
+                                              stride, chunk_size=4)
+                coords = list(index.coord for index in walker.walk())
+                self.assertEqual(len(coords), len(set(coords)))
+                self.assertEqual(set(coords), expected)
+                self.checkShardAndResume(walker)
+
+            walker = UniqueTileListWalker(pyramid, zxy_filename, levels,
+                                          stride, order='hilbert')
+            coords = list(index.coord for index in walker.walk())
+            self.assertEqual(set(coords), expected)
+            # Each level is walked along the curve
+            distances = list((z, tile_coordinate_to_hilbert(z, x, y))
+                             for z, x, y in coords)
+            self.assertEqual(distances, sorted(distances))
+
+    def testMalformedTileList(self):
+        if not os.path.exists('output'):
+            os.mkdir('output')
+        filename = os.path.join('output', 'test_walker_malformed.csv')
+        for bad_row in ['foo,bar,baz', '2,1,1,', '1,2', 'z,x,y', '1,2,3.5',
+                        '1;2;3']:
+            with open(filename, 'wb') as fp:
+                fp.write('3,4,1\n5,2,6\n%s\n4,4,4\n' % bad_row)
+            with self.assertRaises(ValueError):
+                list(read_tilelist(filename))
+        os.remove(filename)
+
+        # Blank lines are fine
+        with open(filename, 'wb') as fp:
+            fp.write('3,4,1\n\n5,2,6\n')
+        z, x, y = next(read_tilelist(filename))
+        self.assertEqual(z.tolist(), [3, 5])
+        self.assertEqual(y.tolist(), [1, 6])
+        os.remove(filename)
+
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
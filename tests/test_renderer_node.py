@@ -6,6 +6,7 @@ Created on Mar 17, 2013
 import os
 import unittest
 import shutil
+import numpy
 from mason.core import Pyramid, Metadata, Tile
 from mason.tilestorage import create_tilestorage
 from mason.renderer.node import *
@@ -38,6 +39,12 @@ def remove(filename):
         os.remove(filename)
 
 
+def read_array(metatile_index, filename):
+    metatile = MetaTile.from_tile_index(metatile_index, read(filename),
+                                        Format.GTIFF)
+    return RasterMetaTile.from_metatile(metatile).array
+
+
 class HillShadingRenderNodeTest(unittest.TestCase):
 
     def testRender(self):
@@ -71,6 +78,27 @@ class HillShadingRenderNodeTest(unittest.TestCase):
         remove('./output/hailey_hillshading2.tif')
         write('./output/hailey_hillshading2.tif', metatile.data)
 
+    def testMatchGDALDEM(self):
+        metatile_index = create_metatile_index(15, 5926, 11962, 2)
+        metatile = create_metatile(metatile_index)
+
+        render_node = HillShadingRenderNode('dummy',
+                                            zfactor=2,
+                                            scale=111120,
+                                            altitude=45,
+                                            azimuth=315)
+        metatile = render_node._render_metatile(metatile_index,
+                                                dict(test=metatile))
+
+        remove('./output/hailey_gdaldem_hillshading.tif')
+        gdal_hillshading('./input/hailey.tif',
+                         './output/hailey_gdaldem_hillshading.tif',
+                         2, 111120, 45, 315)
+        expected = read_array(metatile_index,
+                              './output/hailey_gdaldem_hillshading.tif')
+        difference = numpy.abs(metatile.array.astype(int) - expected)
+        self.assertLessEqual(difference.max(), 1)
+
 
 class ColorReliefRenderNodeTest(unittest.TestCase):
 
@@ -86,6 +114,15 @@ class ColorReliefRenderNodeTest(unittest.TestCase):
         remove('./output/hailey_colorrelief.tif')
         write('./output/hailey_colorrelief.tif', metatile.data)
 
+        remove('./output/hailey_gdaldem_colorrelief.tif')
+        gdal_colorrelief('./input/hailey.tif',
+                         './output/hailey_gdaldem_colorrelief.tif',
+                         color_context)
+        expected = read_array(metatile_index,
+                              './output/hailey_gdaldem_colorrelief.tif')
+        difference = numpy.abs(metatile.array.astype(int) - expected)
+        self.assertLessEqual(difference.max(), 1)
+
 
 class StorageRenderNodeTest(unittest.TestCase):
 
@@ -160,6 +197,41 @@ class RasterRenderNodeTest(unittest.TestCase):
         write('./output/test_dataset.tif', metatile.data)
 
 
+class DummyCartographer(object):
+
+    closed = 0
+
+    def __init__(self, **params):
+        self.params = params
+
+    def close(self):
+        DummyCartographer.closed += 1
+
+
+class CartographerPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        CartographerFactory.CLASS_REGISTRY['dummy'] = DummyCartographer
+        DummyCartographer.closed = 0
+
+    def tearDown(self):
+        del CartographerFactory.CLASS_REGISTRY['dummy']
+
+    def testPool(self):
+        pool = CartographerPool('dummy')
+        first = pool.get(dataset_path=['a.tif', 'b.tif'], zfactor=1)
+        self.assertIs(pool.get(zfactor=1, dataset_path=['a.tif', 'b.tif']),
+                      first)
+        self.assertIsNot(pool.get(dataset_path=['a.tif'], zfactor=1), first)
+        self.assertEqual(len(pool), 2)
+
+        pool.close()
+        self.assertEqual(len(pool), 0)
+        self.assertEqual(DummyCartographer.closed, 2)
+        self.assertIsNot(pool.get(dataset_path=['a.tif', 'b.tif'],
+                                  zfactor=1), first)
+
+
 if __name__ == "__main__":
     # import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
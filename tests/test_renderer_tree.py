@@ -5,8 +5,10 @@ test_renderer_tree
 Created on Mar 16, 2013
 @author: ray
 '''
+import time
+import threading
 import unittest
-from mason.renderer.tree import RenderContext, RenderNode
+from mason.renderer.tree import RenderContext, RenderNode, RenderPool
 
 
 class DummyContext(RenderContext):
@@ -24,6 +26,40 @@ class DummyRenderNode(RenderNode):
         return result
 
 
+class SleepRenderNode(DummyRenderNode):
+
+    def _render_imp(self, context, sources):
+        time.sleep(0.2)
+        self.thread = threading.current_thread().name
+        return DummyRenderNode._render_imp(self, context, sources)
+
+
+class CountRenderNode(SleepRenderNode):
+
+    def __init__(self, name):
+        SleepRenderNode.__init__(self, name)
+        self.rendered = 0
+
+    def _render_imp(self, context, sources):
+        self.rendered += 1
+        return SleepRenderNode._render_imp(self, context, sources)
+
+
+class ReopenRenderNode(DummyRenderNode):
+
+    reopened = 0
+
+    def reopen(self):
+        DummyRenderNode.reopen(self)
+        self.reopened += 1
+
+    closed = 0
+
+    def close(self):
+        DummyRenderNode.close(self)
+        self.closed += 1
+
+
 class TestRenderNode(unittest.TestCase):
 
     def testName(self):
@@ -51,6 +87,81 @@ class TestRenderNode(unittest.TestCase):
 
         context = DummyContext()
         self.assertEqual(root.render(context), 'root:child1:child3&child2')
+        self.assertSetEqual(set(context.timings),
+                            set([('root', 'render'), ('child1', 'render'),
+                                 ('child2', 'render'), ('child3', 'render')]))
+        self.assertTrue(all(t >= 0 for t in context.timings.values()))
+
+    def testConcurrentRender(self):
+        root = DummyRenderNode('root')
+        for name in ('child1', 'child2', 'child3'):
+            child = SleepRenderNode(name)
+            child.add_child(SleepRenderNode(name + 'a'))
+            child.add_child(SleepRenderNode(name + 'b'))
+            root.add_child(child)
+
+        pool = RenderPool(2)
+        try:
+            root.set_pool(pool)
+            started = time.time()
+            result = root.render(DummyContext())
+            elapsed = time.time() - started
+        finally:
+            pool.close()
+
+        self.assertEqual(result, 'root:child1:child1a&child1b&'
+                                 'child2:child2a&child2b&'
+                                 'child3:child3a&child3b')
+        # Nine nodes take 1.8s one by one
+        self.assertLess(elapsed, 1.2)
+        self.assertNotEqual(root._children['child1'].thread,
+                            root._children['child2'].thread)
+
+    def testSharedNode(self):
+        # root -> (hillshade, relief) -> dem
+        dem = CountRenderNode('dem')
+        root = DummyRenderNode('root')
+        for name in ('hillshade', 'relief'):
+            child = DummyRenderNode(name)
+            child.add_child(dem)
+            root.add_child(child)
+
+        for pool in (None, RenderPool(2)):
+            dem.rendered = 0
+            root.set_pool(pool)
+            result = root.render(DummyContext())
+            self.assertEqual(result, 'root:hillshade:dem&relief:dem')
+            self.assertEqual(dem.rendered, 1)
+            if pool is not None:
+                pool.close()
+
+        # Rendered once in each context
+        root.set_pool(None)
+        root.render(DummyContext())
+        root.render(DummyContext())
+        self.assertEqual(dem.rendered, 3)
+
+    def testReopen(self):
+        root = ReopenRenderNode('root')
+        child1 = ReopenRenderNode('child1')
+        child2 = DummyRenderNode('child2')
+        child3 = ReopenRenderNode('child3')
+
+        root.add_child(child1)
+        root.add_child(child2)
+        child2.add_child(child3)
+        # Shared by two parents
+        child1.add_child(child3)
+
+        self.assertEqual(root.nodes(), [root, child1, child3, child2])
+
+        root.reopen_tree()
+        self.assertEqual((root.reopened, child1.reopened, child3.reopened),
+                         (1, 1, 1))
+
+        root.close_tree()
+        self.assertEqual((root.closed, child1.closed, child3.closed),
+                         (1, 1, 1))
 
     def testRepr(self):
         node = DummyRenderNode('dummy')
@@ -0,0 +1,641 @@
+# -*- coding:utf-8 -*-
+'''
+UnitTest for the tile renderer
+
+Created on Oct 18, 2026
+@author: Kotaimen
+'''
+
+import os
+import sys
+import time
+import json
+import Queue
+import socket
+import urllib2
+import logging
+import argparse
+import threading
+import unittest
+import multiprocessing
+import multiprocessing.sharedctypes
+import multiprocessing.util
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+import tilerenderer
+from tilerenderer import (Checkpoint, ExistenceChecker, Journal,
+                          JournalWriter, LevelCosts, Metrics, Scheduler,
+                          Statics, StatusReporter, Supervisor, WorkerTask,
+                          render_worker, skip_completed, write_retry_list,
+                          JOURNAL_STATUS)
+from mason.core import Pyramid, WalkCursor
+
+tilerenderer.logger = logging.getLogger('tilerenderer')
+tilerenderer.logger.addHandler(logging.NullHandler())
+
+
+def create_options(**kwargs):
+    options = argparse.Namespace(config='test.cfg.py',
+                                 levels=[3, 4],
+                                 stride=2,
+                                 envelope=[-180, -85, 180, 85],
+                                 order=None,
+                                 coverage='',
+                                 csv='',
+                                 shard=0,
+                                 shards=1,
+                                 checkpoint='',
+                                 logfile='',
+                                 max_tasks=0,
+                                 max_memory=0)
+    for key, value in kwargs.items():
+        setattr(options, key, value)
+    return options
+
+
+class CrashingRenderer(object):
+
+    """ Renderer crashes the worker process on given MetaTiles, crashes
+    only once on MetaTiles in once """
+
+    def __init__(self, always, once):
+        self.pyramid = Pyramid(levels=range(10))
+        self._always = always
+        self._once = once
+        self._crashed = multiprocessing.sharedctypes.Value('i', 0,
+                                                           lock=False)
+
+    def render_metatile(self, index, timings=None):
+        if index.coord in self._always:
+            os._exit(9)
+        if index.coord in self._once and not self._crashed.value:
+            self._crashed.value = 1
+            os._exit(9)
+        return True
+
+    def reopen(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class BrokenRenderer(CrashingRenderer):
+
+    """ Renderer crashes the worker process before it is ready """
+
+    def __init__(self):
+        CrashingRenderer.__init__(self, [], [])
+
+    def reopen(self):
+        os._exit(1)
+
+
+class TestLevelCosts(unittest.TestCase):
+
+    def setUp(self):
+        if not os.path.exists('output'):
+            os.mkdir('output')
+        self._filename = os.path.join('output', 'test_tilerenderer_costs.json')
+
+    def testEstimate(self):
+        costs = LevelCosts()
+        # Nothing is known yet
+        self.assertEqual(costs.estimate(5), 1.)
+
+        costs.update(3, 1.)
+        costs.update(3, 3.)
+        costs.update(8, 10.)
+        self.assertAlmostEqual(costs.estimate(3), 2.)
+        self.assertAlmostEqual(costs.estimate(8), 10.)
+        # Unknown levels use nearest known level, higher on ties
+        self.assertAlmostEqual(costs.estimate(0), 2.)
+        self.assertAlmostEqual(costs.estimate(5), 2.)
+        self.assertAlmostEqual(costs.estimate(6), 10.)
+        self.assertAlmostEqual(costs.estimate(12), 10.)
+
+    def testDecay(self):
+        costs = LevelCosts()
+        for _i in range(LevelCosts.DECAY_COUNT):
+            costs.update(4, 1.)
+        for _i in range(LevelCosts.DECAY_COUNT):
+            costs.update(4, 3.)
+        # Recent timings weight more than old ones
+        self.assertGreater(costs.estimate(4), 2.2)
+        self.assertLess(costs.estimate(4), 3.)
+
+    def testSave(self):
+        costs = LevelCosts()
+        costs.update(3, 1.)
+        costs.update(7, 4.)
+        costs.save(self._filename)
+
+        loaded = LevelCosts(self._filename)
+        self.assertAlmostEqual(loaded.estimate(3), 1.)
+        self.assertAlmostEqual(loaded.estimate(7), 4.)
+        loaded.update(7, 1.)
+        self.assertAlmostEqual(loaded.estimate(7), 2.5)
+        os.remove(self._filename)
+
+
+class TestScheduler(unittest.TestCase):
+
+    def levels(self, scheduled):
+        return list(z for z, _item in scheduled)
+
+    def testWalk(self):
+        scheduler = Scheduler('walk')
+        scheduled = list(scheduler.schedule([(3, 'ab'), (4, 'cde')],
+                                            size=lambda item: 1))
+        self.assertEqual(scheduled, [(3, 'a'), (3, 'b'), (4, 'c'), (4, 'd'),
+                                     (4, 'e')])
+
+    def testZoom(self):
+        scheduler = Scheduler('zoom')
+        scheduled = list(scheduler.schedule([(3, range(10)),
+                                             (4, range(10)),
+                                             (5, range(10))],
+                                            size=lambda item: 1))
+        self.assertEqual(len(scheduled), 30)
+        # Levels are interleaved, each level gets half the share of the
+        # level below it
+        self.assertEqual(self.levels(scheduled[:7]), [3, 4, 5, 3, 3, 4, 3])
+        self.assertEqual(self.levels(scheduled[:14]).count(3), 8)
+        self.assertEqual(self.levels(scheduled[:14]).count(4), 4)
+        self.assertEqual(self.levels(scheduled[:14]).count(5), 2)
+        # Finished levels leave workers to the other levels
+        self.assertEqual(self.levels(scheduled[-5:]), [5] * 5)
+
+    def testZoomCost(self):
+        costs = LevelCosts()
+        costs.update(3, 4.)
+        costs.update(4, 1.)
+        scheduler = Scheduler('zoom', costs)
+        scheduled = list(scheduler.schedule([(3, range(10)),
+                                             (4, range(10))],
+                                            size=lambda item: 1))
+        # Share is measured in estimated render time
+        self.assertEqual(self.levels(scheduled[:6]), [3, 4, 4, 3, 4, 4])
+
+    def testCost(self):
+        costs = LevelCosts()
+        costs.update(3, 0.1)
+        costs.update(4, 1.)
+        costs.update(5, 2.)
+        scheduler = Scheduler('cost', costs)
+        scheduled = scheduler.schedule([(3, 'abc'), (4, 'def'), (5, 'ghi')],
+                                       size=lambda item: 1)
+        # Each level is pulled once first, then most expensive first
+        self.assertEqual(list(next(scheduled) for _i in range(5)),
+                         [(5, 'g'), (4, 'd'), (3, 'a'), (5, 'h'), (5, 'i')])
+        # Estimates are taken again on every pull
+        for _i in range(10):
+            costs.update(3, 10.)
+        self.assertEqual(list(scheduled), [(3, 'b'), (3, 'c'), (4, 'e'),
+                                           (4, 'f')])
+
+    def testEmpty(self):
+        scheduler = Scheduler('zoom')
+        self.assertEqual(list(scheduler.schedule([])), [])
+        self.assertEqual(list(scheduler.schedule([(3, []), (4, [])])), [])
+
+
+class TestJournal(unittest.TestCase):
+
+    def setUp(self):
+        if not os.path.exists('output'):
+            os.mkdir('output')
+        self._filename = os.path.join('output', 'test_tilerenderer.sqlite')
+        self._pyramid = Pyramid(levels=range(10))
+
+    def tearDown(self):
+        for filename in [self._filename,
+                         self._filename.replace('.sqlite', '.csv')]:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def index(self, z, x, y):
+        return self._pyramid.create_metatile_index(z, x, y, 2)
+
+    def testResumeSkip(self):
+        journal = Journal(self._filename, reset=True)
+        coords = [(3, 0, 0), (3, 2, 0), (3, 4, 0), (4, 0, 2), (4, 2, 2)]
+        journal.record(list(coord + (2, Journal.ISSUED)
+                            for coord in coords))
+        journal.record([(3, 0, 0, 2, Journal.RENDERED),
+                        (3, 2, 0, 2, Journal.SKIPPED),
+                        (3, 4, 0, 2, Journal.FAILED)])
+        # Issuing again never overwrites a finished MetaTile
+        journal.record([(3, 0, 0, 2, Journal.ISSUED)])
+
+        indexes = list(self.index(*coord) for coord in coords)
+        self.assertEqual(journal.completed(indexes),
+                         set([(3, 0, 0), (3, 2, 0)]))
+        self.assertEqual(journal.completed([]), set())
+
+        # Completed MetaTiles are dropped from walked batches
+        batches = [list((index, None) for index in indexes[:2]),
+                   list((index, None) for index in indexes[2:])]
+        skipped = list(skip_completed(batches, journal))
+        self.assertEqual(list(list(index.coord for index, _cursor in batch)
+                              for batch in skipped),
+                         [coords[2:]])
+        journal.close()
+
+        # Reset clears records of previous render
+        journal = Journal(self._filename, reset=True)
+        self.assertEqual(journal.completed(indexes), set())
+        journal.close()
+
+    def testRetryList(self):
+        journal = Journal(self._filename, reset=True)
+        journal.record([(4, 2, 2, 2, Journal.FAILED),
+                        (3, 0, 0, 2, Journal.RENDERED),
+                        (3, 4, 0, 2, Journal.FAILED),
+                        (4, 0, 2, 2, Journal.ISSUED)])
+        filename = self._filename.replace('.sqlite', '.csv')
+        self.assertEqual(write_retry_list(journal, filename), 2)
+        journal.close()
+        with open(filename, 'r') as fp:
+            self.assertEqual(fp.read(), '3,4,0\n4,2,2\n')
+
+    def testJournalWriter(self):
+        Journal(self._filename, reset=True).close()
+        records = multiprocessing.Queue()
+        writer = JournalWriter(self._filename, records)
+        writer.start()
+        records.put((3, 0, 0, 2, JOURNAL_STATUS['rendered']))
+        records.put((3, 2, 0, 2, JOURNAL_STATUS['failed']))
+
+        # Records from a process still on the way when stopping
+        def late():
+            time.sleep(0.2)
+            records.put((3, 4, 0, 2, JOURNAL_STATUS['skipped']))
+        process = multiprocessing.Process(target=late)
+        process.start()
+        writer.stop()
+        process.join()
+
+        journal = Journal(self._filename)
+        self.assertEqual(journal.completed([self.index(3, 0, 0),
+                                            self.index(3, 2, 0),
+                                            self.index(3, 4, 0)]),
+                         set([(3, 0, 0), (3, 4, 0)]))
+        journal.close()
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        if not os.path.exists('output'):
+            os.mkdir('output')
+        self._filename = os.path.join('output', 'test_tilerenderer.json')
+        self._limits = tilerenderer.QUEUE_LIMIT, \
+            tilerenderer.CHECKPOINT_INTERVAL
+        tilerenderer.QUEUE_LIMIT = 4
+        tilerenderer.CHECKPOINT_INTERVAL = 0
+
+    def tearDown(self):
+        tilerenderer.QUEUE_LIMIT, tilerenderer.CHECKPOINT_INTERVAL = \
+            self._limits
+        if os.path.exists(self._filename):
+            os.remove(self._filename)
+
+    def testWalked(self):
+        progress = (WorkerTask * 2)()
+        options = create_options(checkpoint=self._filename)
+        checkpoint = Checkpoint(self._filename, options, progress)
+        self.assertIsNone(checkpoint.load())
+
+        # Task #5 is still being rendered, eg: retried after a crash
+        progress[1].count = 5
+        for count in range(1, 21):
+            checkpoint.walked(count, WalkCursor(0, 1, (3, count)))
+        self.assertEqual(Checkpoint(self._filename, options,
+                                    progress).load(),
+                         WalkCursor(0, 1, (3, 4)))
+
+        # Tasks which may still be in the queue are never finished
+        progress[1].count = 0
+        checkpoint.walked(21, WalkCursor(0, 1, (3, 21)))
+        self.assertEqual(Checkpoint(self._filename, options,
+                                    progress).load(),
+                         WalkCursor(0, 1, (3, 15)))
+
+        # Skipped MetaTiles are finished together with last task
+        checkpoint.walked(21, WalkCursor(0, 1, (3, 22)))
+        for count in range(22, 28):
+            checkpoint.walked(count, WalkCursor(0, 1, (3, count + 1)))
+        self.assertEqual(Checkpoint(self._filename, options,
+                                    progress).load(),
+                         WalkCursor(0, 1, (3, 22)))
+
+    def testOptions(self):
+        progress = (WorkerTask * 2)()
+        checkpoint = Checkpoint(self._filename,
+                                create_options(checkpoint=self._filename),
+                                progress)
+        checkpoint.save(WalkCursor(0, 1, (4, 10)))
+        checkpoint = Checkpoint(self._filename,
+                                create_options(checkpoint=self._filename,
+                                               levels=[3, 4, 5]),
+                                progress)
+        self.assertRaises(RuntimeError, checkpoint.load)
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = Metrics(2)
+        # Started 10 seconds ago
+        self.metrics._started -= 10
+
+    def testRates(self):
+        metrics = self.metrics
+        metrics.update(('total', 3, 16))
+        metrics.update(('total', 4, 64))
+        metrics.update(('walked', 3, 12, 4))
+        timings = {('root', 'render'): 0.4, ('root', 'cache'): 0.1}
+        for n in range(6):
+            metrics.update(('task', n % 2, 3, 2, 'rendered', 0.5, timings))
+        metrics.update(('task', 0, 3, 2, 'failed', 1., {}))
+
+        status = metrics.status()
+        self.assertAlmostEqual(status['elapsed'], 10, 1)
+        self.assertEqual(status['rendered'], 6)
+        self.assertEqual(status['failed'], 1)
+        self.assertEqual(status['skipped'], 0)
+        self.assertIsNone(status['queue'])
+        # Failed MetaTiles count as done but have no tiles
+        self.assertAlmostEqual(status['metatiles_per_second'], 0.7, 2)
+        self.assertAlmostEqual(status['tiles_per_second'], 2.4, 2)
+
+        level = status['levels']['3']
+        self.assertEqual(level['total'], 16)
+        self.assertEqual(level['issued'], 12)
+        self.assertEqual(level['existing'], 4)
+        self.assertEqual(level['rendered'], 6)
+        self.assertAlmostEqual(level['metatiles_per_second'], 0.7, 2)
+        self.assertAlmostEqual(level['tiles_per_second'], 2.4, 2)
+        self.assertAlmostEqual(level['seconds_per_metatile'], 4 / 7., 6)
+        level = status['levels']['4']
+        self.assertEqual(level['total'], 64)
+        self.assertIsNone(level['seconds_per_metatile'])
+
+        # 80 MetaTiles, 4 existing, 7 done at 0.7 per second
+        self.assertAlmostEqual(status['eta'], 69 / 0.7, 0)
+        # 4 seconds busy of 2 workers in 10 seconds
+        self.assertAlmostEqual(status['workers']['utilization'], 0.2, 2)
+        self.assertEqual(status['workers']['count'], 2)
+        self.assertEqual(status['nodes'],
+                         {'root': {'render': 2.4, 'cache': 0.6}})
+
+    def testUnknownTotal(self):
+        metrics = self.metrics
+        metrics.update(('total', 3, 16))
+        # Level 4 is still being counted
+        metrics.update(('walked', 4, 10, 0))
+        metrics.update(('task', 0, 3, 2, 'rendered', 0.5, {}))
+        status = metrics.status()
+        self.assertIsNone(status['eta'])
+        self.assertIsNone(status['levels']['4']['total'])
+
+        # Nothing counted yet
+        self.assertIsNone(Metrics(1).status()['eta'])
+
+    def testFinished(self):
+        metrics = self.metrics
+        metrics.update(('total', 3, 2))
+        metrics.update(('walked', 3, 1, 1))
+        metrics.update(('task', 0, 3, 2, 'rendered', 0.5, {}))
+        self.assertEqual(metrics.status()['eta'], 0)
+        # Rendered more than counted, eg: a crashed MetaTile is retried
+        metrics.update(('task', 0, 3, 2, 'skipped', 0.5, {}))
+        self.assertEqual(metrics.status()['eta'], 0)
+
+    def testRendering(self):
+        queue = Queue.Queue()
+        queue.put(1)
+        progress = multiprocessing.sharedctypes.Array(WorkerTask, 2,
+                                                      lock=False)
+        progress[1].count, progress[1].z, progress[1].x, progress[1].y, \
+            progress[1].stride = 5, 3, 2, 4, 2
+        status = Metrics(2, queue, progress).status()
+        self.assertEqual(status['queue'], 1)
+        self.assertEqual(status['workers']['rendering'], ['3/2/4@2'])
+
+
+class TestStatusReporter(unittest.TestCase):
+
+    def setUp(self):
+        if not os.path.exists('output'):
+            os.mkdir('output')
+        self._filename = os.path.join('output', 'test_tilerenderer.status')
+        if os.path.exists(self._filename):
+            os.remove(self._filename)
+        self.metrics = Metrics(1)
+
+    def tearDown(self):
+        if os.path.exists(self._filename):
+            os.remove(self._filename)
+
+    def testWrite(self):
+        reporter = StatusReporter(self.metrics, Queue.Queue(), self._filename)
+        reporter.write()
+        with open(self._filename) as fp:
+            self.assertEqual(json.load(fp)['rendered'], 0)
+        inode = os.stat(self._filename).st_ino
+
+        # Replaced by renaming a complete file, never written in place
+        self.metrics.update(('task', 0, 3, 2, 'rendered', 0.5, {}))
+        reporter.write()
+        self.assertNotEqual(os.stat(self._filename).st_ino, inode)
+        self.assertFalse(os.path.exists(self._filename + '.tmp'))
+        with open(self._filename) as fp:
+            self.assertEqual(json.load(fp)['rendered'], 1)
+
+    def testServe(self):
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+        sock.close()
+
+        events = Queue.Queue()
+        reporter = StatusReporter(self.metrics, events, self._filename, port)
+        reporter.start()
+        try:
+            events.put(('task', 0, 3, 2, 'rendered', 0.5, {}))
+            deadline = time.time() + 10
+            while self.metrics.status()['rendered'] == 0 and \
+                    time.time() < deadline:
+                time.sleep(0.01)
+
+            for path in ('/', '/status'):
+                response = urllib2.urlopen('http://127.0.0.1:%d%s' %
+                                           (port, path), timeout=10)
+                self.assertEqual(response.info()['Content-Type'],
+                                 'application/json')
+                self.assertEqual(json.load(response)['rendered'], 1)
+            with self.assertRaises(urllib2.HTTPError) as context:
+                urllib2.urlopen('http://127.0.0.1:%d/foo' % port, timeout=10)
+            self.assertEqual(context.exception.code, 404)
+        finally:
+            reporter.stop()
+
+        # Written when stopped
+        with open(self._filename) as fp:
+            self.assertEqual(json.load(fp)['rendered'], 1)
+
+
+class TestExistenceChecker(unittest.TestCase):
+
+    class Renderer(object):
+
+        """ Renderer creates storages finds nothing """
+
+        def __init__(self):
+            self.storages = list()
+            self.creating = 0
+            self.overlapped = False
+
+        def create_storage(self):
+            self.creating += 1
+            self.overlapped |= self.creating > 1
+            time.sleep(0.05)
+            self.creating -= 1
+            storage = argparse.Namespace(closed=False)
+            storage.has_all_multi = lambda groups: list(False for _g in groups)
+            storage.close = lambda: setattr(storage, 'closed', True)
+            self.storages.append(storage)
+            return storage
+
+    def testClose(self):
+        renderer = self.Renderer()
+        pyramid = Pyramid(levels=range(10))
+        batches = list([(pyramid.create_metatile_index(5, x, y, 2), None)]
+                       for x in range(0, 32, 2) for y in range(0, 32, 2))
+        checker = ExistenceChecker(renderer, 4)
+        results = list(checker.imap(batches))
+        self.assertEqual(len(results), len(batches))
+        self.assertTrue(all(existence == [False]
+                            for _batch, existence in results))
+        checker.close()
+
+        # Storage of every thread is created one by one and closed
+        self.assertFalse(renderer.overlapped)
+        self.assertTrue(1 <= len(renderer.storages) <= 4)
+        self.assertTrue(all(storage.closed for storage in renderer.storages))
+
+
+class TestSupervisor(unittest.TestCase):
+
+    def testRequeueOnCrash(self):
+        renderer = CrashingRenderer(always=[(3, 2, 2)], once=[(3, 4, 4)])
+        options = create_options()
+        workers = 2
+        queue = multiprocessing.JoinableQueue()
+        progress = multiprocessing.sharedctypes.Array(WorkerTask, workers,
+                                                      lock=False)
+        statistics = multiprocessing.sharedctypes.Value(Statics, 0, 0, 0)
+        records = multiprocessing.Queue()
+
+        coords = list((3, x, y) for x in range(0, 8, 2)
+                      for y in range(0, 8, 2))
+        for count, (z, x, y) in enumerate(coords, 1):
+            queue.put((count, z, x, y, 2))
+
+        supervisor = Supervisor(render_worker,
+                                list((statistics, w, options, renderer)
+                                     for w in range(workers)),
+                                queue, progress, statistics, records)
+        supervisor.start()
+
+        finished = threading.Event()
+        joiner = threading.Thread(target=lambda: (queue.join(),
+                                                  finished.set()))
+        joiner.daemon = True
+        joiner.start()
+        deadline = time.time() + 60
+        while not finished.wait(0.1) and time.time() < deadline:
+            supervisor.check()
+        self.assertTrue(finished.is_set())
+        supervisor.stop()
+        self.assertFalse(supervisor.running)
+
+        # Crashed once is rendered again, always crashing is given up
+        self.assertEqual(statistics.rendered, len(coords) - 1)
+        self.assertEqual(statistics.failed, 1)
+        self.assertTrue(all(task.count == 0 for task in progress))
+
+        # Results of crashed workers are never lost
+        statuses = dict()
+        while len(statuses) < len(coords):
+            z, x, y, _stride, status = records.get(timeout=10)
+            statuses[(z, x, y)] = status
+        self.assertEqual(statuses.pop((3, 2, 2)), Journal.FAILED)
+        self.assertEqual(set(statuses.values()), set([Journal.RENDERED]))
+
+    def testGiveUpRespawn(self):
+        delay, tilerenderer.RESPAWN_DELAY = tilerenderer.RESPAWN_DELAY, 0.05
+        try:
+            queue = multiprocessing.JoinableQueue()
+            progress = multiprocessing.sharedctypes.Array(WorkerTask, 1,
+                                                          lock=False)
+            statistics = multiprocessing.sharedctypes.Value(Statics, 0, 0, 0)
+            supervisor = Supervisor(render_worker,
+                                    [(statistics, 0, create_options(),
+                                      BrokenRenderer())],
+                                    queue, progress, statistics)
+            supervisor.start()
+
+            started = time.time()
+            deadline = started + 60
+            with self.assertRaises(tilerenderer.WorkerStartError):
+                while time.time() < deadline:
+                    supervisor.check()
+                    time.sleep(0.01)
+            # Started again after doubling delays, 0 + 1 + 2 + 4 + 8
+            self.assertGreaterEqual(time.time() - started, 15 * 0.05)
+            self.assertFalse(supervisor.running)
+            supervisor.stop(1)
+        finally:
+            tilerenderer.RESPAWN_DELAY = delay
+
+
+class TestLogger(unittest.TestCase):
+
+    def testForkWithLockHeld(self):
+        logger = logging.getLogger('test_tilerenderer.fork')
+        logger.addHandler(logging.StreamHandler(open(os.devnull, 'w')))
+        multiprocessing.util.register_after_fork(logger,
+                                                 tilerenderer.reset_logger)
+        handler = logger.handlers[0]
+
+        # Another thread is logging when the child is forked
+        locked, release = threading.Event(), threading.Event()
+
+        def hold():
+            with handler.lock:
+                locked.set()
+                release.wait()
+
+        holder = threading.Thread(target=hold)
+        holder.start()
+        locked.wait()
+        try:
+            child = multiprocessing.Process(target=logger.warning,
+                                            args=('forked',))
+            child.start()
+            child.join(10)
+            self.assertEqual(child.exitcode, 0)
+        finally:
+            if child.is_alive():
+                child.terminate()
+            release.set()
+            holder.join()
+
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
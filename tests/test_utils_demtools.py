@@ -0,0 +1,94 @@
+# -*- coding:utf-8 -*-
+'''
+UnitTest for in-process DEM tools
+
+Created on Oct 18, 2026
+@author: Kotaimen
+'''
+
+import os
+import unittest
+
+import numpy
+
+from mason.utils.demtools import hillshading, ColorPalette
+
+
+class TestHillShading(unittest.TestCase):
+
+    def testFlat(self):
+        shade = hillshading(numpy.zeros((4, 4)), 10, -10,
+                            altitude=45, azimuth=315)
+        # 1 + 254 * sin(45)
+        self.assertTrue(numpy.all(shade == 180))
+
+    def testLight(self):
+        # Rises to south east, facing the light from north west
+        y, x = numpy.mgrid[0:5, 0:5]
+        elevation = (x + y) * 10.
+        lit = hillshading(elevation, 10, -10, azimuth=315)
+        dark = hillshading(elevation, 10, -10, azimuth=135)
+        self.assertTrue(numpy.all(lit > 180))
+        self.assertTrue(numpy.all(dark == 1))
+        # Edges are extrapolated, not clamped
+        self.assertEqual(len(numpy.unique(lit)), 1)
+
+    def testNoData(self):
+        elevation = numpy.zeros((3, 3))
+        elevation[0, 0] = -32768
+        shade = hillshading(elevation, 10, -10, nodata=-32768)
+        self.assertEqual(shade[0, 0], 0)
+        self.assertTrue(numpy.all(shade.ravel()[1:] == 180))
+
+
+class TestColorPalette(unittest.TestCase):
+
+    def setUp(self):
+        self._filename = './output/test_demtools_palette.txt'
+        with open(self._filename, 'w') as fp:
+            fp.write('''# test palette
+            nv 0 0 0 0
+            100% white
+            1000, 200:200:200
+            0    0 100 0
+            ''')
+
+    def tearDown(self):
+        os.remove(self._filename)
+
+    def testColorize(self):
+        palette = ColorPalette(self._filename)
+        elevation = numpy.array([[-10, 0, 500], [1000, 2000, -32768]],
+                                dtype=numpy.int16)
+        rgba = palette.colorize(elevation, nodata=-32768)
+        self.assertEqual(rgba.shape, (4, 2, 3))
+        self.assertEqual(rgba.dtype, numpy.uint8)
+        self.assertEqual(tuple(rgba[:, 0, 0]), (0, 100, 0, 255))
+        self.assertEqual(tuple(rgba[:, 0, 1]), (0, 100, 0, 255))
+        self.assertEqual(tuple(rgba[:, 0, 2]), (100, 150, 100, 255))
+        self.assertEqual(tuple(rgba[:, 1, 0]), (200, 200, 200, 255))
+        # 100% is the maximum valid elevation
+        self.assertEqual(tuple(rgba[:, 1, 1]), (255, 255, 255, 255))
+        self.assertEqual(tuple(rgba[:, 1, 2]), (0, 0, 0, 0))
+
+        # Same result without lookup table
+        floats = palette.colorize(elevation.astype(numpy.float32),
+                                  nodata=-32768)
+        self.assertTrue(numpy.array_equal(rgba, floats))
+
+    def testWideRange(self):
+        palette = ColorPalette(self._filename)
+        # Range of the DEM overflows int16
+        elevation = numpy.array([[-20000, 0, 500], [20000, 32767, -32768]],
+                                dtype=numpy.int16)
+        rgba = palette.colorize(elevation)
+        floats = palette.colorize(elevation.astype(numpy.float64))
+        self.assertTrue(numpy.array_equal(rgba, floats))
+        self.assertEqual(tuple(rgba[:, 0, 2]), (100, 150, 100, 255))
+        self.assertEqual(tuple(rgba[:, 1, 1]), (255, 255, 255, 255))
+        self.assertEqual(tuple(rgba[:, 1, 2]), (0, 100, 0, 255))
+
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,121 @@
+# -*- coding:utf-8 -*-
+'''
+UnitTest for lease based work distribution
+
+Created on Oct 18, 2026
+@author: Kotaimen
+'''
+
+import time
+import unittest
+import threading
+import multiprocessing
+
+from mason.utils import LeaseCoordinator, LeaseClient
+
+
+def consume(address, results, number):
+    client = LeaseClient(address, worker='worker#%d' % number,
+                         retry_interval=0.1)
+    for lease, tasks in client.leases():
+        for task in tasks:
+            results.put(task)
+            client.renew(lease)
+        client.complete(lease, rendered=len(tasks))
+
+
+class TestLease(unittest.TestCase):
+
+    def setUp(self):
+        self.coordinator = None
+
+    def tearDown(self):
+        if self.coordinator is not None:
+            self.coordinator.close()
+
+    def start(self, tasks, **kwargs):
+        self.coordinator = LeaseCoordinator(tasks,
+                                            address=('127.0.0.1', 0),
+                                            **kwargs)
+        self.coordinator.start()
+        return self.coordinator.address
+
+    def run_workers(self, address, workers):
+        results = multiprocessing.Queue()
+        processes = list(multiprocessing.Process(target=consume,
+                                                 args=(address, results, n))
+                         for n in range(workers))
+        for process in processes:
+            process.start()
+        self.assertTrue(self.coordinator.join(timeout=30))
+        for process in processes:
+            process.join(10)
+        consumed = list()
+        while not results.empty():
+            consumed.append(results.get())
+        return consumed
+
+    def testLeasing(self):
+        address = self.start(xrange(100), lease_size=7)
+        consumed = self.run_workers(address, 3)
+
+        self.assertEqual(sorted(consumed), range(100))
+        self.assertEqual(self.coordinator.statistics, dict(rendered=100))
+        self.assertEqual(sum(w['leases'] for w in \
+                             self.coordinator.workers.values()), 15)
+        self.assertEqual(self.coordinator.requeued, 0)
+        self.assertTrue(LeaseClient(address).status()['done'])
+
+    def testLostLease(self):
+        address = self.start(xrange(20), lease_size=5, lease_timeout=0.5)
+
+        # A worker leases a batch then vanishes
+        client = LeaseClient(address, worker='lost')
+        lease, tasks = client.lease()
+        self.assertEqual(tasks, range(5))
+
+        consumed = self.run_workers(address, 2)
+        self.assertEqual(sorted(consumed), range(20))
+        self.assertEqual(self.coordinator.requeued, 1)
+        self.assertEqual(self.coordinator.statistics, dict(rendered=20))
+        # Forgotten once the batch is done by another worker
+        self.assertEqual(client.status()['lost'], 0)
+
+        # Late completion of the lost lease is rejected
+        self.assertFalse(client.renew(lease))
+        self.assertFalse(client.complete(lease, rendered=5))
+        self.assertEqual(self.coordinator.statistics, dict(rendered=20))
+
+    def testSlowTasks(self):
+        def slow_tasks():
+            for task in range(10):
+                if task == 5:
+                    # eg: a long walk through existing MetaTiles
+                    time.sleep(3)
+                yield task
+
+        address = self.start(slow_tasks(), lease_size=5)
+        client = LeaseClient(address, worker='slow')
+        lease, tasks = client.lease()
+        self.assertEqual(tasks, range(5))
+
+        # Another worker is waiting for the slow iterable
+        waiting = threading.Thread(target=self.coordinator.lease,
+                                   args=('waiting',))
+        waiting.start()
+        time.sleep(0.2)
+        started = time.time()
+        self.assertTrue(client.renew(lease))
+        self.assertTrue(client.complete(lease, rendered=5))
+        self.assertLess(time.time() - started, 1)
+        self.assertFalse(client.status()['done'])
+        waiting.join()
+
+        consumed = self.run_workers(address, 1)
+        self.assertEqual(sorted(consumed), range(5, 10))
+        self.assertEqual(self.coordinator.statistics, dict(rendered=10))
+
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -4,7 +4,10 @@
 Parallel Tile Renderer
 
 Using process based producer-consumer model thus can be run efficiently
-on very large node.  (Distributed rendering not included, yet, sorry.)
+on very large node.  Several nodes can render one pyramid together, run
+one coordinator with "--coordinator" which owns the walk, and workers
+on other nodes with "--worker", MetaTiles are leased to workers in
+batches over HTTP.
 
 
 Created on May 17, 2012
@@ -14,11 +17,23 @@ Created on May 17, 2012
 import argparse
 import multiprocessing
 import multiprocessing.sharedctypes
+import multiprocessing.pool
+import multiprocessing.util
+import threading
 import logging
 import os
+import sys
 import ctypes
+import resource
 import time
 import re
+import json
+import socket
+import sqlite3
+import urllib2
+import Queue
+import collections
+import BaseHTTPServer
 
 from mason import (__version__ as VERSION,
                    __author__ as AUTHOR,
@@ -26,68 +41,849 @@ from mason import (__version__ as VERSION,
 from mason.utils import create_temp_filename
 
 # from mason import create_mason_from_config
-from mason.core import Envelope, PyramidWalker, TileListPyramidWalker
-from mason.utils import Timer, human_size
+from mason.core import (Envelope, PyramidWalker, UniqueTileListWalker,
+                        CoverageWalker, WalkCursor)
+from mason.utils import Timer, human_size, LeaseCoordinator, LeaseClient
 
 CPU_COUNT = multiprocessing.cpu_count()
 QUEUE_LIMIT = 1024
+CHECKPOINT_INTERVAL = 60
+CHECK_BATCH_SIZE = 64
+LEASE_RETRY_INTERVAL = 1
+MAX_LEVELS = 32
+MAX_CRASHES = 2
+MAX_RESPAWNS = 5
+RESPAWN_DELAY = 1
+STATUS_INTERVAL = 5
+RECENT_WINDOW = 60
+RECYCLE_EXITCODE = 3
 
 # Global logger object, init in main()
 logger = None
 
 
+
 class Statics(ctypes.Structure):
 
     _fields_ = [('rendered', ctypes.c_longlong),
                 ('skipped', ctypes.c_longlong),
                 ('failed', ctypes.c_longlong)]
 
+
+class WorkerTask(ctypes.Structure):
+
+    _fields_ = [('count', ctypes.c_longlong),
+                ('z', ctypes.c_longlong),
+                ('x', ctypes.c_longlong),
+                ('y', ctypes.c_longlong),
+                ('stride', ctypes.c_longlong)]
+
+
+def resident_memory():
+    """ Resident set size of current process in bytes """
+    try:
+        with open('/proc/self/statm', 'r') as fp:
+            return int(fp.read().split()[1]) * resource.getpagesize()
+    except IOError:
+        # Not linux, peak resident size is the best we can get
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == 'darwin' else rss * 1024
+
 #===============================================================================
 # Producer
 #===============================================================================
 
 
-def envelope_spawner(queue, statistics, options):
-    renderer, options = verify_config(options)
-    walker = PyramidWalker(renderer.pyramid,
-                           levels=options.levels,
-                           stride=options.stride,
-                           envelope=options.envelope)
+def create_envelope_walker(renderer, options):
+    if options.coverage:
+        return CoverageWalker(renderer.pyramid,
+                              options.coverage,
+                              levels=options.levels,
+                              stride=options.stride,
+                              envelope=options.envelope)
+    else:
+        return PyramidWalker(renderer.pyramid,
+                             levels=options.levels,
+                             stride=options.stride,
+                             envelope=options.envelope,
+                             order=options.order)
+
+
+class Checkpoint(object):
+
+    """ Periodically saves cursor of finished part of the walk
+
+    Workers render tasks out of order, a task is known to be finished
+    when it is neither in the queue nor being rendered by any worker,
+    progress is a shared array of WorkerTask each worker is rendering.
+    The Supervisor keeps a task in progress until it is finished, also
+    while it is retried after crashing a worker.
+    """
+
+    def __init__(self, filename, options, progress):
+        self._filename = filename
+        self._progress = progress
+        self._workers = len(progress)
+        # Checkpoint can only be resumed using same options
+        self._options = dict(config=options.config,
+                             levels=list(options.levels),
+                             stride=options.stride,
+                             envelope=list(options.envelope),
+                             order=options.order,
+                             coverage=options.coverage,
+                             csv=options.csv,
+                             shard=options.shard,
+                             shards=options.shards)
+        # (task number, cursor after the task) not known to be finished
+        self._pending = collections.deque()
+        self._last_save = time.time()
+
+    def load(self):
+        if not self._filename or not os.path.exists(self._filename):
+            return None
+        with open(self._filename, 'r') as fp:
+            checkpoint = json.load(fp)
+        if checkpoint['options'] != self._options:
+            raise RuntimeError('Checkpoint "%s" is created using different '
+                               'options' % self._filename)
+        return WalkCursor.from_dict(checkpoint['cursor'])
+
+    def walked(self, count, cursor):
+        """ Called after every walked metatile, count is number of last
+        task put into the queue """
+        if not self._filename:
+            return
+        if self._pending and self._pending[-1][0] == count:
+            # Skipped metatile, finished together with last task
+            self._pending[-1] = (count, cursor)
+        else:
+            self._pending.append((count, cursor))
+
+        if time.time() - self._last_save < CHECKPOINT_INTERVAL:
+            return
+        # Tasks in the queue are always newer than this
+        finished = count - QUEUE_LIMIT - self._workers
+        rendering = list(task.count for task in self._progress \
+                         if task.count > 0)
+        if rendering:
+            finished = min(finished, min(rendering) - 1)
+        cursor = None
+        while self._pending and self._pending[0][0] <= finished:
+            cursor = self._pending.popleft()[1]
+        if cursor is not None:
+            self.save(cursor)
+
+    def save(self, cursor):
+        if not self._filename or cursor is None:
+            return
+        temp_filename = self._filename + '.tmp'
+        with open(temp_filename, 'w') as fp:
+            json.dump(dict(options=self._options,
+                           cursor=cursor.make_dict()), fp)
+        os.rename(temp_filename, self._filename)
+        self._last_save = time.time()
+        logger.info('Checkpoint saved at %r', cursor)
+
+
+class Journal(object):
+
+    """ Durable record of issued, rendered and failed MetaTiles
+
+    Stored in a SQLite database, one row per MetaTile keyed by its
+    coordinate, so a resumed render can skip completed MetaTiles without
+    checking the storage.  Records from all processes are written by one
+    JournalWriter thread in the monitor, other processes only read.
+    """
+
+    ISSUED = 0
+    RENDERED = 1
+    SKIPPED = 2
+    FAILED = 3
+
+    def __init__(self, filename, reset=False):
+        self._conn = sqlite3.connect(filename, timeout=60)
+        with self._conn:
+            self._conn.execute('CREATE TABLE IF NOT EXISTS metatiles ('
+                               'z INTEGER NOT NULL, '
+                               'x INTEGER NOT NULL, '
+                               'y INTEGER NOT NULL, '
+                               'stride INTEGER NOT NULL, '
+                               'status INTEGER NOT NULL, '
+                               'time REAL NOT NULL, '
+                               'PRIMARY KEY (z, x, y))')
+            if reset:
+                self._conn.execute('DELETE FROM metatiles')
+        # MetaTiles looked up by completed(), private to the connection
+        self._conn.execute('CREATE TEMP TABLE lookup ('
+                           'z INTEGER NOT NULL, '
+                           'x INTEGER NOT NULL, '
+                           'y INTEGER NOT NULL)')
+
+    def record(self, records):
+        """ Write a list of (z, x, y, stride, status) in one transaction,
+        ISSUED never overwrites an existing status """
+        now = time.time()
+        issued = list(r + (now,) for r in records if r[4] == self.ISSUED)
+        finished = list(r + (now,) for r in records if r[4] != self.ISSUED)
+        with self._conn:
+            self._conn.executemany('INSERT OR IGNORE INTO metatiles '
+                                   'VALUES (?, ?, ?, ?, ?, ?)', issued)
+            self._conn.executemany('INSERT OR REPLACE INTO metatiles '
+                                   'VALUES (?, ?, ?, ?, ?, ?)', finished)
+
+    def completed(self, indexes):
+        """ Returns set of (z, x, y) of given MetaTiles which are completed,
+        looked up in one query joining a temporary table """
+        with self._conn:
+            self._conn.execute('DELETE FROM lookup')
+            self._conn.executemany('INSERT INTO lookup VALUES (?, ?, ?)',
+                                   (index.coord for index in indexes))
+            rows = self._conn.execute('SELECT m.z, m.x, m.y '
+                                      'FROM lookup AS l JOIN metatiles AS m '
+                                      'ON m.z=l.z AND m.x=l.x AND m.y=l.y '
+                                      'WHERE m.status IN (?, ?)',
+                                      (self.RENDERED, self.SKIPPED))
+            return set(rows)
+
+    def failed(self):
+        """ Iterate (z, x, y) of failed MetaTiles """
+        return self._conn.execute('SELECT z, x, y FROM metatiles '
+                                  'WHERE status=? ORDER BY z, x, y',
+                                  (self.FAILED,))
+
+    def close(self):
+        self._conn.close()
+
+
+class JournalWriter(threading.Thread):
+
+    """ Write journal records sent by other processes through a Queue,
+    records arrived together are committed in one transaction
+
+    stop() sends None as sentinel, records put before the sentinel by
+    other processes may still be on the way, so the queue is drained
+    until it stays empty for DRAIN_TIMEOUT seconds.  A record put by a
+    killed process may never arrive, which never blocks stop().
+    """
+
+    DRAIN_TIMEOUT = 1
+
+    def __init__(self, filename, records):
+        threading.Thread.__init__(self, name='journal')
+        self.daemon = True
+        self._filename = filename
+        self._records = records
+        self._flush = True
+
+    def run(self):
+        journal = Journal(self._filename)
+        try:
+            timeout = None
+            while True:
+                try:
+                    records = [self._records.get(timeout=timeout)]
+                except Queue.Empty:
+                    return
+                while len(records) < 4096:
+                    try:
+                        records.append(self._records.get_nowait())
+                    except Queue.Empty:
+                        break
+                stop = None in records
+                if stop:
+                    records = list(r for r in records if r is not None)
+                    timeout = self.DRAIN_TIMEOUT
+                journal.record(records)
+                if stop and not self._flush:
+                    return
+        finally:
+            journal.close()
+
+    def stop(self, flush=True):
+        """ Stop the writer, wait records still arriving are written if
+        flush is True """
+        self._flush = flush
+        self._records.put(None)
+        self.join()
+
+
+# Journal status of render_task() results
+JOURNAL_STATUS = dict(rendered=Journal.RENDERED,
+                      skipped=Journal.SKIPPED,
+                      failed=Journal.FAILED)
+
+
+def write_retry_list(journal, filename):
+    """ Write failed MetaTiles as a CSV tile list for "--csv", returns
+    number of MetaTiles written """
     count = 0
-    for index in walker.walk():
-        if not options.overwrite and renderer.has_metatile(index):
-            logger.info('Skipping %r...', index)
-            continue
-        count += 1
-        queue.put((count, index.z, index.x, index.y, index.stride))
+    with open(filename, 'w') as fp:
+        for z, x, y in journal.failed():
+            fp.write('%d,%d,%d\n' % (z, x, y))
+            count += 1
+    return count
+
+
+class LevelCosts(object):
+
+    """ Average render time of a MetaTile in each level
+
+    Learned from timings reported by workers and shared between
+    processes, can be saved to a JSON file so next run starts with
+    estimates of previous runs.  Old timings decay so the average
+    follows current render speed.
+    """
+
+    DECAY_COUNT = 1000
+
+    def __init__(self, filename=''):
+        self._lock = multiprocessing.Lock()
+        self._times = multiprocessing.sharedctypes.Array(ctypes.c_double,
+                                                         MAX_LEVELS,
+                                                         lock=False)
+        self._counts = multiprocessing.sharedctypes.Array(ctypes.c_double,
+                                                          MAX_LEVELS,
+                                                          lock=False)
+        if filename and os.path.exists(filename):
+            with open(filename, 'r') as fp:
+                for z, (seconds, count) in json.load(fp).items():
+                    self._times[int(z)] = seconds * count
+                    self._counts[int(z)] = count
+
+    def update(self, z, seconds):
+        with self._lock:
+            if self._counts[z] >= self.DECAY_COUNT:
+                self._times[z] /= 2
+                self._counts[z] /= 2
+            self._times[z] += seconds
+            self._counts[z] += 1
+
+    def estimate(self, z):
+        """ Estimated seconds to render a MetaTile in level z, unknown
+        levels use estimate of nearest known level """
+        known = list(l for l in range(MAX_LEVELS) if self._counts[l] > 0)
+        if not known:
+            return 1.
+        nearest = min(known, key=lambda l: (abs(l - z), -l))
+        return self._times[nearest] / self._counts[nearest]
+
+    def save(self, filename):
+        costs = dict((z, (self._times[z] / self._counts[z], self._counts[z]))
+                     for z in range(MAX_LEVELS) if self._counts[z] > 0)
+        with open(filename, 'w') as fp:
+            json.dump(costs, fp, indent=2)
+
+
+class Scheduler(object):
+
+    """ Interleave walks of levels by priority
+
+    Each level is walked by its own stream, next batch of MetaTiles is
+    pulled from the stream chosen by priority:
+
+    - walk: levels one after another in walk order
+    - zoom: all levels side by side, each level gets half the share of
+      estimated render time of the level below it, so overview levels
+      finish early while expensive levels are started from the beginning
+    - cost: most expensive level first according to LevelCosts, so cheap
+      MetaTiles are left to fill idle workers near the end, each level
+      is pulled once first so all levels are timed early
+
+    Estimates are taken again on every pull, so priorities follow the
+    timings learned by workers.
+    """
+
+    def __init__(self, priority, costs=None):
+        assert priority in ('walk', 'zoom', 'cost')
+        assert priority != 'cost' or costs is not None
+        self._priority = priority
+        self._costs = costs
+
+    def _estimate(self, z):
+        if self._costs is None:
+            return 1.
+        return self._costs.estimate(z)
+
+    def schedule(self, streams, size=len):
+        """ Iterate (z, item) of items pulled from a list of (z, stream),
+        size(item) is number of MetaTiles in an item """
+        streams = list((z, iter(stream)) for z, stream in streams)
+        if not streams:
+            return
+        lowest = min(z for z, _stream in streams)
+        served = collections.Counter()
+        pulled = set()
+        while streams:
+            if self._priority == 'walk':
+                chosen = streams[0]
+            elif self._priority == 'zoom':
+                chosen = min(streams, key=lambda s: (served[s[0]], s[0]))
+            else:
+                chosen = max(streams, key=lambda s: (s[0] not in pulled,
+                                                     self._estimate(s[0]),
+                                                     -s[0]))
+            z, stream = chosen
+            try:
+                item = next(stream)
+            except StopIteration:
+                streams.remove(chosen)
+                continue
+            pulled.add(z)
+            if self._priority == 'zoom':
+                served[z] += self._estimate(z) * size(item) * \
+                    2 ** (z - lowest)
+            yield z, item
+
+
+class Metrics(object):
+
+    """ Live statistics of the render
+
+    Updated by events sent from the spawner and workers:
+
+    - ('total', z, count): number of MetaTiles in level z
+    - ('walked', z, issued, existing): MetaTiles walked in level z
+    - ('task', worker, z, stride, status, seconds, timings): a MetaTile
+      is rendered by a worker, timings are seconds spent in each
+      (node name, stage)
+    """
+
+    def __init__(self, workers, queue=None, progress=None):
+        self._workers = workers
+        self._queue = queue
+        self._progress = progress
+        self._started = time.time()
+        self._levels = collections.defaultdict(collections.Counter)
+        self._busy = collections.Counter()
+        self._nodes = collections.Counter()
+        # (time, tiles) of tasks finished recently
+        self._recent = collections.deque()
+        self._lock = threading.Lock()
+
+    def update(self, event):
+        with self._lock:
+            if event[0] == 'total':
+                _kind, z, count = event
+                self._levels[z]['total'] += count
+            elif event[0] == 'walked':
+                _kind, z, issued, existing = event
+                self._levels[z]['issued'] += issued
+                self._levels[z]['existing'] += existing
+            elif event[0] == 'task':
+                _kind, worker, z, stride, status, seconds, timings = event
+                tiles = stride * stride if status == 'rendered' else 0
+                level = self._levels[z]
+                level[status] += 1
+                level['tiles'] += tiles
+                level['seconds'] += seconds
+                self._busy[worker] += seconds
+                self._nodes.update(timings)
+                now = time.time()
+                self._recent.append((now, tiles))
+                while self._recent[0][0] < now - RECENT_WINDOW:
+                    self._recent.popleft()
+
+    def status(self):
+        with self._lock:
+            now = time.time()
+            elapsed = max(now - self._started, 1e-6)
+            window = min(elapsed, RECENT_WINDOW)
+            recent = list(t for t in self._recent if t[0] >= now - window)
+
+            levels = dict()
+            totals = collections.Counter()
+            for z, level in sorted(self._levels.items()):
+                done = level['rendered'] + level['skipped'] + level['failed']
+                levels[str(z)] = dict(
+                    total=level['total'] if 'total' in level else None,
+                    issued=level['issued'],
+                    existing=level['existing'],
+                    rendered=level['rendered'],
+                    skipped=level['skipped'],
+                    failed=level['failed'],
+                    metatiles_per_second=done / elapsed,
+                    tiles_per_second=level['tiles'] / elapsed,
+                    seconds_per_metatile=level['seconds'] / done if done else None)
+                totals.update(level)
+                totals['done'] += done
+
+            # Remaining MetaTiles are known only when all levels are counted
+            rate = len(recent) / window
+            eta = None
+            if self._levels and all('total' in level for level in \
+                                    self._levels.values()):
+                remaining = totals['total'] - totals['existing'] - \
+                    totals['done']
+                if remaining <= 0:
+                    eta = 0
+                elif rate > 0:
+                    eta = remaining / rate
+
+            nodes = collections.defaultdict(dict)
+            for (name, stage), seconds in self._nodes.items():
+                nodes[name][stage] = seconds
+
+            rendering = list()
+            if self._progress is not None:
+                rendering = list('%d/%d/%d@%d' % (task.z, task.x, task.y,
+                                                  task.stride)
+                                 for task in self._progress if task.count > 0)
+
+            return dict(elapsed=elapsed,
+                        eta=eta,
+                        queue=self._queue.qsize() if self._queue else None,
+                        metatiles_per_second=rate,
+                        tiles_per_second=sum(t for _, t in recent) / window,
+                        rendered=totals['rendered'],
+                        skipped=totals['skipped'],
+                        failed=totals['failed'],
+                        workers=dict(count=self._workers,
+                                     utilization=sum(self._busy.values()) / \
+                                        (elapsed * self._workers),
+                                     rendering=rendering),
+                        levels=levels,
+                        nodes=nodes)
+
+
+class StatusReporter(threading.Thread):
+
+    """ Collect metric events sent through a queue, periodically write
+    statistics to a JSON file and optionally serve them over HTTP """
+
+    def __init__(self, metrics, events, filename='', port=0):
+        threading.Thread.__init__(self, name='status')
+        self.daemon = True
+        self._metrics = metrics
+        self._events = events
+        self._filename = filename
+        self._server = None
+        if port:
+            self._server = BaseHTTPServer.HTTPServer(('127.0.0.1', port),
+                                                     _StatusRequestHandler)
+            self._server.metrics = metrics
+
+    def run(self):
+        if self._server is not None:
+            server = threading.Thread(target=self._server.serve_forever,
+                                      name='status-server')
+            server.daemon = True
+            server.start()
+
+        last_write = time.time()
+        while True:
+            try:
+                event = self._events.get(timeout=STATUS_INTERVAL)
+            except Queue.Empty:
+                event = False
+            if event is None:
+                break
+            if event:
+                self._metrics.update(event)
+            if time.time() - last_write >= STATUS_INTERVAL:
+                self.write()
+                last_write = time.time()
+        self.write()
+
+    def write(self):
+        if not self._filename:
+            return
+        temp_filename = self._filename + '.tmp'
+        with open(temp_filename, 'w') as fp:
+            json.dump(self._metrics.status(), fp, indent=2, sort_keys=True)
+        os.rename(temp_filename, self._filename)
 
+    def stop(self):
+        self._events.put(None)
+        self.join()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+class _StatusRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path not in ('/', '/status'):
+            self.send_error(404)
+            return
+        data = json.dumps(self.server.metrics.status(), indent=2,
+                          sort_keys=True)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ExistenceChecker(object):
+
+    """ Check existence of MetaTiles in batches on a thread pool
+
+    Each thread creates its own storage instance since storage
+    connections are not thread safe, they are created one at a time as
+    constructors may write metadata or create databases, and closed by
+    close().
+    Checks run ahead of the producer by a few batches, so the queue is
+    still fed while the producer is blocked by a full queue.
+    """
+
+    def __init__(self, renderer, threads):
+        self._renderer = renderer
+        self._local = threading.local()
+        self._storages = list()
+        self._lock = threading.Lock()
+        self._pool = multiprocessing.pool.ThreadPool(threads)
+        self._window = threads * 2
+
+    def _check(self, batch):
+        storage = getattr(self._local, 'storage', None)
+        if storage is None:
+            with self._lock:
+                storage = self._renderer.create_storage()
+                self._storages.append(storage)
+            self._local.storage = storage
+        return storage.has_all_multi(list(index.fission()
+                                          for index, _cursor in batch))
+
+    def imap(self, batches):
+        """ Iterate (batch, existence) of each batch in order """
+        # Not using ThreadPool.imap() since it consumes the whole walk
+        pending = collections.deque()
+        for batch in batches:
+            pending.append((batch, self._pool.apply_async(self._check,
+                                                          (batch,))))
+            if len(pending) >= self._window:
+                batch, result = pending.popleft()
+                yield batch, result.get()
+        while pending:
+            batch, result = pending.popleft()
+            yield batch, result.get()
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+        # Threads are gone, close their storages here
+        with self._lock:
+            storages, self._storages = self._storages, list()
+        for storage in storages:
+            storage.close()
+
+
+def walk_batches(walker, options, cursor=None, level=None):
+    """ Iterate lists of (metatile index, cursor after it), only walks
+    given level if level is not None, cursor is always None then """
+    if level is None:
+        indexes = walker.walk(options.shard, options.shards, cursor)
+    else:
+        indexes = walker.walk_level(level, options.shard, options.shards)
+    batch = list()
+    for index in indexes:
+        batch.append((index, walker.cursor if level is None else None))
+        if len(batch) >= CHECK_BATCH_SIZE:
+            yield batch
+            batch = list()
+    if batch:
+        yield batch
+
+
+def skip_completed(batches, journal, events=None):
+    """ Drop MetaTiles completed according to the journal """
+    for batch in batches:
+        completed = journal.completed(index for index, _cursor in batch)
+        if completed:
+            logger.info('Skipping %d journaled MetaTiles...', len(completed))
+            batch = list(entry for entry in batch \
+                         if entry[0].coord not in completed)
+            if events is not None:
+                levels = collections.Counter(z for z, _x, _y in completed)
+                for z, n in levels.items():
+                    events.put(('walked', z, 0, n))
+        if batch:
+            yield batch
+
+
+def create_checker(renderer, options):
+    """ ExistenceChecker shared by walked batches, None when overwriting """
+    if options.overwrite:
+        return None
+    return ExistenceChecker(renderer, options.check_threads)
+
+
+def check_batches(batches, checker, journal=None, events=None):
+    """ Iterate (batch, existence) of walked batches, existence is all
+    False when there is no checker """
+    if journal is not None:
+        batches = skip_completed(batches, journal, events)
+    if checker is None:
+        for batch in batches:
+            yield batch, [False] * len(batch)
+        return
+    for batch, existence in checker.imap(batches):
+        yield batch, existence
+
+
+def spawn_tasks(queue, progress, renderer, walker, options, records=None,
+                costs=None, events=None):
+    checkpoint = Checkpoint(options.checkpoint, options, progress)
+    cursor = checkpoint.load()
+    if cursor is not None:
+        logger.info('Resuming from %r', cursor)
+
+    journal = None
+    if options.journal and options.resume:
+        journal = Journal(options.journal)
+
+    checker = create_checker(renderer, options)
+    if options.priority == 'walk':
+        # Single walk so the cursor can be checkpointed
+        streams = [(None, check_batches(walk_batches(walker, options,
+                                                     cursor),
+                                        checker, journal, events))]
+    else:
+        streams = list((z, check_batches(walk_batches(walker, options,
+                                                      level=z),
+                                         checker, journal, events))
+                       for z in walker.levels)
+    scheduler = Scheduler(options.priority, costs)
+
+    # Counting coverage walks the coverage once more, leave ETA unknown
+    if events is not None and hasattr(walker, 'count') and \
+            not options.coverage:
+        for z in walker.levels:
+            events.put(('total', z, walker.count(z, options.shard,
+                                                 options.shards)))
 
-def tilelist_spawner(queue, statistics, options):
-    renderer, options = verify_config(options)
-    walker = TileListPyramidWalker(renderer.pyramid,
-                                   options.csv,
-                                   levels=options.levels,
-                                   stride=options.stride,
-                                   envelope=options.envelope)
     count = 0
-    for index in walker.walk():
-        if not options.overwrite and renderer.has_metatile(index):
-            logger.info('Skipping %r...', index)
-            continue
-        count += 1
-        queue.put((count, index.z, index.x, index.y, index.stride))
+    for _z, (batch, existence) in scheduler.schedule(
+            streams, size=lambda item: sum(not e for e in item[1])):
+        if events is not None:
+            walked = collections.defaultdict(lambda: [0, 0])
+            for (index, _cursor), exists in zip(batch, existence):
+                walked[index.z][bool(exists)] += 1
+            for z, (issued, existing) in walked.items():
+                events.put(('walked', z, issued, existing))
+        for (index, cursor), exists in zip(batch, existence):
+            if exists:
+                logger.info('Skipping %r...', index)
+                status = Journal.SKIPPED
+            else:
+                count += 1
+                queue.put((count, index.z, index.x, index.y, index.stride))
+                status = Journal.ISSUED
+            if records is not None:
+                records.put(index.coord + (index.stride, status))
+            checkpoint.walked(count, cursor)
+
+    if checker is not None:
+        checker.close()
+    if journal is not None:
+        journal.close()
+
+    # Wait until all tasks are rendered so the whole walk is finished
+    queue.join()
+    checkpoint.save(walker.cursor)
+
+
+def lease_tasks(renderer, walker, options):
+    """ Iterate (z, x, y, stride) of MetaTiles to be leased to workers """
+    checker = create_checker(renderer, options)
+    try:
+        for batch, existence in check_batches(walk_batches(walker, options),
+                                              checker):
+            for (index, _cursor), exists in zip(batch, existence):
+                if exists:
+                    logger.info('Skipping %r...', index)
+                else:
+                    yield index.z, index.x, index.y, index.stride
+    finally:
+        if checker is not None:
+            checker.close()
+
+
+def create_tilelist_walker(renderer, options):
+    return UniqueTileListWalker(renderer.pyramid,
+                                options.csv,
+                                levels=options.levels or None,
+                                stride=options.stride,
+                                order=options.order)
+
+
+def prepare_renderer(options, renderer=None):
+    """ Create the renderer in current process, or reopen connections of
+    the renderer inherited from parent process when using --prefork """
+    if renderer is None:
+        return verify_config(options)
+    renderer.reopen()
+    return renderer, options
+
+
+def envelope_spawner(queue, statistics, progress, options, renderer=None,
+                     records=None, costs=None, events=None):
+    renderer, options = prepare_renderer(options, renderer)
+    walker = create_envelope_walker(renderer, options)
+    spawn_tasks(queue, progress, renderer, walker, options, records, costs,
+                events)
+
+
+def tilelist_spawner(queue, statistics, progress, options, renderer=None,
+                     records=None, costs=None, events=None):
+    renderer, options = prepare_renderer(options, renderer)
+    walker = create_tilelist_walker(renderer, options)
+    spawn_tasks(queue, progress, renderer, walker, options, records, costs,
+                events)
 
 
 #===============================================================================
 # Consumer
 #===============================================================================
 
-def render_worker(queue, statistics, options):
-    renderer, options = verify_config(options)
+def render_task(renderer, statistics, count, index, timings=None):
+    """ Render one MetaTile, returns name of the statistics field
+    updated """
+    logger.info('Rendering #%d: %r...' % (count, index))
+    with Timer('... #%d finished in %%(time)s' % count, logger.info, False):
+        try:
+            metatile = renderer.render_metatile(index, timings)
+            if metatile:
+                statistics.rendered += 1
+                return 'rendered'
+            else:
+                statistics.skipped += 1
+                return 'skipped'
+        except Exception as e:
+            statistics.failed += 1
+            logger.exception('Error while rendering #%d: %r' % (count, index))
+            return 'failed'
+
+
+def should_recycle(done, options):
+    """ Whether a worker rendered given number of tasks should exit and
+    be replaced by a fresh process """
+    if options.max_tasks and done >= options.max_tasks:
+        logger.info('Recycling worker after %d tasks', done)
+        return True
+    if options.max_memory:
+        rss = resident_memory()
+        if rss > options.max_memory * 1024 * 1024:
+            logger.info('Recycling worker using %s memory', human_size(rss))
+            return True
+    return False
+
+
+def render_worker(conn, statistics, number, options, renderer=None):
+    """ Render tasks handed by the Supervisor through conn, the worker
+    sends "ready" when it is waiting for a task, and (task number,
+    status, seconds, timings) after it is finished """
+    renderer, options = prepare_renderer(options, renderer)
     setup_logger(options.logfile)
 
+    done = 0
     while True:
-        task = queue.get()
+        conn.send('ready')
+        task = conn.recv()
 
         if task is None:
             renderer.close()
@@ -95,42 +891,344 @@ def render_worker(queue, statistics, options):
 
         count, z, x, y, stride = task
         index = renderer.pyramid.create_metatile_index(z, x, y, stride)
+        timings = dict()
+        started = time.time()
+        status = render_task(renderer, statistics, count, index, timings)
+        # Reported by the Supervisor, a record put into a queue here is
+        # lost if the worker is killed before the queue flushes it
+        conn.send((count, status, time.time() - started, timings))
+
+        done += 1
+        if should_recycle(done, options):
+            renderer.close()
+            sys.exit(RECYCLE_EXITCODE)
 
-        logger.info('Rendering #%d: %r...' % (count, index))
-        with Timer('... #%d finished in %%(time)s' % count, logger.info, False):
-            try:
-                metatile = renderer.render_metatile(index)
-                if metatile:
-                    statistics.rendered += 1
-                else:
-                    statistics.skipped += 1
-            except Exception as e:
-                statistics.failed += 1
-                logger.exception('Error while rendering #%d: %r' % (count, index))
-            finally:
-                queue.task_done()
+
+def lease_worker(statistics, number, options, renderer=None):
+    """ Render MetaTiles leased from a remote coordinator """
+    renderer, options = prepare_renderer(options, renderer)
+    setup_logger(options.logfile)
+
+    client = LeaseClient(options.worker,
+                         worker='%s#%d' % (socket.gethostname(), number),
+                         retry_interval=LEASE_RETRY_INTERVAL)
+    count = 0
+    try:
+        for lease, tasks in client.leases():
+            counts = dict(rendered=0, skipped=0, failed=0)
+            for z, x, y, stride in tasks:
+                count += 1
+                index = renderer.pyramid.create_metatile_index(z, x, y, stride)
+                counts[render_task(renderer, statistics, count, index)] += 1
+                # Keep the lease alive for slow batches
+                client.renew(lease)
+            if not client.complete(lease, **counts):
+                logger.warning('Lease #%d expired, rendered by other worker',
+                               lease)
+            # Only recycle between leases so no lease is abandoned
+            if should_recycle(count, options):
+                sys.exit(RECYCLE_EXITCODE)
+    except urllib2.URLError:
+        logger.exception('Lost connection to coordinator')
+    finally:
+        renderer.close()
 
 #===============================================================================
 # Monitor
 #===============================================================================
 
 
+class WorkerStartError(Exception):
+    pass
+
+
+class Supervisor(object):
+
+    """ Keep worker processes running
+
+    A worker exits with non-zero code when it is recycled or crashed
+    (eg: killed by the OOM killer), a new worker process is started in
+    its place.  A worker keeps exiting before it is ready to render (eg:
+    broken configuration or unreachable storage) is started again after
+    a doubling delay, the run is given up after MAX_RESPAWNS attempts.
+
+    When a queue is given, workers don't read the queue themselves since
+    a worker killed while reading leaves the lock of the queue acquired.
+    Each worker gets tasks through its own pipe from a dispatching thread
+    of the Supervisor, which records the task in progress before it is
+    sent, and keeps it there until the worker finishes it.  The task a
+    crashed worker was rendering is sent again to its replacement, a task
+    crashes workers too many times is counted as failed.  Results sent
+    back by workers are written to the journal, costs and metrics here,
+    so they are not lost with a killed worker.
+    """
+
+    def __init__(self, target, args, queue=None, progress=None,
+                 statistics=None, records=None, costs=None, events=None):
+        # args of each worker
+        self._target = target
+        self._args = args
+        self._queue = queue
+        self._progress = progress
+        self._statistics = statistics
+        self._records = records
+        self._costs = costs
+        self._events = events
+        self._generations = [0] * len(args)
+        # Exits since the worker of each slot was last ready, and when an
+        # exited worker is started again, None while it is running
+        self._failures = [0] * len(args)
+        self._respawns = [None] * len(args)
+        # Guards replacing (worker, connection) of a slot
+        self._lock = threading.Lock()
+        self._workers = list()
+        self._conns = list()
+        self._dispatchers = list()
+        self._stopped = threading.Event()
+        for w in range(len(args)):
+            worker, conn = self._create(w)
+            self._workers.append(worker)
+            self._conns.append(conn)
+
+    def _create(self, number):
+        name = 'worker#%d' % number
+        if self._generations[number] > 0:
+            name += '.%d' % self._generations[number]
+        args = self._args[number]
+        conn = None
+        if self._queue is not None:
+            conn, child_conn = multiprocessing.Pipe()
+            args = (child_conn,) + tuple(args)
+        worker = multiprocessing.Process(name=name,
+                                         target=self._target,
+                                         args=args)
+        worker.daemon = True
+        return worker, conn
+
+    def start(self):
+        for w, worker in enumerate(self._workers):
+            # Start the workers one by one to avoid starving
+            time.sleep(0.1)
+            logger.info('Starting worker #%d', w)
+            worker.start()
+        if self._queue is not None:
+            for w in range(len(self._workers)):
+                dispatcher = threading.Thread(target=self._dispatch,
+                                              args=(w,),
+                                              name='dispatcher#%d' % w)
+                dispatcher.daemon = True
+                dispatcher.start()
+                self._dispatchers.append(dispatcher)
+
+    def stop(self, timeout=10):
+        """ Stop dispatching after tasks already in the queue, workers
+        exit when they finish their task """
+        self._stopped.set()
+        for _dispatcher in self._dispatchers:
+            self._queue.put(None)
+        for dispatcher in self._dispatchers:
+            dispatcher.join(timeout)
+        for worker in self._workers:
+            worker.join(timeout)
+
+    @property
+    def running(self):
+        """ Whether any worker is still running """
+        return any(worker.is_alive() for worker in self._workers)
+
+    def check(self):
+        """ Replace exited workers, call this periodically, raises
+        WorkerStartError if a worker never gets ready """
+        for w, worker in enumerate(self._workers):
+            if worker.is_alive() or worker.exitcode == 0:
+                continue
+            if self._respawns[w] is None:
+                with self._lock:
+                    if worker.exitcode == RECYCLE_EXITCODE:
+                        self._failures[w] = 0
+                    self._failures[w] += 1
+                    failures = self._failures[w]
+                if worker.exitcode != RECYCLE_EXITCODE:
+                    logger.warning('Worker %s exited with code %d',
+                                   worker.name, worker.exitcode)
+                if failures > MAX_RESPAWNS:
+                    raise WorkerStartError('Worker #%d exited %d times in '
+                                           'a row' % (w, failures))
+                delay = RESPAWN_DELAY * 2 ** (failures - 2) \
+                    if failures > 1 else 0
+                self._respawns[w] = time.time() + delay
+            if time.time() < self._respawns[w]:
+                continue
+            self._respawns[w] = None
+            self._generations[w] += 1
+            worker, conn = self._create(w)
+            worker.start()
+            with self._lock:
+                self._workers[w] = worker
+                self._conns[w] = conn
+
+    def _worker(self, number):
+        with self._lock:
+            return self._workers[number], self._conns[number]
+
+    def _receive(self, worker, conn):
+        """ Wait for next message from the worker, None if it exited """
+        while True:
+            try:
+                if conn.poll(1):
+                    return conn.recv()
+                if not worker.is_alive():
+                    # Message sent right before exiting
+                    return conn.recv() if conn.poll() else None
+            except (EOFError, IOError):
+                return None
+
+    def _wait_ready(self, number):
+        """ Wait until worker of the slot asks for a task, returns
+        (worker, connection), or (None, None) if stopped meanwhile """
+        while True:
+            worker, conn = self._worker(number)
+            if self._receive(worker, conn) == 'ready':
+                with self._lock:
+                    self._failures[number] = 0
+                return worker, conn
+            # Exited, wait until check() replaces it
+            while self._worker(number)[0] is worker:
+                if self._stopped.is_set():
+                    return None, None
+                time.sleep(0.1)
+
+    def _render(self, worker, conn, task):
+        """ Send the task to the worker, returns (status, seconds,
+        timings), or None if the worker crashed """
+        try:
+            conn.send(task)
+        except IOError:
+            return None
+        result = self._receive(worker, conn)
+        if not isinstance(result, tuple) or result[0] != task[0]:
+            return None
+        return result[1:]
+
+    def _dispatch(self, number):
+        """ Hand tasks in the queue to worker of the slot one by one """
+        current = self._progress[number]
+        while True:
+            worker, conn = self._wait_ready(number)
+            if worker is None:
+                return
+            task = self._queue.get()
+            if task is None:
+                # Sent by stop(), let the worker exit too
+                try:
+                    conn.send(None)
+                except IOError:
+                    pass
+                self._queue.task_done()
+                return
+            count, z, x, y, stride = task
+            current.z, current.x, current.y, current.stride = z, x, y, stride
+            current.count = count
+
+            crashes = 0
+            while True:
+                result = self._render(worker, conn, task)
+                if result is not None:
+                    self._report(number, task, *result)
+                    break
+                crashes += 1
+                if crashes > MAX_CRASHES:
+                    logger.error('Task #%d crashed workers %d times, '
+                                 'giving up', count, crashes)
+                    self._statistics.failed += 1
+                    self._report(number, task, 'failed', 0, {})
+                    break
+                logger.warning('Retrying task #%d crashed worker #%d',
+                               count, number)
+                worker, conn = self._wait_ready(number)
+                if worker is None:
+                    return
+
+            # Task leaves progress only after it is finished
+            current.count = 0
+            self._queue.task_done()
+
+    def _report(self, number, task, status, seconds, timings):
+        """ Send result of a task to the journal, costs and metrics """
+        _count, z, x, y, stride = task
+        if self._costs is not None and status == 'rendered':
+            self._costs.update(z, seconds)
+        if self._records is not None:
+            self._records.put((z, x, y, stride, JOURNAL_STATUS[status]))
+        if self._events is not None:
+            self._events.put(('task', number, z, stride, status, seconds,
+                              timings))
+
+
 def monitor(options, statistics):
     logger.info('===== Start Rendering =====')
 
     # Task queue
     queue = multiprocessing.JoinableQueue(maxsize=QUEUE_LIMIT)
 
-    workers = list()
+    # Build the render tree once, workers are forked from this process
+    # and share it copy-on-write
+    renderer = None
+    if options.prefork:
+        logger.info('Creating shared render tree...')
+        with Timer('Render tree created in %(time)s', logger.info, False):
+            renderer, options = verify_config(options)
+
+    # Journal records sent by spawner and workers
+    records = None
+    if options.journal and not options.worker:
+        Journal(options.journal, reset=not options.resume).close()
+        records = multiprocessing.Queue()
+        writer = JournalWriter(options.journal, records)
+        writer.start()
+
+    # Render time of each level, learned from workers
+    costs = LevelCosts(options.cost_file)
+
+    # Task each worker is rendering, count is 0 for idle
+    progress = multiprocessing.sharedctypes.Array(WorkerTask,
+                                                  options.workers,
+                                                  lock=False)
+
+    # Live metrics sent by spawner and workers
+    events = None
+    if (options.status or options.status_port) and not options.worker:
+        events = multiprocessing.Queue()
+        metrics = Metrics(options.workers, queue, progress)
+        reporter = StatusReporter(metrics, events, options.status,
+                                  options.status_port)
+        reporter.start()
+
+    if options.worker:
+        # Tasks are leased from remote coordinator, not the queue
+        supervisor = Supervisor(lease_worker,
+                                list((statistics, w, options, renderer)
+                                     for w in range(options.workers)))
+        logger.info('Leasing MetaTiles from coordinator %s:%d',
+                    *parse_address(options.worker))
+        supervisor.start()
+        try:
+            while supervisor.running:
+                time.sleep(1)
+                supervisor.check()
+        except KeyboardInterrupt:
+            logger.info('===== Rendering Canceled =====')
+        except WorkerStartError:
+            logger.exception('===== Rendering Aborted =====')
+        else:
+            logger.info('===== Rendering Complete =====')
+        return statistics
 
-    # Start all workers
-    for w in range(options.workers):
-        logging.info('Creating worker #%d', w)
-        worker = multiprocessing.Process(name='worker#%d' % w,
-                                         target=render_worker,
-                                         args=(queue, statistics, options))
-        worker.daemon = True
-        workers.append(worker)
+    supervisor = Supervisor(render_worker,
+                            list((statistics, w, options, renderer)
+                                 for w in range(options.workers)),
+                            queue, progress, statistics, records, costs,
+                            events)
 
     # Start producer
     if options.csv:
@@ -139,7 +1237,9 @@ def monitor(options, statistics):
         spawner = envelope_spawner
     producer = multiprocessing.Process(name='spawner',
                                        target=spawner,
-                                       args=(queue, statistics, options,),)
+                                       args=(queue, statistics, progress,
+                                             options, renderer, records,
+                                             costs, events),)
     producer.daemon = True
     producer.start()
 
@@ -147,23 +1247,96 @@ def monitor(options, statistics):
     time.sleep(1)
 
     # Start
-    for worker in workers:
-        # Start the workers one by one to avoid starving
-        time.sleep(0.1)
-        logging.info('Starting worker #%d', w)
-        worker.start()
+    supervisor.start()
 
-    # Join the queue
-    try:
+    # Join the queue in background so workers can be supervised
+    finished = threading.Event()
+
+    def join_queue():
         producer.join()
         queue.join()
+        finished.set()
+
+    joiner = threading.Thread(target=join_queue, name='joiner')
+    joiner.daemon = True
+    joiner.start()
+
+    canceled = False
+    try:
+        while not finished.wait(1):
+            supervisor.check()
     except KeyboardInterrupt:
+        canceled = True
         logger.info('===== Rendering Canceled =====')
+    except WorkerStartError:
+        canceled = True
+        logger.exception('===== Rendering Aborted =====')
     else:
+        supervisor.stop()
         logger.info('===== Rendering Complete =====')
     finally:
+        if records is not None:
+            # Records of killed workers may never arrive when canceled
+            writer.stop(flush=not canceled)
+            finish_journal(options)
+        if options.cost_file:
+            costs.save(options.cost_file)
+        if events is not None:
+            reporter.stop()
         return statistics
 
+
+def finish_journal(options):
+    """ Write failed MetaTiles in the journal to the retry list """
+    filename = options.retry_list or \
+        os.path.splitext(options.journal)[0] + '.retry.csv'
+    journal = Journal(options.journal)
+    try:
+        count = write_retry_list(journal, filename)
+    finally:
+        journal.close()
+    if count > 0:
+        logger.warning('%d failed MetaTiles written to "%s", render them '
+                       'again using "--csv %s"', count, filename, filename)
+
+
+def coordinate(options, statistics):
+    """ Walk the pyramid and lease MetaTiles to remote workers """
+    logger.info('===== Start Coordinating =====')
+
+    renderer, options = verify_config(options)
+    if options.csv:
+        walker = create_tilelist_walker(renderer, options)
+    else:
+        walker = create_envelope_walker(renderer, options)
+
+    coordinator = LeaseCoordinator(lease_tasks(renderer, walker, options),
+                                   lease_size=options.lease_size,
+                                   lease_timeout=options.lease_timeout,
+                                   address=options.coordinator)
+    coordinator.start()
+    logger.info('Coordinator listening on %s:%d', *coordinator.address)
+
+    try:
+        coordinator.join()
+        # Give polling workers a chance to learn the walk is done
+        time.sleep(LEASE_RETRY_INTERVAL * 2)
+    except KeyboardInterrupt:
+        logger.info('===== Rendering Canceled =====')
+    else:
+        logger.info('===== Rendering Complete =====')
+    finally:
+        summary = coordinator.statistics
+        statistics.rendered = summary.get('rendered', 0)
+        statistics.skipped = summary.get('skipped', 0)
+        statistics.failed = summary.get('failed', 0)
+        for worker, worker_statistics in sorted(coordinator.workers.items()):
+            logger.info('Worker %s: %r', worker, worker_statistics)
+        logger.info('%d leases expired and requeued', coordinator.requeued)
+        coordinator.close()
+        renderer.close()
+    return statistics
+
 #===============================================================================
 # Argument & Checking
 #===============================================================================
@@ -174,8 +1347,8 @@ def parse_args():
     parser = argparse.ArgumentParser(description='''Single Node Tile Renderer''',
                                      usage='%(prog)s RENDERER_CONFIG [OPTIONS]',
                                      epilog='''Render tiles concurrently on a
-single node use multiprocessing. (Distributed render system is left for
-readers as a home exercise).''')
+single node use multiprocessing, or on several nodes using --coordinator
+and --worker.''')
 
     parser.add_argument('config',
                         default='renderer.cfg.py',
@@ -211,6 +1384,102 @@ readers as a home exercise).''')
                         '''
                         )
 
+    parser.add_argument('--order',
+                        dest='order',
+                        default=None,
+                        choices=['hilbert', 'morton'],
+                        help='''Render MetaTiles of each level along a space
+                        filling curve instead of column by column, keeps
+                        caches of data sources and tile storage hot.
+                        '''
+                        )
+
+    parser.add_argument('--coverage',
+                        dest='coverage',
+                        default='',
+                        help='''Only render MetaTiles intersects given coverage
+                        in EPSG:4326, can be a GeoJSON/shapefile polygon or a
+                        raster mask (non-zero pixels are covered).  Ignores
+                        "--order".
+                        ''',
+                        metavar='FILE',
+                        )
+
+    parser.add_argument('--shard',
+                        dest='shard',
+                        default='0/1',
+                        help='''Only render given shard of each level, in
+                        I/N format, where N is number of shards and I is zero
+                        based shard number, eg: run "0/2" and "1/2" on two
+                        nodes. Default is %(default)s.
+                        ''',
+                        )
+
+    parser.add_argument('--checkpoint',
+                        dest='checkpoint',
+                        default='',
+                        help='''Save progress into given checkpoint file
+                        periodically, if the file exists, resume rendering
+                        from the checkpoint.  Options must not be changed when
+                        resuming.
+                        ''',
+                        metavar='FILE',
+                        )
+
+    parser.add_argument('--journal',
+                        dest='journal',
+                        default='',
+                        help='''Record issued, rendered and failed MetaTiles
+                        in given SQLite database, failed MetaTiles are
+                        written to the retry list after rendering.  Cleared
+                        on start unless "--resume" is given.  Not supported
+                        by "--coordinator".''',
+                        metavar='FILE',
+                        )
+
+    parser.add_argument('--resume',
+                        dest='resume',
+                        default=False,
+                        action='store_true',
+                        help='''Skip MetaTiles rendered according to the
+                        journal without checking the storage, requires
+                        "--journal".''',
+                        )
+
+    parser.add_argument('--retry-list',
+                        dest='retry_list',
+                        default='',
+                        help='''Write failed MetaTiles as a CSV tile list,
+                        which can be rendered again using "--csv" (with same
+                        stride), default is journal filename with extension
+                        ".retry.csv".''',
+                        metavar='FILE',
+                        )
+
+    parser.add_argument('--priority',
+                        dest='priority',
+                        default='walk',
+                        choices=['walk', 'zoom', 'cost'],
+                        help='''Order MetaTiles are given to workers, "walk"
+                        renders levels one after another in walk order,
+                        "zoom" walks all levels side by side and gives lower
+                        levels a larger share of workers so overview levels
+                        finish early, "cost" renders most expensive levels
+                        first according to timings learned from workers (see
+                        "--cost-file") so cheap MetaTiles fill idle workers
+                        at the end.  Only "walk" works with "--checkpoint".
+                        Default is %(default)s.''',
+                        )
+
+    parser.add_argument('--cost-file',
+                        dest='cost_file',
+                        default='',
+                        help='''Load average render time of each level from
+                        given JSON file and save learned timings back after
+                        rendering.''',
+                        metavar='FILE',
+                        )
+
     parser.add_argument('-o', '--overwrite',
                        dest='overwrite',
                        default=False,
@@ -219,6 +1488,16 @@ readers as a home exercise).''')
                        in cache.''',
                        )
 
+    parser.add_argument('--check-threads',
+                        dest='check_threads',
+                        default=4,
+                        type=int,
+                        help='''Number of threads checking whether MetaTiles
+                        already exist in the storage (when not overwriting),
+                        MetaTiles are checked in batches of %d.  Default is
+                        %%(default)s.''' % CHECK_BATCH_SIZE,
+                        )
+
     parser.add_argument('-t', '--test',
                         dest='test',
                         default=0,
@@ -243,6 +1522,108 @@ readers as a home exercise).''')
                        ''' % CPU_COUNT,
                        )
 
+    parser.add_argument('--prefork',
+                        dest='prefork',
+                        default=False,
+                        action='store_true',
+                        help='''Create the render tree once and fork workers
+                        from it, so read only states like mapnik maps are
+                        shared between workers, storage connections are
+                        reopened in each worker.  Note mapnik keeps its
+                        own database connection pools, set
+                        persist_connection=false for PostGIS data sources
+                        when using this.''',
+                        )
+
+    parser.add_argument('--render-threads',
+                        dest='render_threads',
+                        default=0,
+                        type=int,
+                        help='''Render independent source nodes of the render
+                        tree concurrently using given number of threads in
+                        each worker, default is 0 which renders them one by
+                        one.''',
+                        metavar='THREADS',
+                        )
+
+    parser.add_argument('--coordinator',
+                        dest='coordinator',
+                        default='',
+                        help='''Run as coordinator of distributed rendering,
+                        listen on given HOST:PORT and lease MetaTiles to
+                        remote workers instead of rendering them, see
+                        "--worker".''',
+                        metavar='ADDRESS',
+                        )
+
+    parser.add_argument('--worker',
+                        dest='worker',
+                        default='',
+                        help='''Run as worker of distributed rendering,
+                        render MetaTiles leased from coordinator at given
+                        HOST:PORT using "--workers" processes.  Walk options
+                        (levels, envelope, stride...) are ignored, but
+                        config must be the same as coordinator.''',
+                        metavar='ADDRESS',
+                        )
+
+    parser.add_argument('--lease-size',
+                        dest='lease_size',
+                        default=16,
+                        type=int,
+                        help='''Number of MetaTiles leased to a worker at
+                        once, default is %(default)s.''',
+                        )
+
+    parser.add_argument('--lease-timeout',
+                        dest='lease_timeout',
+                        default=600,
+                        type=float,
+                        help='''Seconds before a lease is given to another
+                        worker if its worker is not responding, must be longer
+                        than rendering one MetaTile. Default is %(default)s.
+                        ''',
+                        )
+
+    parser.add_argument('--max-tasks',
+                        dest='max_tasks',
+                        default=0,
+                        type=int,
+                        help='''Replace a worker process with a new one
+                        after it rendered given number of MetaTiles, keeps
+                        memory leaked by data sources in check.  Default is
+                        0, never.''',
+                        )
+
+    parser.add_argument('--max-memory',
+                        dest='max_memory',
+                        default=0,
+                        type=int,
+                        help='''Replace a worker process with a new one
+                        when its resident memory exceeds given MB, checked
+                        between MetaTiles.  Default is 0, never.''',
+                        metavar='MB',
+                        )
+
+    parser.add_argument('--status',
+                        dest='status',
+                        default='',
+                        help='''Rewrite given JSON file with live statistics
+                        every %d seconds: MetaTile and tile rates of each
+                        level, queue depth, ETA, worker utilization, failures
+                        and time spent in each render node.''' % STATUS_INTERVAL,
+                        metavar='FILE',
+                        )
+
+    parser.add_argument('--status-port',
+                        dest='status_port',
+                        default=0,
+                        type=int,
+                        help='''Serve live statistics as JSON on
+                        http://127.0.0.1:PORT/status.''',
+                        metavar='PORT',
+                        )
+
     parser.add_argument('--log-file',
                        dest='logfile',
                        default='render.log',
@@ -253,7 +1634,10 @@ readers as a home exercise).''')
     parser.add_argument('-c', '--csv',
                        dest='csv',
                        default='',
-                       help='''Load a CSV tile list file and render tiles in it''',
+                       help='''Load a tile list file and render tiles in it,
+                       can be a CSV file of z,x,y rows or a binary file of
+                       packed z/x/y records (.zxy), duplicated and
+                       overlapping tiles are only rendered once.''',
                        metavar='FILE',
                        )
 
@@ -272,6 +1656,22 @@ def setup_logger(log_file, level=logging.DEBUG):
     handler.setFormatter(formatter)
     handler.setLevel(logging.WARNING)
     logger.addHandler(handler)
+    # Workers are forked after threads are started, see reset_logger()
+    multiprocessing.util.register_after_fork(logger, reset_logger)
+
+
+def reset_logger(logger):
+    """ Recreate locks of logging in a forked process
+
+    Replacement workers are forked while dispatcher, journal and status
+    threads are running, a lock held by one of them at that moment is
+    inherited acquired by the child and never released, the child would
+    hang on its first log call.  Called first thing in every process
+    started by multiprocessing.
+    """
+    logging._lock = threading.RLock()
+    for handler in logger.handlers + logging.getLogger().handlers:
+        handler.createLock()
 
 
 def verify_config(options):
@@ -281,7 +1681,7 @@ def verify_config(options):
     else:
         options.mode = 'hybrid'
 
-    render_option = dict(mode=options.mode)
+    render_option = dict(mode=options.mode, threads=options.render_threads)
     renderer = create_render_tree_from_config(options.config, render_option)
 
     if not options.levels:
@@ -307,9 +1707,33 @@ def verify_config(options):
     else:
         options.envelope = tuple(map(float, options.envelope.split(',')))
 
+    match = re.match(r'^(\d+)/(\d+)$', options.shard)
+    assert match, 'Invalid shard, should be I/N'
+    options.shard, options.shards = tuple(map(int, match.groups()))
+    assert 0 <= options.shard < options.shards, 'Invalid shard'
+
+    options.coordinator = parse_address(options.coordinator)
+    options.worker = parse_address(options.worker)
+    assert not (options.coordinator and options.worker), \
+        'Can\'t be coordinator and worker at same time'
+    assert options.journal or not options.resume, \
+        '"--resume" requires "--journal"'
+    # Checkpoint assumes tasks are queued in walk order
+    assert options.priority == 'walk' or not options.checkpoint, \
+        '"--checkpoint" only works with walk order, use "--journal"'
+
     return renderer, options
 
 
+def parse_address(address):
+    """ Parse HOST:PORT, returns None for empty address """
+    if not address or isinstance(address, tuple):
+        return address or None
+    match = re.match(r'^(.*):(\d+)$', address)
+    assert match, 'Invalid address, should be HOST:PORT'
+    return match.group(1), int(match.group(2))
+
+
 def test_render(renderer, options):
     logger.info('Loading renderer configuration: "%s"', options.config)
     logger.info('Logging to: "%s"', os.path.abspath(options.logfile))
@@ -318,23 +1742,20 @@ def test_render(renderer, options):
     logger.info('Rendering envelope: %s', options.envelope)
     logger.info('Rendering tile list: %s', options.csv)
     logger.info('Rendering using meta tile stride=%d', options.stride)
+    logger.info('Rendering order: %s', options.order or 'column')
+    logger.info('Rendering coverage: %s', options.coverage or 'envelope')
+    logger.info('Rendering shard %d of %d', options.shard, options.shards)
+    logger.info('Rendering priority: %s', options.priority)
     logger.info('Rendering using %d workers on %d cores', options.workers,
                 CPU_COUNT)
     logger.info('Test render %d Tiles' % options.test)
 
     if not options.csv:
-        walker = PyramidWalker(renderer.pyramid,
-                               levels=options.levels,
-                               stride=options.stride,
-                               envelope=options.envelope)
+        walker = create_envelope_walker(renderer, options)
     else:
-        walker = TileListPyramidWalker(renderer.pyramid,
-                                       options.csv,
-                                       levels=options.levels,
-                                       stride=options.stride,
-                                       envelope=options.envelope)
+        walker = create_tilelist_walker(renderer, options)
 
-    for n, index in enumerate(walker.walk()):
+    for n, index in enumerate(walker.walk(options.shard, options.shards)):
         if n >= options.test:
             break
         logger.info('Rendering %s...', index)
@@ -380,7 +1801,10 @@ def main():
 
     try:
         timer.tic()
-        monitor(options, statistics)
+        if options.coordinator:
+            coordinate(options, statistics)
+        else:
+            monitor(options, statistics)
     finally:
         timer.tac()
         print '=' * 70
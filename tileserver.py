@@ -111,6 +111,14 @@ def parse_args(args=None):
                         to core number (%(default)s).  Note this option is ignored under
                         debug mode because process model don't support debugging.''',)
 
+    parser.add_argument('--render-threads',
+                        dest='render_threads',
+                        default=0,
+                        type=int,
+                        help='''Render independent source nodes of "renderer"
+                        layers concurrently using given number of threads,
+                        default is 0 which renders them one by one.''',)
+
     parser.add_argument('--age',
                         dest='age',
                         default=0,
@@ -183,7 +191,8 @@ class MasonApp(object):
             # Add storages
             for layer_config in self._options.layers:
                 print 'Adding layer from "%s"' % layer_config
-                layer_option = dict(mode=self._options.mode)
+                layer_option = dict(mode=self._options.mode,
+                                    threads=self._options.render_threads)
                 add_storage_or_renderer(mason, layer_config, layer_option)
             self._mason = mason
         return self._mason